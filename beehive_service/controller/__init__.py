@@ -4,6 +4,10 @@
 from __future__ import annotations
 
 #from re import match
+import base64
+from copy import deepcopy
+import hashlib
+import hmac
 import ujson as json
 from urllib.parse import urlencode
 from beehive.common.apimanager import ApiController, ApiManagerError, ApiManagerWarning
@@ -22,7 +26,7 @@ from beehive_service.controller.api_account_capability import ApiAccountCapabili
 from beehive_service.controller.api_division import ApiDivision
 from beehive_service.controller.api_orgnization import ApiOrganization
 from beehive_service.controller.api_serviceJob_schedule import ApiServiceJobSchedule
-from beehive_service.controller.api_service_metric_type import ApiServiceMetricType
+from beehive_service.controller.api_service_metric_type import ApiServiceMetricType, ServiceMetricTypeRegistry
 from beehive_service.controller.api_service_price_list import ApiServicePriceList
 from beehive_service.controller.api_service_price_metric import ApiServicePriceMetric
 from beehive_service.controller.api_service_tag import ApiServiceTag
@@ -97,12 +101,15 @@ from beehive.common.task_v2 import prepare_or_run_task
 from datetime import datetime, date, timedelta
 from dateutil.parser import parse
 from beehive_service.service_util import __SRV_REPORT_COMPLETE_MODE__
+from beehive_service.service_util import TtlCache, __SRV_AUTH_CACHE_TTL__, __SRV_AUTH_POOL_SIZE__
+from beehive_service.service_util import VersionedTtlCache, compute_etag, __SRV_CATALOG_CACHE_TTL__
+from beehive_service.service_util import __SRV_PAGE_CURSOR_SECRET_PARAM__
 
 try:
     from dateutil.parser import relativedelta
 except ImportError as ex:
     from dateutil import relativedelta
-from typing import List, Type, Tuple, Any, Union, Dict, TypeVar, Callable, TYPE_CHECKING
+from typing import List, Type, Tuple, Any, Union, Dict, TypeVar, Callable, Optional, TYPE_CHECKING
 from beecell.simple import jsonDumps
 
 if TYPE_CHECKING:
@@ -127,11 +134,19 @@ class ServiceController(ApiController):
 
     version = "v1.0"
     manager: ServiceDbManager
+    # process wide cache of the service metric types shared by all the controllers
+    metric_type_registry = ServiceMetricTypeRegistry()
+    # process wide short lived cache of the user groups and roles read from the auth api
+    auth_cache = TtlCache(ttl=__SRV_AUTH_CACHE_TTL__)
+    # process wide cache of the computed catalog listings, invalidated by catalog and definition writes
+    catalog_cache = VersionedTtlCache(ttl=__SRV_CATALOG_CACHE_TTL__)
 
     def __init__(self, module):
         ApiController.__init__(self, module)
 
         self.manager = ServiceDbManager()
+        # secret used to sign the page cursors, loaded from the api config by load_page_cursor_key
+        self.page_cursor_key: Optional[bytes] = None
 
         self.child_classes = [
             ApiOrganization,
@@ -191,14 +206,17 @@ class ServiceController(ApiController):
         entity_class: Type[APIOBJ],
         query_func: Callable[[Dict[str, Any]], Tuple[ENTITY, int]],
         index_key: str = None,
+        value_key: str = None,
         *args,
         **kvargs,
-    ) -> Dict[str, APIOBJ]:
+    ) -> Dict[str, Union[APIOBJ, int]]:
         """Get entities indexed by id
 
         :param entity_class:
         :param query_func:
         :param index_key: alternative index key
+        :param value_key: if set index the value of this entity attribute instead of building the api object, for
+            callers that read only a column like resource_uuid [optional]
         :param args:
         :param kvargs:
         :return:
@@ -206,17 +224,20 @@ class ServiceController(ApiController):
         entities: List[ENTITY]
         tot: int
         entities, tot = query_func(with_perm_tag=False, filter_expired=False, size=-1, *args, **kvargs)
-        res: Dict[str, APIOBJ] = {}
+        res: Dict[str, Union[APIOBJ, int]] = {}
         for entity in entities:
-            obj = entity_class(
-                self,
-                oid=entity.id,
-                objid=entity.objid,
-                name=entity.name,
-                active=entity.active,
-                desc=entity.desc,
-                model=entity,
-            )
+            if value_key is not None:
+                obj = getattr(entity, value_key)
+            else:
+                obj = entity_class(
+                    self,
+                    oid=entity.id,
+                    objid=entity.objid,
+                    name=entity.name,
+                    active=entity.active,
+                    desc=entity.desc,
+                    model=entity,
+                )
             if index_key is not None:
                 res[str(getattr(entity, index_key))] = obj
             else:
@@ -556,8 +577,30 @@ class ServiceController(ApiController):
         res, total = self.get_paginated_entities(ApiAccountServiceDefinition, get_asd, **kvargs)
         return res, total
 
+    def get_cached_catalog(self, key: tuple, func, with_etag: bool = False):
+        """Get a catalog listing from the catalog cache. When it is not cached func computes it
+
+        :param key: cache key
+        :param func: function that returns the listing as (list of dict, total)
+        :param with_etag: if True return also the entity tag of the listing [default=False]
+        :return: (list of dict, total) or (list of dict, total, etag)
+        """
+        item = self.catalog_cache.get(key)
+        if item is None:
+            version = self.catalog_cache.version
+            res, total = func()
+            item = (res, total, compute_etag({"items": res, "total": total}))
+            self.catalog_cache.set(key, item, version=version)
+
+        # cached items are shared, return a copy that the caller can change
+        res, total, etag = item
+        res = deepcopy(res)
+        if with_etag is True:
+            return res, total, etag
+        return res, total
+
     @trace(entity="ApiAccountServiceDefinition", op="view")
-    def get_account_catalog(self, *args, **kvargs) -> Tuple[List[dict], int]:
+    def get_account_catalog(self, *args, with_etag: bool = False, **kvargs) -> Tuple[List[dict], int]:
         """Get service definitions as catalogo.
         this method is a raplacement of get_catalog_service_definitions
         Get service definitions relative to visible catalog
@@ -573,6 +616,7 @@ class ServiceController(ApiController):
         :param size: number of users to show in list per page [default=0]
         :param order: sort order [default=DESC]
         :param field: sort field [default=id]
+        :param with_etag: if True return also the entity tag of the listing [default=False]
         :return: List of dictinary
         {
             id: int,
@@ -587,36 +631,42 @@ class ServiceController(ApiController):
         :raises ApiManagerError: if query empty return error.
         """
 
-        kvargs["authorize"] = False
-        res, total = self.get_account_service_defintions(*args, **kvargs)
 
-        res_type_set: List[dict] = []
-        for af in res:
-            r = af.service_definition
-            res_type_item = {}
-            res_type_item["id"] = r.oid
-            res_type_item["uuid"] = r.uuid
-            res_type_item["name"] = r.name
-            res_type_item["description"] = r.desc
+        def get_catalog():
+            kvargs["authorize"] = False
+            res, total = self.get_account_service_defintions(*args, **kvargs)
 
-            features = []
-            if r.desc is not None:
-                features = r.desc.split(" ")
+            res_type_set: List[dict] = []
+            for af in res:
+                r = af.service_definition
+                res_type_item = {}
+                res_type_item["id"] = r.oid
+                res_type_item["uuid"] = r.uuid
+                res_type_item["name"] = r.name
+                res_type_item["description"] = r.desc
 
-            feature = {}
-            for f in features:
-                try:
-                    k, v = f.split(":")
-                    feature[k] = v
-                except ValueError:
-                    pass
-            res_type_item["features"] = feature
-            res_type_set.append(res_type_item)
+                features = []
+                if r.desc is not None:
+                    features = r.desc.split(" ")
 
-        if total == 1:
-            res_type_set[0]["config"] = res[0].service_definition.get_main_config().params
+                feature = {}
+                for f in features:
+                    try:
+                        k, v = f.split(":")
+                        feature[k] = v
+                    except ValueError:
+                        pass
+                res_type_item["features"] = feature
+                res_type_set.append(res_type_item)
 
-        return res_type_set, total
+            if total == 1:
+                res_type_set[0]["config"] = res[0].service_definition.get_main_config().params
+
+            return res_type_set, total
+
+        # account service definitions are read without authorization so the listing does not depend on the user
+        key = ("account_catalog", repr(args), repr(sorted(kvargs.items())))
+        return self.get_cached_catalog(key, get_catalog, with_etag=with_etag)
 
     @trace(entity="ApiAccountServiceDefinition", op="insert")
     def add_account_service_definition(
@@ -677,6 +727,7 @@ class ServiceController(ApiController):
             accsrvdef = AccountServiceDefinition(objid, account_id, service_definition_id)
 
             res = self.manager.add(accsrvdef)
+            self.catalog_cache.invalidate()
 
             # create object and permission
             if name is None:
@@ -1065,9 +1116,7 @@ class ServiceController(ApiController):
 
         metric_type_id = None
         if metric_type is not None:
-            metric_types = self.manager.get_service_metric_types(name=metric_type)
-            if len(metric_types) > 0:
-                metric_type_id = metric_types[0].id
+            metric_type_id = self.get_service_metric_type_id(metric_type)
 
         self.resolve_fk_id("service_instance_id", self.get_service_instance, kvargs)
 
@@ -1083,30 +1132,37 @@ class ServiceController(ApiController):
         this implementation write metrics on database and on eleastic search.
         Can now have an account id/uuid in order of pre loading information abaout account services.
         Recive a single metric definition or a list of metrics for implementing a bulk insert of metrics.
+        When bulk is True the list of metrics is ingested set based: metric types and services are resolved
+        with a few IN queries, rows are inserted with a single bulk save and documents are sent to elastic
+        search with the _bulk helper. In bulk mode metrics with unknown service or metric type or with an invalid
+        value are skipped and logged so they do not fail the whole batch.
 
         Args:
             data (dict):  data recived from view
         account:[int, str, None]  the account id or uuid
         metric = matrice definition or list of metric definition
+        bulk: bool if True use set based ingest for the list of metrics
 
         Raises:
             ApiManagerError: if som trosuction fail
 
         Returns:
-            int: last generated metric id
+            int: last generated metric id, or number of inserted metrics in bulk mode
         """
         # from beecell.debug import dbgprint
 
         ret: int = 0
         dummyjob: dict = {}
         servinfo: dict = {}
-        metricsbyname: dict = {}
-        metricsbyid: dict = {}
+        servinfobyoid: dict = {}
+        mtbyname: Dict[str, int] = {}
+        mtbyid: Dict[int, str] = {}
         dao: ServiceDbManager = self.manager
 
         account_id: Union[int, str, None] = data.get("account", None)
         metrics = data.get("metrics", None)
         metric = data.get("metric", None)
+        bulk: bool = data.get("bulk", False)
 
         def get_job(job: dict) -> int:
             if job.get("dummy", None) is None:
@@ -1128,31 +1184,100 @@ class ServiceController(ApiController):
                     status=SrvStatusType.DRAFT,
                 )
                 res = self.add_service_metric_type_base(mt)
-                metricsbyname[name] = res.id
-                metricsbyid[str(res.id)] = name
                 return res.id
 
             except (QueryError, TransactionError) as ex:
                 self.logger.error(ex, exc_info=True)
                 raise ApiManagerError(ex, code=ex.code)
 
-        def reindex(idx: dict, intvalue: bool = True) -> dict:
-            """reindex  take a
+        def index_servinfo(info: dict):
+            """add service info to the resource_uuid index and to the service id/uuid index
+
+            Args:
+                info (dict): service info as returned by get_service_info
+            """
+            if info["resource_uuid"] not in servinfo:
+                servinfo[info["resource_uuid"]] = info
+            servinfobyoid[str(info["service_id"])] = info
+            servinfobyoid[info["service_uuid"]] = info
+
+        def prefetch(metricitems: List[dict]):
+            """resolve with few set based queries all the services and metric types referenced by metricitems and
+            not yet indexed. Metric types missing in the process wide metric type registry are searched with a
+            single reload of the registry, metric type names still missing are created once.
+
+            Args:
+                metricitems (List[dict]): metrics recived from view
+            """
+            res_uuids = set()
+            si_ids = set()
+            si_uuids = set()
+            mt_names = set()
+            mt_ids = set()
+            for metricitem in metricitems:
+                if metricitem.get("metric_type", None) is not None:
+                    mt_names.add(metricitem["metric_type"])
+                elif str(metricitem.get("metric_type_id", None)).isdigit():
+                    mt_ids.add(int(metricitem["metric_type_id"]))
+                res_uuid = metricitem.get("resource_uuid", None)
+                si_oid = metricitem.get("service_instance_oid", None)
+                if res_uuid is not None:
+                    if res_uuid not in servinfo:
+                        res_uuids.add(res_uuid)
+                elif si_oid is not None and str(si_oid) not in servinfobyoid:
+                    if is_uuid(si_oid):
+                        si_uuids.add(si_oid)
+                    elif str(si_oid).isdigit():
+                        si_ids.add(int(si_oid))
+
+            if len(res_uuids) > 0 or len(si_ids) > 0 or len(si_uuids) > 0:
+                infos = dao.get_service_info_list(
+                    ids=list(si_ids), uuids=list(si_uuids), resource_uuids=list(res_uuids)
+                )
+                for info in infos:
+                    index_servinfo(info)
+            self.logger.debug("Prefetch %s services" % (len(res_uuids) + len(si_ids) + len(si_uuids)))
+
+            mtbyname.update(self.get_service_metric_type_idx())
+            if not mt_names.issubset(mtbyname) or not mt_ids.issubset(mtbyname.values()):
+                self.metric_type_registry.invalidate()
+                mtbyname.update(self.get_service_metric_type_idx())
+            for name in mt_names.difference(mtbyname):
+                mtbyname[name] = newmetric(name)
+            mtbyid.update({v: k for k, v in mtbyname.items()})
+
+        def reject(metricitem: dict, metric: dict) -> Optional[str]:
+            """check a normalized metric before the bulk insert
 
             Args:
-                idx dict: dictionary used as index
-                intvalue (bool, optional): _description_. Defaults to True.
+                metricitem (dict): metric recived from view
+                metric (dict): the metric created by normalize function
 
             Returns:
-                dict: _description_
+                Optional[str]: the reason why the metric can not be inserted, None if it is valid
             """
-            ret = {}
-            for k in idx.keys():
-                ret[str(idx[k])] = k
+            if metric["metric_type_id"] is None:
+                return "unknown metric type %s" % (metricitem.get("metric_type") or metricitem.get("metric_type_id"))
+            if not metric.get("service_found", False):
+                si_oid = metricitem.get("resource_uuid") or metricitem.get("service_instance_oid")
+                return "unknown service %s" % si_oid
+            try:
+                metric["value"] = float(metric["value"])
+            except (TypeError, ValueError):
+                return "invalid value %s" % metric["value"]
+            return None
+
+        def normalize(metricitem: dict, lookup: bool = True) -> dict:
+            """normalize a metric recived from view
 
-            return ret
+            Args:
+                metricitem (dict): metric recived from view
+                lookup (bool): if True metric types and services not prefetched are searched on database,
+                    if False only the prefetched ones are used
 
-        def normalize(metricitem: dict) -> dict:
+            Returns:
+                dict: the normalized metric
+            """
             si_oid = metricitem.get("service_instance_oid", None)
             metric = {
                 "account_id": 0,
@@ -1186,17 +1311,21 @@ class ServiceController(ApiController):
             # sanify metric_type metric_type_id
             if metric["metric_type"] is not None:
                 mt_name = metric["metric_type"]
-                mt_id = metricsbyname.get(mt_name, None)
-                if mt_id is None:
-                    _, mt_id = dao.get_service_metric_types_info(name=mt_name)
-                if mt_id is None:
-                    mt_id = newmetric(mt_name)
+                if lookup:
+                    mt_id = self.get_service_metric_type_id(mt_name)
+                    if mt_id is None:
+                        mt_id = newmetric(mt_name)
+                else:
+                    mt_id = mtbyname.get(mt_name, None)
             else:
                 ## by validation rule assume metric_type_id is set
                 mt_id = metric["metric_type_id"]
-                mt_name = metricsbyid.get(str(mt_id), None)
+                if lookup:
+                    mt_name = self.get_service_metric_type_name(mt_id)
+                elif str(mt_id).isdigit():
+                    mt_name = mtbyid.get(int(mt_id), None)
                 if mt_name is None:
-                    mt_name, mt_id = dao.get_service_metric_types_info(id=mt_id)
+                    mt_id = None
             metric["metric_type_id"] = mt_id
             metric["metric_type"] = mt_name
 
@@ -1207,18 +1336,14 @@ class ServiceController(ApiController):
             if metric["resource_uuid"] is not None:
                 # get service by resource_uuid check if pre-collectetd by account otherwise  get fro db
                 info = servinfo.get(metric["resource_uuid"], None)
-                if info is None:
+                if info is None and lookup:
                     info = dao.get_service_info(resource_uuid=metric["resource_uuid"])
             else:
                 # serche service
                 if si_oid is not None:
                     # get service info by uuid check if pre-collectetd by account otherwise  get fro db
-                    for k in servinfo.keys():
-                        i = servinfo[k]
-                        if i["service_id"] == si_oid or i["service_uuid"] == si_oid:
-                            info = i
-                            break
-                    if info is None:
+                    info = servinfobyoid.get(str(si_oid), None)
+                    if info is None and lookup:
                         if is_uuid(si_oid):
                             info = dao.get_service_info(uuid=si_oid)
                         else:
@@ -1227,6 +1352,7 @@ class ServiceController(ApiController):
             if info is None:
                 return metric
 
+            metric["service_found"] = True
             metric["resource_uuid"] = info.get("resource_uuid", 0)
             metric["service_instance_id"] = info.get("service_id", 0)
             metric["service_instance_uuid"] = info.get("service_uuid", 0)
@@ -1248,6 +1374,46 @@ class ServiceController(ApiController):
             res = self.manager.add(srv_m)
             return res.id
 
+        def dbmetrics(metricitems: List[dict]) -> int:
+            """add metrics to database with a single bulk insert
+
+            Args:
+                metricitems (List[dict]): the metrics to add created by normalize function
+
+            Returns:
+                int: number of inserted metrics
+            """
+            srv_ms = [
+                ServiceMetric(
+                    value=metricitem["value"],
+                    metric_type_id=metricitem["metric_type_id"],
+                    metric_num=0,
+                    service_instance_id=metricitem["service_instance_id"],
+                    job_id=metricitem["job_id"],
+                    resource_uuid=metricitem["resource_uuid"],
+                    creation_date=metricitem["creation_date"],
+                )
+                for metricitem in metricitems
+            ]
+            self.manager.bulk_save_entities(srv_ms)
+            self.logger.debug("Bulk insert %s metrics" % len(srv_ms))
+            return len(srv_ms)
+
+        def elasticdocument(metricitem: dict) -> dict:
+            return {
+                "metric_type": metricitem.get("metric_type", None),
+                "value": metricitem.get("value", None),
+                "metric_num": metricitem.get("metric_num", 0),
+                "service_instance_id": metricitem.get("service_instance_id", None),
+                "service_instance_uuid": metricitem.get("service_instance_uuid", None),
+                "resource_uuid": metricitem.get("resource_uuid", None),
+                "creation_date": format_date(metricitem.get("creation_date", datetime.now())),
+            }
+
+        def elasticindex() -> str:
+            prefix = "cmp-metrics-instantconsume"
+            return "%s-%s" % (prefix, datetime.now().date().strftime("%Y.%m.%d"))
+
         def elasticmetric(metricitem: dict):
             """add metric to elastic index
 
@@ -1257,31 +1423,32 @@ class ServiceController(ApiController):
             try:
                 from elasticsearch import Elasticsearch
 
-                prefix = "cmp-metrics-instantconsume"
-                index = "%s-%s" % (prefix, datetime.now().date().strftime("%Y.%m.%d"))
-
+                index = elasticindex()
                 elastic: Elasticsearch = self.api_manager.elasticsearch
-                resp = elastic.index(
-                    index=index,
-                    document={
-                        "metric_type": metricitem.get("metric_type", None),
-                        "value": metricitem.get("value", None),
-                        "metric_type": metricitem.get("metric_type", None),
-                        "metric_num": metricitem.get("metric_num", 0),
-                        "service_instance_id": metricitem.get("service_instance_id", None),
-                        "service_instance_uuid": metricitem.get("service_instance_uuid", None),
-                        "resource_uuid": metricitem.get("resource_uuid", None),
-                        "creation_date": format_date(metricitem.get("creation_date", datetime.now())),
-                    },
-                )
+                resp = elastic.index(index=index, document=elasticdocument(metricitem))
                 self.logger.debug("SENT ELASTICSEARCH " + index + " " + str(resp))
 
             except Exception as ex:
-                print("EXCEPTION ", ex)
                 self.logger.error(ex)
-                # raise NotImplementedError("Elastimetric not jet implemented")
-            if True:
-                return
+
+        def elasticmetrics(metricitems: List[dict]):
+            """add metrics to elastic index using the _bulk helper
+
+            Args:
+                metricitems (List[dict]): the metrics to add created by normalize function
+            """
+            try:
+                from elasticsearch import Elasticsearch
+                from elasticsearch.helpers import bulk as elastic_bulk
+
+                index = elasticindex()
+                elastic: Elasticsearch = self.api_manager.elasticsearch
+                actions = ({"_index": index, "_source": elasticdocument(m)} for m in metricitems)
+                success, errors = elastic_bulk(elastic, actions, raise_on_error=False)
+                self.logger.debug("SENT ELASTICSEARCH %s: %s documents, errors: %s" % (index, success, errors))
+
+            except Exception as ex:
+                self.logger.error(ex)
 
         # check authorization only administrator can insert metrics
         # do all on all accounts
@@ -1301,14 +1468,26 @@ class ServiceController(ApiController):
 
         if type(metrics) == list:
             if len(metrics) > 1 and account_id is not None:
-                servinfo = dao.get_service_info_for_account(account_id)
-                metricsbyname: dict = dao.get_service_metric_types_dict(byname=True)
-                metricsbyid: dict = reindex(metricsbyname, intvalue=True)
-
-            for m in metrics:
-                norma = normalize(m)
-                ret = dbmetric(norma)
-                elasticmetric(norma)
+                for info in dao.get_service_info_for_account(account_id).values():
+                    index_servinfo(info)
+
+            if bulk:
+                prefetch(metrics)
+                normas = []
+                for m in metrics:
+                    norma = normalize(m, lookup=False)
+                    reason = reject(m, norma)
+                    if reason is not None:
+                        self.logger.warning("Skip metric %s: %s" % (m, reason))
+                        continue
+                    normas.append(norma)
+                ret = dbmetrics(normas)
+                elasticmetrics(normas)
+            else:
+                for m in metrics:
+                    norma = normalize(m)
+                    ret = dbmetric(norma)
+                    elasticmetric(norma)
 
         if type(metric) == dict:
             norma = normalize(metric)
@@ -1472,6 +1651,29 @@ class ServiceController(ApiController):
     ############################
     ###  ServiceMetricType   ###
     ############################
+    def get_service_metric_type_id(self, name: str) -> Optional[int]:
+        """Get service metric type id from name using the process wide metric type registry.
+
+        :param name: metric type name
+        :return: metric type id or None
+        """
+        return self.metric_type_registry.get_id(self.manager, name)
+
+    def get_service_metric_type_name(self, oid: int) -> Optional[str]:
+        """Get service metric type name from id using the process wide metric type registry.
+
+        :param oid: metric type id
+        :return: metric type name or None
+        """
+        return self.metric_type_registry.get_name(self.manager, oid)
+
+    def get_service_metric_type_idx(self) -> Dict[str, int]:
+        """Get service metric type ids indexed by name using the process wide metric type registry.
+
+        :return: dict {name: id}
+        """
+        return self.metric_type_registry.get_idx(self.manager)
+
     @trace(entity="ApiServiceMetricType", op="view")
     def get_service_metric_type(self, oid):
         """Get single service_metric_type.
@@ -1575,6 +1777,7 @@ class ServiceController(ApiController):
 
             res = self.manager.add(smt)
             ApiServiceMetricType(self, oid=res.id).register_object([res.objid], desc=res.name)
+            self.metric_type_registry.register(res.name, res.id)
             self.logger.debug("Add service metric type: %s" % res)
             return res
         except (QueryError, TransactionError) as ex:
@@ -1658,7 +1861,9 @@ class ServiceController(ApiController):
                     mtl.desc = item.get("desc")
                     self.manager.update(mtl)
 
-            return srv_mt.update(**data)
+            res = srv_mt.update(**data)
+            self.metric_type_registry.invalidate()
+            return res
 
         except (QueryError, TransactionError) as ex:
             self.logger.error(ex, exc_info=True)
@@ -1690,6 +1895,7 @@ class ServiceController(ApiController):
 
                 srv_mt.deregister_object(srv_mt.objid.split("//"))
 
+            self.metric_type_registry.invalidate()
             return res
         except (QueryError, TransactionError) as ex:
             self.logger.error(ex, exc_info=True)
@@ -2099,6 +2305,79 @@ class ServiceController(ApiController):
         self.logger.debug("Get service type plugin from instance %s: %s" % (instance, plugin))
         return plugin
 
+    def load_page_cursor_key(self):
+        """Load from the api config the secret used to sign the page cursors. All the api workers of an installation
+        must share the same secret
+
+        :raises ApiManagerError: if the secret is not configured
+        """
+        secret = getattr(self.api_manager, "params", {}).get(__SRV_PAGE_CURSOR_SECRET_PARAM__, None)
+        if secret is None or str(secret) == "":
+            raise ApiManagerError("Api config param %s is not set" % __SRV_PAGE_CURSOR_SECRET_PARAM__)
+        self.page_cursor_key = str(secret).encode("utf-8")
+
+    def __get_page_cursor_key(self) -> bytes:
+        if self.page_cursor_key is None:
+            raise ApiManagerError("Page cursor secret is not loaded", code=500)
+        return self.page_cursor_key
+
+    def encode_page_cursor(self, last_id: int, order: str = "DESC") -> str:
+        """Encode an opaque signed cursor token pointing after the last entity of a page sorted by id
+
+        :param last_id: id of the last entity of the page
+        :param order: sort order [default=DESC]
+        :return: cursor token
+        """
+        payload = base64.urlsafe_b64encode(json.dumps({"f": "id", "o": order.upper(), "v": last_id}).encode("utf-8"))
+        sign = hmac.new(self.__get_page_cursor_key(), payload, hashlib.sha256).hexdigest()[:32]
+        return "%s.%s" % (payload.decode("utf-8"), sign)
+
+    def decode_page_cursor(self, token: str) -> dict:
+        """Decode a cursor token created by encode_page_cursor
+
+        :param token: cursor token
+        :return: dict with cursor_id and order
+        :raises ApiManagerError: if the token is not valid
+        """
+        key = self.__get_page_cursor_key()
+        try:
+            payload, sign = token.split(".")
+            check = hmac.new(key, payload.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+            if hmac.compare_digest(check, sign) is False:
+                raise ValueError("bad signature")
+            cursor = json.loads(base64.urlsafe_b64decode(payload.encode("utf-8")))
+            return {"cursor_id": int(cursor["v"]), "order": cursor["o"]}
+        except Exception as ex:
+            self.logger.warning("Invalid page cursor %s: %s" % (token, ex))
+            raise ApiManagerError("NextToken %s is not valid" % token, code=400)
+
+    def get_page_search_params(self, token: str) -> dict:
+        """Convert a NextToken to search params. Numeric tokens are legacy page numbers, other tokens are cursors
+        produced by encode_page_cursor that are applied as seek predicate on the id
+
+        :param token: NextToken [optional]
+        :return: dict with page and cursor params
+        """
+        if token is None or str(token).isdigit():
+            return {"page": int(token or 0)}
+        params = self.decode_page_cursor(token)
+        params["page"] = 0
+        return params
+
+    def get_next_page_token(self, page_info: dict, size: int, order: str = "DESC") -> Union[str, None]:
+        """Get the cursor token of the page following the current one. The token is computed from the page read on
+        database, not from the entities returned to the client, because some of them can be dropped while they are
+        converted
+
+        :param page_info: page read on database as filled by get_service_type_plugins, dict with last_id and count
+        :param size: page size
+        :param order: sort order [default=DESC]
+        :return: cursor token or None when there are no more pages
+        """
+        if size is None or size <= 0 or page_info.get("count", 0) < size or page_info.get("last_id") is None:
+            return None
+        return self.encode_page_cursor(page_info["last_id"], order=order)
+
     @trace(entity="ApiServiceInstance", op="view")
     def get_service_type_plugins(self, *args, **kvargs) -> Tuple[List['ApiServiceTypePlugin'], int]:
         """Get service type plugins related to queried service instances.
@@ -2142,12 +2421,17 @@ class ServiceController(ApiController):
         :param size: number of entities to show in list per page [default=0]
         :param order: sort order [default=DESC]
         :param field: sort field [default=id]
+        :param cursor_id: return entities after this id, used as seek predicate in place of page [optional]
+        :param nocount: if True do not count the total number of entities [optional]
+        :param page_info: dict filled with last_id and count of the page read on database, used by
+            get_next_page_token [optional]
         :return: List of service type plugin instance
         :raises ApiManagerError: if query empty return error.
         """
         res = []
         objs = []
         tags = []
+        page_info = kvargs.pop("page_info", None)
 
         if operation.authorize is True:
             # verify permissions
@@ -2178,11 +2462,11 @@ class ServiceController(ApiController):
         try:
             insts: List['ServiceTypePluginInstance']
             total_insts: int
-            if kvargs.get("simple", False) is True:
-                insts, total_insts = self.manager.get_paginated_service_type_plugins_optimized(tags=tags, *args, **kvargs)
-            else:
-                insts, total_insts = self.manager.get_paginated_service_type_plugins(tags=tags, *args, **kvargs)
-            
+            insts, total_insts = self.manager.get_paginated_service_type_plugins(tags=tags, *args, **kvargs)
+            if page_info is not None:
+                page_info["count"] = len(insts)
+                page_info["last_id"] = insts[-1].id if len(insts) > 0 else None
+
             inst_class = None
 
             # get indexes
@@ -2393,8 +2677,9 @@ class ServiceController(ApiController):
             return plugin
 
         try:
-            # run pre create
-            params = plugin.pre_create(**params)
+            # run pre create, config changes are written once at the end
+            with inst.config_batch():
+                params = plugin.pre_create(**params)
             sync = params.pop("sync", False)
         except Exception:
             plugin.expunge_instance()
@@ -2781,6 +3066,7 @@ class ServiceController(ApiController):
             )
 
             res = self.manager.add(srv_type)
+            self.catalog_cache.invalidate()
             # create object and permission
 
             ApiServiceConfig(self, oid=res.id).register_object(objid.split("//"), desc=name)
@@ -3005,6 +3291,7 @@ class ServiceController(ApiController):
             )
 
             res = self.manager.add(srv_def)
+            self.catalog_cache.invalidate()
             self.logger.debug("Added Service Definition: %s" % res)
 
             # create the service link
@@ -3024,17 +3311,32 @@ class ServiceController(ApiController):
             self.logger.error(ex, exc_info=True)
             raise ApiManagerError(ex, code=ex.code)
 
-    def get_catalog_service_definitions(self, size=10, page=0, plugintype="ComputeInstance", def_uuids=None):
+    def get_catalog_service_definitions(
+        self, size=10, page=0, plugintype="ComputeInstance", def_uuids=None, with_etag=False
+    ):
         """Get service definitions relative to visible catalog
 
         :param size: number of item to query
         :param page: page of query
         :param plugintype: plugintype
         :param def_uuids: list of definitions id or uuid
+        :param with_etag: if True return also the entity tag of the listing [default=False]
         :return: list of service definitions
         """
         if def_uuids is None:
             def_uuids = []
+
+        # visible catalogs depend on the user permissions
+        user = operation.user[0] if getattr(operation, "user", None) is not None else None
+        key = ("catalog_service_definitions", user, size, page, plugintype, tuple(def_uuids))
+        return self.get_cached_catalog(
+            key,
+            lambda: self.__get_catalog_service_definitions(size, page, plugintype, def_uuids),
+            with_etag=with_etag,
+        )
+
+    def __get_catalog_service_definitions(self, size, page, plugintype, def_uuids):
+        """Read and format the service definitions relative to visible catalog"""
         args = []
         kwargs = {}
 
@@ -4526,6 +4828,69 @@ class ServiceController(ApiController):
         account.services = services.get(account.oid, {})
         return account
 
+    def get_accounts_container_service(self, account_ids: List[Union[int, str]], plugintype: str) -> List[Tuple]:
+        """Resolve a list of account ids, uuids or names and their container service with one query. Permissions
+        are still checked for each account and container service: accounts that can not be viewed are skipped
+
+        :param account_ids: list of account id, uuid or name
+        :param plugintype: plugin type name of the container service
+        :return: list of (ApiAccount, container service resource uuid or None, True if container service exists)
+        :raises ApiManagerError: if an account does not exist
+        """
+        ids, uuids, names = [], [], []
+        for account_id in account_ids:
+            account_id = str(account_id)
+            if account_id.isdigit():
+                ids.append(int(account_id))
+            elif is_uuid(account_id):
+                uuids.append(account_id)
+            else:
+                names.append(account_id)
+
+        rows = self.manager.get_accounts_with_container_service(
+            plugintype, account_ids=ids, account_uuids=uuids, account_names=names
+        )
+        index = {}
+        for account, service_id, service_objid, resource_uuid in rows:
+            # keep the first container service like get_service_instances()[0]
+            for key in (str(account.id), account.uuid, account.name):
+                index.setdefault(key, (account, service_id, service_objid, resource_uuid))
+
+        res = []
+        for account_id in account_ids:
+            item = index.get(str(account_id))
+            if item is None:
+                raise ApiManagerError("Account %s not found" % account_id, code=404)
+            account, service_id, service_objid, resource_uuid = item
+            if operation.authorize is True:
+                try:
+                    self.check_authorization(ApiAccount.objtype, ApiAccount.objdef, account.objid, "view")
+                except ApiManagerError as ex:
+                    if ex.code != 403:
+                        raise
+                    self.logger.warning("account %s can not be viewed" % account_id)
+                    continue
+                if service_id is not None:
+                    try:
+                        self.check_authorization(
+                            ApiServiceInstance.objtype, ApiServiceInstance.objdef, service_objid, "view"
+                        )
+                    except ApiManagerError as ex:
+                        if ex.code != 403:
+                            raise
+                        service_id = None
+            api_account = ApiAccount(
+                self,
+                oid=account.id,
+                objid=account.objid,
+                name=account.name,
+                desc=account.desc,
+                active=account.active,
+                model=account,
+            )
+            res.append((api_account, resource_uuid if service_id is not None else None, service_id is not None))
+        return res
+
     @trace(entity="ApiAccount", op="view")
     def get_accounts(self, *args, **kvargs):
         """Get accounts.
@@ -5068,6 +5433,7 @@ class ServiceController(ApiController):
             objid = id_gen()
             srv_cat = ServiceCatalog(objid=objid, name=name, desc=desc, active=active, version=version)
             cat = self.manager.add(srv_cat)
+            self.catalog_cache.invalidate()
 
             # create object and permission for Account
             api_cat = ApiServiceCatalog(
@@ -5165,6 +5531,7 @@ class ServiceController(ApiController):
             res1 = self.manager.add_service_catalog_def(catalog.model, definition.model)
             res.append(res1)
             self.logger.debug("Add service definition %s to service catalog %s" % (def_oid, catalog_oid))
+        self.catalog_cache.invalidate()
 
         return res
 
@@ -5187,6 +5554,7 @@ class ServiceController(ApiController):
             res1 = self.manager.delete_service_catalog_def(catalog.model, definition.model)
             res.append(res1)
             self.logger.debug("Delete service definition %s from service catalog %s" % (def_oid, catalog_oid))
+        self.catalog_cache.invalidate()
 
         return res
 
@@ -5676,8 +6044,9 @@ class ServiceController(ApiController):
 
         return items
 
-    def get_user_roles(self, user_name=None, group_name=None, group_id_list=None, size=10):
+    def get_user_roles(self, user_name=None, group_name=None, group_id_list=None, size=10, cache=False):
         """Get list of role for a user
+        :param cache: if True read and store the response in a short lived cache [default=False]
         :return: Dictionary with roles.
         :rtype: dict
         :raises ApiManagerError: raise :class:`.ApiManagerError`
@@ -5695,12 +6064,21 @@ class ServiceController(ApiController):
 
         data["size"] = size
 
+        key = ("roles", user_name, group_name, tuple(group_id_list or []), size)
+        if cache is True:
+            res = self.auth_cache.get(key)
+            if res is not None:
+                return res
+
         res = self.api_client.admin_request("auth", "/v1.0/nas/roles", "get", data=urlencode(data))
 
+        if cache is True:
+            self.auth_cache.set(key, res)
         return res
 
-    def get_user_groups(self, user_name, size=10):
+    def get_user_groups(self, user_name, size=10, cache=False):
         """Get list of user group
+        :param cache: if True read and store the response in a short lived cache [default=False]
         :return: Dictionary with group.
         :rtype: dict
         :raises ApiManagerError: raise :class:`.ApiManagerError`
@@ -5708,10 +6086,56 @@ class ServiceController(ApiController):
 
         data = {"user": user_name, "size": size, "active": True}
 
+        key = ("groups", user_name, size)
+        if cache is True:
+            res = self.auth_cache.get(key)
+            if res is not None:
+                return res
+
         res = self.api_client.admin_request("auth", "/v1.0/nas/groups", "get", data=urlencode(data))
 
+        if cache is True:
+            self.auth_cache.set(key, res)
         return res
 
+    def get_user_and_groups_roles(self, user_name, pool_size=__SRV_AUTH_POOL_SIZE__, cache=True):
+        """Get the roles of a user and of all its groups. Role requests to the auth api are run concurrently on a
+        gevent pool, so the wall time follows the slowest request and not the sum of all requests
+
+        :param user_name: user name
+        :param pool_size: max number of concurrent requests [default=__SRV_AUTH_POOL_SIZE__]
+        :param cache: if True use the short lived auth cache [default=True]
+        :return: list of roles
+        :raises ApiManagerError: raise :class:`.ApiManagerError`
+        """
+        import gevent
+        from gevent.pool import Pool
+        from uuid import uuid4
+        from beehive.common.data import get_operation_params, set_operation_params
+
+        groups = self.get_user_groups(user_name, size=0, cache=cache).get("groups", [])
+        requests = [{"group_name": g.get("id")} for g in groups]
+        requests.append({"user_name": user_name})
+
+        def get_roles(request):
+            operation.id = str(uuid4())
+            set_operation_params(operation_params)
+            return self.get_user_roles(size=0, cache=cache, **request).get("roles")
+
+        operation_params = get_operation_params()
+        pool = Pool(min(pool_size, len(requests)))
+        jobs = [pool.spawn(get_roles, request) for request in requests]
+        gevent.joinall(jobs)
+
+        roles = []
+        for job in jobs:
+            if isinstance(job.exception, ApiManagerError):
+                raise job.exception
+            if job.exception is not None:
+                raise ApiManagerError(job.exception)
+            roles.extend(job.value)
+        return roles
+
     ###### Service instant consume ########################
     def _format_get_service_instant_consume(self, *args, **kvargs):
         service_plugin_types = self.get_service_plugin_type(
@@ -6047,16 +6471,14 @@ class ServiceController(ApiController):
 
         return {"credit_composition": credit_composition}
 
-    def _format_report_costcomsume(
-        self,
-        account_ids,
-        year_month,
-        start_date,
-        end_date,
-        report_mode,
-        *args,
-        **kvargs,
-    ):
+    def _get_report_period(self, year_month, start_date, end_date):
+        """Get report period
+
+        :param year_month: report month like YYYY-MM [optional]
+        :param start_date: report start date [optional]
+        :param end_date: report end date [optional]
+        :return: first day string, last day string, start period, end period
+        """
         first_month_str = None
         last_month_str = None
 
@@ -6079,88 +6501,128 @@ class ServiceController(ApiController):
             start_period = start_date
             end_period = end_date
 
+        return first_month_str, last_month_str, start_period, end_period
+
+    def _check_report_accounts(self, account_ids):
+        """Resolve report accounts and check use authorization on each of them once
+
+        :param account_ids: array of account id or uuid
+        :return: array of account id
+        """
+        account_id_list = []
+        for id in account_ids:
+            account = self.get_entity(ApiAccount, Account, id)
+            # check authorization
+            self.check_authorization(ApiAccount.objtype, ApiAccount.objdef, account.objid, "use")
+            account_id_list.append(account.oid)
+        return account_id_list
+
+    def _get_report_services(self, account_ids, first_month_str, last_month_str):
+        """Get report services summary with a single grouped query for all the plugins
+
+        :param account_ids: array of account id
+        :param first_month_str: period start date
+        :param last_month_str: period end date
+        :return: total amount, dict of services indexed by plugin name
+        """
         plugin_containers = self.manager.get_plugin_type_by_account(
             account_ids=account_ids, category=SrvPluginTypeCategory.CONTAINER
         )
 
-        # capabilities = []
-        # for a in account_ids:
-        #     capabilities.extend(self.get_account(a).model.capabilities_list())
-        # self.logger.warning('capabilities=%s' % capabilities)
+        def new_service(plugin_name):
+            return {
+                "name": plugin_name,
+                "plugin_name": plugin_name,
+                "total": 0.0,
+                "summary_consume": [],
+                "details": [],
+            }
+
+        services = {}
+        for plugin_name in plugin_containers or []:
+            services[plugin_name] = new_service(plugin_name)
+
+        try:
+            monthly_cost = self.manager.get_report_cost_monthly_by_accounts(
+                account_ids, start_date=first_month_str, end_date=last_month_str
+            )
+        except (QueryError, TransactionError) as ex:
+            self.logger.error(ex, exc_info=True)
+            raise ApiManagerError(ex, code=ex.code)
 
         imp_periodo = 0.0
-        services = []
-        for plugin_name in plugin_containers:
-            service = {"name": plugin_name, "plugin_name": plugin_name}
-            monthly_cost = self.get_report_cost_monthly_by_accounts(
-                account_ids,
-                start_date=first_month_str,
-                end_date=last_month_str,
-                plugin_name=plugin_name,
+        for m in monthly_cost:
+            service = services.get(m.get("plugin_name"), None)
+            if service is None:
+                service = services[m.get("plugin_name")] = new_service(m.get("plugin_name"))
+            service["total"] += m.get("cost", 0.0)
+            imp_periodo += m.get("cost", 0.0)
+            service["summary_consume"].append(
+                {
+                    "metric_type_id": m.get("metric_type_id", -1),
+                    "name": m.get("name", "<unknow>"),
+                    "unit": m.get("measure_unit", ""),
+                    "qta": m.get("value", 0.0),
+                    "amount": m.get("cost", 0.0),
+                }
             )
-            sintesi = []
-            imp_service = 0.0
-            for m in monthly_cost:
-                imp_service += m.get("cost", 0.0)
-                sintesi.append(
-                    {
-                        "metric_type_id": m.get("metric_type_id", -1),
-                        "name": m.get("name", "<unknow>"),
-                        "unit": m.get("measure_unit", ""),
-                        "qta": m.get("value", 0.0),
-                        "amount": m.get("cost", 0.0),
-                    }
-                )
 
-            imp_periodo += imp_service
-            service["total"] = imp_service
-            service["summary_consume"] = sintesi
-
-            dettaglio = []
-            daily_cost, total = [], 0
-            if report_mode == __SRV_REPORT_COMPLETE_MODE__:
-                daily_cost, total = self.get_report_list_by_account(
-                    account_ids,
-                    plugin_name=plugin_name,
-                    period_start=first_month_str,
-                    period_end=last_month_str,
-                    size=0,
-                )
+        return imp_periodo, services
 
-                period = None
-                total_day = 0.0
-                day = {}
-                metrics = []
-                for rc in daily_cost:
-                    if period is not None and period != rc.period:
-                        day["day"] = "" if period is None else period
-                        day["total"] = total_day
-                        day["metrics"] = metrics
-                        dettaglio.append(day)
-                        total_day = 0.0
-                        day = {}
-                        metrics = []
-
-                    period = rc.period
-                    metrics.append(
-                        {
-                            "metric_type_id": rc.metric_type_id,
-                            "name": rc.metric_type.name,
-                            "unit": rc.metric_type.measure_unit,
-                            "qta": rc.value,
-                            "amount": rc.cost,
-                        }
-                    )
+    def _iter_report_days(self, rows):
+        """Fold daily report costs rows, ordered by plugin name and period, into days while they are read
+
+        :param rows: iterable on rows (plugin_name, period, metric_type_id, name, measure_unit, value, cost)
+        :return: generator of (plugin_name, day)
+        """
+        plugin_name = None
+        day = None
+        for row in rows:
+            if day is not None and (row[0] != plugin_name or row[1] != day["day"]):
+                yield plugin_name, day
+                day = None
+
+            if day is None:
+                plugin_name = row[0]
+                day = {"day": row[1], "total": 0.0, "metrics": []}
+
+            day["metrics"].append(
+                {
+                    "metric_type_id": row[2],
+                    "name": row[3],
+                    "unit": row[4],
+                    "qta": row[5],
+                    "amount": row[6],
+                }
+            )
+            day["total"] += row[6]
 
-                    total_day += rc.cost
+        if day is not None:
+            yield plugin_name, day
 
-                day["day"] = "" if period is None else period
-                day["total"] = total_day
-                day["metrics"] = metrics
-                dettaglio.append(day)
+    def _format_report_costcomsume(
+        self,
+        account_ids,
+        year_month,
+        start_date,
+        end_date,
+        report_mode,
+        *args,
+        **kvargs,
+    ):
+        first_month_str, last_month_str, start_period, end_period = self._get_report_period(
+            year_month, start_date, end_date
+        )
+        account_ids = self._check_report_accounts(account_ids)
+        imp_periodo, services = self._get_report_services(account_ids, first_month_str, last_month_str)
 
-            service["details"] = dettaglio
-            services.append(service)
+        if report_mode == __SRV_REPORT_COMPLETE_MODE__:
+            rows = self.manager.iter_report_costs_by_accounts(
+                account_ids, start_date=first_month_str, end_date=last_month_str, **kvargs
+            )
+            for plugin_name, day in self._iter_report_days(rows):
+                if plugin_name in services:
+                    services[plugin_name]["details"].append(day)
 
         res = {
             "date_report": str(date.today()),
@@ -6169,10 +6631,109 @@ class ServiceController(ApiController):
                 "end_date": format_date(end_period),
             },
             "amount": imp_periodo,
-            "services": services,
+            "services": list(services.values()),
         }
         return res
 
+    def iter_report_costcomsume(
+        self,
+        account_ids,
+        year_month,
+        start_date,
+        end_date,
+        report_mode,
+        output="json",
+        header=None,
+    ):
+        """Stream the cost consume report. Daily costs are read from the database in chunks and written out as
+        soon as a day is complete, so the whole report is never held in memory.
+
+        :param account_ids: array of account id or uuid
+        :param year_month: report month like YYYY-MM [optional]
+        :param start_date: report start date [optional]
+        :param end_date: report end date [optional]
+        :param report_mode: SUMMARY or COMPLETE
+        :param output: json or csv [default=json]
+        :param header: dict of fields written at the top of the json report [optional]
+        :return: generator of report text chunks
+        """
+        first_month_str, last_month_str, start_period, end_period = self._get_report_period(
+            year_month, start_date, end_date
+        )
+        account_ids = self._check_report_accounts(account_ids)
+        imp_periodo, services = self._get_report_services(account_ids, first_month_str, last_month_str)
+
+        rows = None
+        if report_mode == __SRV_REPORT_COMPLETE_MODE__:
+            rows = self.manager.iter_report_costs_by_accounts(
+                account_ids, start_date=first_month_str, end_date=last_month_str
+            )
+
+        if output == "csv":
+            return self.__iter_report_csv(services, rows, first_month_str, last_month_str)
+
+        head = {} if header is None else dict(header)
+        head.update(
+            {
+                "date_report": str(date.today()),
+                "period": {
+                    "start_date": format_date(start_period),
+                    "end_date": format_date(end_period),
+                },
+                "amount": imp_periodo,
+            }
+        )
+        return self.__iter_report_json(head, services, rows or [])
+
+    def __iter_report_json(self, head, services, rows):
+        def open_service(service):
+            items = ['"%s": %s' % (k, json.dumps(v)) for k, v in service.items() if k != "details"]
+            return "{%s, \"details\": [" % ", ".join(items)
+
+        yield "{%s, \"services\": [" % ", ".join(['"%s": %s' % (k, json.dumps(v)) for k, v in head.items()])
+
+        sep = ""
+        plugin_name = None
+        for name, day in self._iter_report_days(rows):
+            if name != plugin_name:
+                if plugin_name is not None:
+                    yield "]}"
+                    sep = ","
+                yield sep + open_service(services.pop(name, {"name": name, "plugin_name": name}))
+                plugin_name = name
+                day_sep = ""
+            yield day_sep + json.dumps(day)
+            day_sep = ","
+
+        if plugin_name is not None:
+            yield "]}"
+            sep = ","
+        for service in services.values():
+            yield sep + open_service(service) + "]}"
+            sep = ","
+
+        yield "]}"
+
+    def __iter_report_csv(self, services, rows, first_month_str, last_month_str):
+        import csv
+        from io import StringIO
+
+        def line(*values):
+            buf = StringIO()
+            csv.writer(buf).writerow(values)
+            return buf.getvalue()
+
+        yield line("plugin_name", "day", "metric_type_id", "name", "unit", "qta", "amount")
+
+        if rows is None:
+            period = "%s - %s" % (first_month_str, last_month_str)
+            for plugin_name, service in services.items():
+                for m in service["summary_consume"]:
+                    yield line(plugin_name, period, m["metric_type_id"], m["name"], m["unit"], m["qta"], m["amount"])
+        else:
+            for row in rows:
+                yield line(*row)
+
     def get_report_costconsume_bynivola(self, year_month, start_date, end_date, report_mode, *args, **kvargs):
         """ """
 
@@ -6203,16 +6764,6 @@ class ServiceController(ApiController):
         account_list_id = [account.oid for account in accounts]
         self.logger.warning("account_list_id=%s" % account_list_id)
 
-        res_report = self._format_report_costcomsume(
-            account_list_id,
-            year_month,
-            start_date,
-            end_date,
-            report_mode,
-            *args,
-            **kvargs,
-        )
-
         res_credit_summary = self._format_report_credit_summary(
             account_list_id, div_list_id, year_month, start_date, end_date
         )
@@ -6230,10 +6781,21 @@ class ServiceController(ApiController):
             "email": "",
             "hasvat": False,
         }
-        res.update(res_report)
         res.update(res_credit_composition)
         res.update(res_credit_summary)
 
+        # stream the report
+        output = kvargs.pop("output", None)
+        if output is not None:
+            return self.iter_report_costcomsume(
+                account_list_id, year_month, start_date, end_date, report_mode, output=output, header=res
+            )
+
+        res_report = self._format_report_costcomsume(
+            account_list_id, year_month, start_date, end_date, report_mode, *args, **kvargs
+        )
+        res.update(res_report)
+
         return res
 
     def get_cost_by_nivola_on_period(
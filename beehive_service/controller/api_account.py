@@ -1133,13 +1133,30 @@ class ApiAccount(AuthorityApiObject):
         return False
 
     def get_service_index(self):
-        service_insts, tot = self.controller.get_paginated_service_instances(
-            account_id=self.oid, size=-1, with_perm_tag=False, filter_expired=False
-        )
+        """Get the tree of the account service instances. Instances, definitions, types and parent links are
+        read with a constant number of queries and the tree is built in memory.
+
+        :return: dict like {<uuid>: {"plugin": <plugin>, "childs": [<uuid>, ..], "core": <bool>}}
+        """
+        rows = self.manager.get_account_service_instances_with_type(self.oid)
+        links = self.manager.get_account_service_instance_parents(self.oid)
+
+        parent_idx = {}
+        for child_id, parent_id, parent_uuid in links:
+            parent_idx.setdefault(child_id, parent_uuid)
 
-        services = self.get_services()
         service_idx = {}
-        for s in service_insts:
+        for entity, definition, service_type in rows:
+            s = ApiServiceInstance(
+                self.controller,
+                oid=entity.id,
+                objid=entity.objid,
+                name=entity.name,
+                active=entity.active,
+                desc=entity.desc,
+                model=entity,
+            )
+            # definition and type are already in the session identity map, so no query is issued here
             plugin = s.get_service_type_plugin()
             try:
                 service_idx[s.uuid]["plugin"] = plugin
@@ -1147,14 +1164,14 @@ class ApiAccount(AuthorityApiObject):
                 service_idx[s.uuid] = {"plugin": plugin, "childs": [], "core": False}
 
             # get parent service
-            parent = s.get_parent()
+            parent_uuid = parent_idx.get(entity.id, None)
 
             # simple service
-            if parent is not None:
+            if parent_uuid is not None:
                 try:
-                    service_idx[parent.uuid]["childs"].append(s.uuid)
+                    service_idx[parent_uuid]["childs"].append(s.uuid)
                 except Exception:
-                    service_idx[parent.uuid] = {
+                    service_idx[parent_uuid] = {
                         "plugin": None,
                         "core": False,
                         "childs": [s.uuid],
@@ -1589,12 +1606,9 @@ class ApiAccount(AuthorityApiObject):
         :param report_mode:
         :param args:
         :param kvargs:
+        :param kvargs.output: json or csv. If set return a generator that streams the report [optional]
         :return:
         """
-        res_report = self.controller._format_report_costcomsume(
-            [self.oid], year_month, start_date, end_date, report_mode, *args, **kvargs
-        )
-
         res_credit = self.controller._format_report_credit_summary([self.oid], None, year_month, start_date, end_date)
 
         postal_address = "" if self.model.division.postaladdress is None else self.model.division.postaladdress
@@ -1615,9 +1629,20 @@ class ApiAccount(AuthorityApiObject):
             "email": email,
             "hasvat": self.model.division.organization.hasvat,
         }
-        res.update(res_report)
         res.update(res_credit)
 
+        # stream the report
+        output = kvargs.pop("output", None)
+        if output is not None:
+            return self.controller.iter_report_costcomsume(
+                [self.oid], year_month, start_date, end_date, report_mode, output=output, header=res
+            )
+
+        res_report = self.controller._format_report_costcomsume(
+            [self.oid], year_month, start_date, end_date, report_mode, *args, **kvargs
+        )
+        res.update(res_report)
+
         return res
 
     def check_valid_capability(self, capability_id):
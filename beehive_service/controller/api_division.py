@@ -265,17 +265,6 @@ class ApiDivision(AuthorityApiObject):
         accounts, total = self.controller.get_accounts(division_id=self.oid, active=True, filter_expired=False, size=0)
         account_list_id = [account.oid for account in accounts]
         self.logger.debug("account_list_id=%s" % account_list_id)
-        # get report cost for active account and period
-        res_report = self.controller._format_report_costcomsume(
-            account_list_id,
-            year_month,
-            start_date,
-            end_date,
-            report_mode,
-            *args,
-            **kvargs,
-        )
-
         res_credit_summary = self.controller._format_report_credit_summary(
             account_list_id, [self.oid], year_month, start_date, end_date
         )
@@ -298,8 +287,19 @@ class ApiDivision(AuthorityApiObject):
             "email": email,
             "hasvat": self.model.organization.hasvat,
         }
-        res.update(res_report)
         res.update(res_credit_composition)
         res.update(res_credit_summary)
 
+        # stream the report
+        output = kvargs.pop("output", None)
+        if output is not None:
+            return self.controller.iter_report_costcomsume(
+                account_list_id, year_month, start_date, end_date, report_mode, output=output, header=res
+            )
+
+        res_report = self.controller._format_report_costcomsume(
+            account_list_id, year_month, start_date, end_date, report_mode, *args, **kvargs
+        )
+        res.update(res_report)
+
         return res
@@ -369,15 +369,6 @@ class ApiOrganization(AuthorityApiObject):
         account_list_id = [account.oid for account in accounts]
         self.logger.warning("account_list_id=%s" % account_list_id)
 
-        res_report = self.controller._format_report_costcomsume(
-            account_list_id,
-            year_month,
-            start_date,
-            end_date,
-            report_mode,
-            *args,
-            **kvargs,
-        )
         res_credit_summary = self.controller._format_report_credit_summary(
             account_list_id, div_list_id, year_month, start_date, end_date
         )
@@ -401,8 +392,19 @@ class ApiOrganization(AuthorityApiObject):
             "email": email,
             "hasvat": self.hasvat,
         }
-        res.update(res_report)
         res.update(res_credit_composition)
         res.update(res_credit_summary)
 
+        # stream the report
+        output = kvargs.pop("output", None)
+        if output is not None:
+            return self.controller.iter_report_costcomsume(
+                account_list_id, year_month, start_date, end_date, report_mode, output=output, header=res
+            )
+
+        res_report = self.controller._format_report_costcomsume(
+            account_list_id, year_month, start_date, end_date, report_mode, *args, **kvargs
+        )
+        res.update(res_report)
+
         return res
@@ -2,8 +2,14 @@
 #
 # (C) Copyright 2018-2026 CSI-Piemonte
 
+from threading import RLock
+from time import time
+from typing import Dict, Optional, TYPE_CHECKING
 from beehive_service.entity import ServiceApiObject
 
+if TYPE_CHECKING:
+    from beehive_service.dao.ServiceDao import ServiceDbManager
+
 
 class ApiServiceMetricType(ServiceApiObject):
     objdef = "ServiceMetricType"
@@ -55,3 +61,84 @@ class ApiServiceMetricType(ServiceApiObject):
         """Get object extended info"""
         info = self.info()
         return info
+
+
+class ServiceMetricTypeRegistry(object):
+    """Process wide registry of the not expired service metric types indexed by name and by id.
+    The registry is loaded from database at first use and reloaded when ttl expires or when it is invalidated.
+    Access is serialized with a lock so it can be shared among threads and greenlets.
+
+    :param ttl: seconds after which the registry is reloaded from database
+    """
+
+    def __init__(self, ttl: int = 300):
+        self.ttl = ttl
+        self._lock = RLock()
+        self._byname: Dict[str, int] = {}
+        self._byid: Dict[int, str] = {}
+        self._expire: float = 0
+
+    def _load(self, manager: "ServiceDbManager"):
+        if time() < self._expire:
+            return
+        byname = manager.get_service_metric_types_dict(byname=True)
+        self._byname = byname
+        self._byid = {v: k for k, v in byname.items()}
+        self._expire = time() + self.ttl
+
+    def get_id(self, manager: "ServiceDbManager", name: str) -> Optional[int]:
+        """Get metric type id from name. On registry miss the metric type is searched on database.
+
+        :param manager: service db manager
+        :param name: metric type name
+        :return: metric type id or None
+        """
+        with self._lock:
+            self._load(manager)
+            mt_id = self._byname.get(name, None)
+            if mt_id is None:
+                _, mt_id = manager.get_service_metric_types_info(name=name)
+                if mt_id is not None:
+                    self.register(name, mt_id)
+            return mt_id
+
+    def get_name(self, manager: "ServiceDbManager", mt_id: int) -> Optional[str]:
+        """Get metric type name from id. On registry miss the metric type is searched on database.
+
+        :param manager: service db manager
+        :param mt_id: metric type id
+        :return: metric type name or None
+        """
+        with self._lock:
+            self._load(manager)
+            name = self._byid.get(int(mt_id), None)
+            if name is None:
+                name, _ = manager.get_service_metric_types_info(id=mt_id)
+                if name is not None:
+                    self.register(name, int(mt_id))
+            return name
+
+    def get_idx(self, manager: "ServiceDbManager") -> Dict[str, int]:
+        """Get a copy of the metric type ids indexed by name
+
+        :param manager: service db manager
+        :return: dict {name: id}
+        """
+        with self._lock:
+            self._load(manager)
+            return dict(self._byname)
+
+    def register(self, name: str, mt_id: int):
+        """Add a metric type to the registry
+
+        :param name: metric type name
+        :param mt_id: metric type id
+        """
+        with self._lock:
+            self._byname[name] = mt_id
+            self._byid[mt_id] = name
+
+    def invalidate(self):
+        """Force reload of the registry at next use"""
+        with self._lock:
+            self._expire = 0
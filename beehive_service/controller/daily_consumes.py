@@ -0,0 +1,138 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Tuple, TYPE_CHECKING
+from beehive_service.service_util import __SRV_DAILY_CONSUMES_ENGINE__
+
+if TYPE_CHECKING:
+    from beehive_service.dao.ServiceDao import ServiceDbManager
+
+logger = logging.getLogger(__name__)
+
+DAILY_CONSUMES_ENGINES = ["procedure", "python"]
+
+
+def get_daily_consumes_engine(engine: str = None) -> str:
+    """Get the engine that computes the daily consumes. The engine can be selected by task param or by deployment
+    with the BEEHIVE_SERVICE_DAILY_CONSUMES_ENGINE environment variable
+
+    :param engine: engine set in the task params [optional]
+    :return: procedure or python
+    :raise ValueError: if the engine is not valid
+    """
+    engine = engine or os.getenv("BEEHIVE_SERVICE_DAILY_CONSUMES_ENGINE") or __SRV_DAILY_CONSUMES_ENGINE__
+    if engine not in DAILY_CONSUMES_ENGINES:
+        raise ValueError("Daily consumes engine %s is not valid. Use procedure or python" % engine)
+    return engine
+
+
+def compute_daily_consumes(period: str, today: List[Tuple], last: List[Tuple]) -> List[Dict]:
+    """Compute the daily consumes of a block of service instances with the same time weighted average of the
+    dailyconsumes_by_account_new procedure.
+
+    The metrics of the day and the last metric before the day, moved at the start of the day, of each service
+    instance and metric type are ordered by id. Each metric weighs the seconds up to the next metric, the newest
+    metric of the day weighs the seconds up to the end of the day and a last metric with no metric of the day after
+    it is discarded. Consumed is sum(value * weight) / sum(weight) or 0 when the weights sum is 0.
+
+    :param period: day in format YYYY-MM-DD
+    :param today: list of (id, creation_date, value, metric type id, service instance id, account id) of the day
+    :param last: list of (id, creation_date, value, metric type id, service instance id, account id) with the last
+        metric before the day
+    :return: list of dict with keys metric_type_id, service_instance_id, account_id and consumed
+    """
+    day_start = datetime.strptime(period, "%Y-%m-%d")
+    day_end = 24 * 3600
+
+    groups = {}
+    for metric_id, creation_date, value, metric_type_id, service_instance_id, account_id in today:
+        epoc = int((creation_date - day_start).total_seconds())
+        groups.setdefault((service_instance_id, metric_type_id), []).append((metric_id, epoc, value, True, account_id))
+    for metric_id, creation_date, value, metric_type_id, service_instance_id, account_id in last:
+        groups.setdefault((service_instance_id, metric_type_id), []).append((metric_id, 0, value, False, account_id))
+
+    res = []
+    for (service_instance_id, metric_type_id), metrics in groups.items():
+        metrics.sort(key=lambda m: m[0], reverse=True)
+        weighted_sum = 0
+        weights_sum = 0
+        next_epoc = None
+        has_weight = False
+        for metric_id, epoc, value, is_today, account_id in metrics:
+            if next_epoc is not None:
+                wt = next_epoc - epoc
+            elif is_today is True:
+                wt = day_end - epoc
+            else:
+                wt = None
+            next_epoc = epoc
+            if wt is not None:
+                has_weight = True
+                weighted_sum += value * wt
+                weights_sum += wt
+        if has_weight is False:
+            continue
+        res.append(
+            {
+                "metric_type_id": metric_type_id,
+                "service_instance_id": service_instance_id,
+                "account_id": metrics[0][4],
+                "consumed": weighted_sum / weights_sum if weights_sum != 0 else 0,
+            }
+        )
+    return res
+
+
+class DailyConsumesEngine(object):
+    """In process alternative to the dailyconsumes stored procedure. Accounts are processed in blocks: the metrics of
+    a block are read with two queries, the consumes are computed in memory and the aggregate costs of the block are
+    replaced in one transaction.
+
+    :param manager: service db manager
+    :param block_size: number of accounts processed together [default=100]
+    """
+
+    def __init__(self, manager: "ServiceDbManager", block_size: int = 100):
+        self.manager = manager
+        self.block_size = block_size
+
+    def run(self, period: str, job_id: int, finalize: bool = True) -> int:
+        """Compute the daily consumes of all the accounts for a period
+
+        :param period: day in format YYYY-MM-DD
+        :param job_id: id of the job that computes the consumes
+        :param finalize: if True run the metric type remap and expose_consumes steps [default=True]
+        :return: number of aggregate costs written
+        """
+        account_ids = self.manager.get_daily_consumes_accounts(period)
+        total = 0
+        for i in range(0, len(account_ids), self.block_size):
+            total += self.run_block(account_ids[i : i + self.block_size], period, job_id)
+        if finalize is True:
+            self.manager.finalize_daily_consumes(period)
+        logger.info("Computed %s daily consumes of %s accounts for %s" % (total, len(account_ids), period))
+        return total
+
+    def run_block(self, account_ids: List[int], period: str, job_id: int) -> int:
+        """Compute the daily consumes of a block of accounts. Like the procedure the aggregate costs of an account
+        are replaced only when the account has metrics in the day
+
+        :param account_ids: list of account id
+        :param period: day in format YYYY-MM-DD
+        :param job_id: id of the job that computes the consumes
+        :return: number of aggregate costs written
+        """
+        today, last = self.manager.get_daily_consumes_metrics(account_ids, period)
+        accounts_with_metrics = sorted({m[5] for m in today})
+        if len(accounts_with_metrics) == 0:
+            return 0
+
+        last = [m for m in last if m[5] in accounts_with_metrics]
+        rows = compute_daily_consumes(period, today, last)
+        for row in rows:
+            row["job_id"] = job_id
+        return self.manager.replace_daily_aggregate_costs(accounts_with_metrics, period, rows)
@@ -5,17 +5,20 @@
 
 from datetime import datetime, timedelta, date
 import inspect
-from re import match
+from re import match, compile as re_compile
 from typing import List, Type, Tuple, Any, Union, Dict, Optional
-from sqlalchemy import create_engine, exc, asc, text
+from sqlalchemy import create_engine, event, exc, asc, text, literal, bindparam
+from sqlalchemy.ext import baked
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.session import sessionmaker, Session
 from sqlalchemy.orm.query import Query
 from sqlalchemy.sql.functions import func
 from sqlalchemy.sql.expression import text, and_, or_, case, delete
-from beecell.db import ModelError
+from beecell.db import ModelError, QueryError
 from beecell.simple import truncate, format_date
 from beecell.types.type_id import test_oid
-from beehive.common.data import transaction, query
+from beehive.common.data import transaction, query, operation
 from beehive.common.model import (
     AbstractDbManager,
     PaginatedQueryGenerator,
@@ -62,6 +65,7 @@ from beehive_service.model.organization import Organization
 from beehive_service.model.service_instance import (
     ServiceInstanceConfig,
     ServiceTypePluginInstance,
+    tag_instance,
 )
 from beehive_service.model.service_definition import ServiceConfig
 from beehive_service.model.service_catalog import ServiceCatalog
@@ -79,13 +83,90 @@ from beehive_service.model.service_tag import (
     ServiceTagCount,
     ServiceTagOccurrences,
 )
-from beehive_service.model.views import ServiceInstantConsume
+from beehive_service.model.service_instant_consume_snapshot import ServiceInstantConsumeSnapshot
+from beehive_service.model.service_instant_metric_snapshot import ServiceInstantMetricSnapshot
+from beehive_service.dao.instant_consume_snapshot import snapshot_statements
 
 serviceBase = Base
 
+UUID_OID_RE = re_compile("[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+ID_OID_RE = re_compile(r"^\d+$")
+NAME_OID_RE = re_compile(r"[\-\w\d]+")
+
+
+def classify_oid(oid: Union[str, int]) -> Tuple[str, Union[str, int]]:
+    """Classify an entity oid as uuid, id or name
+
+    :param oid: entity model id or name or uuid
+    :return: tuple (field, value) where field is one of uuid, id, name or None if oid is not valid
+    """
+    if isinstance(oid, int):
+        return "id", oid
+    oid = str(oid)
+    if UUID_OID_RE.match(oid):
+        return "uuid", oid
+    if ID_OID_RE.match(oid):
+        return "id", int(oid)
+    if NAME_OID_RE.match(oid):
+        return "name", oid
+    return None, oid
+
+
+class LazyStatement(object):
+    """Render the sql statement of a query only when the log record is really emitted
+
+    :param get_query: function that returns the query to render
+    """
+
+    def __init__(self, get_query):
+        self.get_query = get_query
+
+    def __str__(self):
+        from sqlalchemy.dialects import mysql
+
+        return str(self.get_query().statement.compile(dialect=mysql.dialect()))
+
+
+def get_entity_map(session: Session) -> Dict:
+    """Get the identity map used by get_entity for the current operation. The map lives in the session info and
+    is replaced when the operation id changes. It is dropped when the session transaction ends, so it never outlives
+    the commit, rollback or close that ends the api request or task that filled it
+
+    :param session: database session
+    :return: dict with key (entity class, active, filter_expired, field, value) and value the entity model
+    """
+    entity_map = session.info.get("entity_map")
+    op_id = getattr(operation, "id", None)
+    if entity_map is None or entity_map[0] != op_id:
+        entity_map = (op_id, {})
+        session.info["entity_map"] = entity_map
+    return entity_map[1]
+
+
+def clear_entity_map(session: Session, *args):
+    """Drop the get_entity identity map of a session. Called on every write of the session and at the end of every
+    transaction, that is on commit, rollback and close
+
+    :param session: database session
+    """
+    session.info.pop("entity_map", None)
+
+
+# The sessions of the service module are created by the beehive api and task managers, not by a sessionmaker of
+# this module, so the listeners are registered on the Session class and run for every session of the process. For
+# sessions that never used get_entity they only pop a missing key from session.info
+event.listen(Session, "after_flush", lambda session, *args: clear_entity_map(session))
+event.listen(Session, "after_bulk_update", lambda update_context: clear_entity_map(update_context.session))
+event.listen(Session, "after_bulk_delete", lambda delete_context: clear_entity_map(delete_context.session))
+event.listen(Session, "after_transaction_end", clear_entity_map)
+
+
 class ServiceDbManager(AbstractDbManager):
     """ """
 
+    # cache of the compiled get_entity lookups by entity class and field
+    entity_bakery = baked.bakery(size=500)
+
     @staticmethod
     def generate_task_intervals_acquire_metrics():
         task = "acq_metric"
@@ -735,9 +816,8 @@ class ServiceDbManager(AbstractDbManager):
         filter_expired = False
         filter_expiry_date = datetime.today()
         active = None
-        query = None
 
-        self.logger.debug2("Query filter kvargs: %s" % kvargs)
+        self.logger.debug2("Query filter kvargs: %s", kvargs)
         if "active" in kvargs and kvargs.get("active") is not None:
             active = kvargs.pop("active")
 
@@ -746,31 +826,19 @@ class ServiceDbManager(AbstractDbManager):
 
         session = self.get_session()
 
-        # get obj by uuid
-        if match("[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", str(oid)):
-            self.logger.debug2("Query %s by uuid: %s" % (entityclass.__name__, str(oid)))
-            query = self.query_entities(entityclass, session, uuid=str(oid), *args, **kvargs)
-        # get obj by id
-        elif match(r"^\d+$", str(oid)):
-            self.logger.debug2("Query %s by id: %s" % (entityclass.__name__, str(oid)))
-            query = self.query_entities(entityclass, session, oid=oid, *args, **kvargs)
-        # get obj by name
-        elif match(r"[\-\w\d]+", str(oid)):
-            self.logger.debug2("Query %s by name: %s" % (entityclass.__name__, str(oid)))
-            query = self.query_entities(entityclass, session, name=oid, *args, **kvargs)
-        else:
+        field, value = classify_oid(oid)
+        if field is None:
             raise ModelError("%s %s not found" % (entityclass, oid))
-
-        if issubclass(entityclass, BaseEntity) == True:
-            if active is not None:
-                self.logger.debug2("Query filter active: %s" % active)
-                query = query.filter(entityclass.active == active)
-
-            # expired
-            if filter_expired is not None:
-                self.logger.debug2(
-                    "Query filter filter_expired: %s - filter_expiry_date: %s" % (filter_expired, filter_expiry_date)
-                )
+        self.logger.debug2("Query %s by %s: %s", entityclass.__name__, field, value)
+        is_base_entity = issubclass(entityclass, BaseEntity)
+
+        if len(args) > 0 or len(kvargs) > 0:
+            # custom filters can not be cached
+            lookup = {"oid" if field == "id" else field: value}
+            query = self.query_entities(entityclass, session, *args, **lookup, **kvargs)
+            if is_base_entity is True:
+                if active is not None:
+                    query = query.filter(entityclass.active == active)
                 if filter_expired is True:
                     query = query.filter(entityclass.expiry_date <= filter_expiry_date)
                 else:
@@ -780,18 +848,55 @@ class ServiceDbManager(AbstractDbManager):
                             entityclass.expiry_date > filter_expiry_date,
                         )
                     )
-
-        entity: ENTITY = None
+            if for_update:
+                query = query.with_for_update()
+            self.logger.debug2("SQL - stmt: %s", LazyStatement(lambda: query))
+            entity: ENTITY = query.one_or_none()
+            self.logger.debug2("Get %s %s", entityclass.__name__, oid)
+            return entity
+
+        # entities already read in this operation are returned without a new query
+        entity_map = get_entity_map(session)
+        map_key = (entityclass, active, filter_expired)
+        if for_update is False:
+            entity = entity_map.get(map_key + (field, value))
+            if entity is not None:
+                self.logger.debug2("Get %s %s from identity map", entityclass.__name__, oid)
+                return entity
+
+        # lookup by id, uuid or name are compiled once for each entity class and cached
+        params = {"oid": value}
+        baked_query = ServiceDbManager.entity_bakery(lambda s: s.query(entityclass), entityclass)
+        baked_query.add_criteria(lambda q: q.filter(getattr(entityclass, field) == bindparam("oid")), field)
+        if is_base_entity is True:
+            if active is not None:
+                baked_query += lambda q: q.filter(entityclass.active == bindparam("active"))
+                params["active"] = active
+            if filter_expired is True:
+                baked_query += lambda q: q.filter(entityclass.expiry_date <= bindparam("expiry_date"))
+            else:
+                baked_query += lambda q: q.filter(
+                    or_(
+                        entityclass.expiry_date == None,
+                        entityclass.expiry_date > bindparam("expiry_date"),
+                    )
+                )
+            params["expiry_date"] = filter_expiry_date
         if for_update:
-            entity = query.with_for_update().one_or_none()
-            self.logger.debug2("Get %s FOR UPDATE : %s" % (entityclass.__name__, truncate(query)))
-        else:
-            from sqlalchemy.dialects import mysql
+            baked_query += lambda q: q.with_for_update()
+
+        result = baked_query(session).params(**params)
+        self.logger.debug2("SQL - stmt: %s - params: %s", LazyStatement(lambda: result._as_query()), params)
+        # sqlalchemy.exc.MultipleResultsFound: Multiple rows were found when one or none was required
+        entity: ENTITY = result.one_or_none()
+        self.logger.debug2("Get %s %s", entityclass.__name__, oid)
 
-            self.logger.debug2("+++++ SQL - stmp: %s" % query.statement.compile(dialect=mysql.dialect()))
-            # sqlalchemy.exc.MultipleResultsFound: Multiple rows were found when one or none was required
-            entity = query.one_or_none()
-        self.logger.debug2("Get %s %s" % (entityclass.__name__, oid))
+        if entity is not None:
+            # names are not always unique, so only the requested name is mapped
+            entity_map[map_key + (field, value)] = entity
+            entity_map[map_key + ("id", entity.id)] = entity
+            if getattr(entity, "uuid", None) is not None:
+                entity_map[map_key + ("uuid", entity.uuid)] = entity
 
         return entity
 
@@ -1316,6 +1421,139 @@ class ServiceDbManager(AbstractDbManager):
 
         session.execute(text("CALL dailycosts(:period, :jobid)"), {"period": period, "jobid": jobid})
 
+    @query
+    def get_daily_consumes_accounts(self, period: str) -> List[int]:
+        """Get the ids of the accounts whose daily consumes are computed for a period, like the account cursor of
+        the dailyconsumes procedure
+
+        :param period: day in format YYYY-MM-DD
+        :return: list of account id
+        """
+        session = self.get_session()
+        day = datetime.strptime(period, "%Y-%m-%d")
+        query = (
+            session.query(Account.id)
+            .filter(Account.creation_date < day)
+            .filter(or_(Account.expiry_date == None, Account.expiry_date > day))
+            .order_by(Account.id)
+        )
+        return [r[0] for r in query.all()]
+
+    @query
+    def get_daily_consumes_metrics(self, account_ids: List[int], period: str) -> Tuple[List[Tuple], List[Tuple]]:
+        """Get the service metrics used to compute the daily consumes of a block of accounts: the metrics of the day
+        and the last metric before the day of each service instance and metric type
+
+        :param account_ids: list of account id
+        :param period: day in format YYYY-MM-DD
+        :return: two lists of (id, creation_date, value, metric type id, service instance id, account id) with the
+            metrics of the day and the last metrics before the day
+        """
+        session = self.get_session()
+        day = datetime.strptime(period, "%Y-%m-%d")
+        fields = (
+            ServiceMetric.id,
+            ServiceMetric.creation_date,
+            ServiceMetric.value,
+            ServiceMetric.metric_type_id,
+            ServiceMetric.service_instance_id,
+            ServiceInstance.account_id,
+        )
+        today = (
+            session.query(*fields)
+            .join(ServiceInstance, ServiceInstance.id == ServiceMetric.service_instance_id)
+            .filter(ServiceInstance.account_id.in_(account_ids))
+            .filter(ServiceMetric.creation_date >= day)
+            .filter(ServiceMetric.creation_date < day + timedelta(days=1))
+            .all()
+        )
+        prevt = (
+            session.query(func.max(ServiceMetric.id).label("id"))
+            .join(ServiceInstance, ServiceInstance.id == ServiceMetric.service_instance_id)
+            .filter(ServiceInstance.account_id.in_(account_ids))
+            .filter(ServiceMetric.creation_date < day)
+            .group_by(ServiceMetric.metric_type_id, ServiceMetric.service_instance_id)
+            .subquery()
+        )
+        last = (
+            session.query(*fields)
+            .join(prevt, prevt.c.id == ServiceMetric.id)
+            .join(ServiceInstance, ServiceInstance.id == ServiceMetric.service_instance_id)
+            .all()
+        )
+        return today, last
+
+    @transaction
+    def replace_daily_aggregate_costs(self, account_ids: List[int], period: str, rows: List[Dict]) -> int:
+        """Replace the daily aggregate costs of a block of accounts for a period
+
+        :param account_ids: list of account id whose aggregate costs are replaced
+        :param period: day in format YYYY-MM-DD
+        :param rows: list of aggregate cost dict with keys metric_type_id, service_instance_id, account_id, job_id
+            and consumed
+        :return: number of aggregate costs inserted
+        """
+        session = self.get_session()
+        session.query(AggregateCost).filter(AggregateCost.account_id.in_(account_ids)).filter(
+            AggregateCost.period == period
+        ).delete(synchronize_session=False)
+
+        now = datetime.today()
+        session.bulk_insert_mappings(
+            AggregateCost,
+            [
+                {
+                    "creation_date": now,
+                    "modification_date": now,
+                    "expiry_date": None,
+                    "metric_type_id": row["metric_type_id"],
+                    "cost": 0,
+                    "evaluation_date": now,
+                    "service_instance_id": row["service_instance_id"],
+                    "account_id": row["account_id"],
+                    "job_id": row["job_id"],
+                    "aggregation_type": "daily",
+                    "period": period,
+                    "cost_type_id": 1,
+                    "consumed": row["consumed"],
+                }
+                for row in rows
+            ],
+        )
+        return len(rows)
+
+    @transaction
+    def finalize_daily_consumes(self, period: str):
+        """Run the steps of the dailyconsumes procedure that follow the account loop: remap the metric types of the
+        database instances and expose the consumes. These steps use mysql only tables and procedures so they are
+        skipped on other databases
+
+        :param period: day in format YYYY-MM-DD
+        :return: None
+        """
+        session = self.get_session()
+        if session.bind.dialect.name != "mysql":
+            self.logger.warning("Skip daily consumes finalization on %s database" % session.bind.dialect.name)
+            return
+
+        session.execute(
+            text("UPDATE aggregate_cost SET was_metric_type_id = fk_metric_type_id WHERE was_metric_type_id IS NULL")
+        )
+        session.execute(
+            text(
+                """
+                UPDATE aggregate_cost ac
+                    INNER JOIN tmp_databases_ d ON d.fk_service_instance_id = ac.fk_service_instance_id
+                    INNER JOIN tmp_metric_map_ m ON ac.fk_metric_type_id = m.from_id AND m.dbtype = d.dbtype
+                SET fk_metric_type_id = m.to_id
+                WHERE ac.fk_metric_type_id = ac.was_metric_type_id AND ac.fk_metric_type_id != m.to_id
+                    AND ac.period = :period
+                """
+            ),
+            {"period": period},
+        )
+        session.execute(text("CALL expose_consumes(:period)"), {"period": period})
+
     @query
     def monit_message_at(self, period: str = None) -> MonitoringMessage:
         if period is None:
@@ -2063,6 +2301,159 @@ class ServiceDbManager(AbstractDbManager):
                 }
         return ret
 
+    @query
+    def get_service_resource_idx_for_account(self, account_id: int) -> Dict[str, Tuple[int, int]]:
+        """get_service_resource_idx_for_account
+        return in one joined query the service instance and the plugin type of all the not expired
+        services of the account, indexed by resource_uuid. In case of multiple services implemented by
+        the same resource only the first (by id) service appears in the dictionary
+
+             {
+                "resource_uuid1": (service_id, plugin_type_id),
+                "resource_uuid2": (service_id, plugin_type_id),
+             }
+
+        Args:
+            account_id (int): account id
+
+        Returns:
+            Dict[str, Tuple[int, int]]: service id and plugin type id indexed by resource_uuid
+        """
+        session: Session = self.get_session()
+        query: Query = (
+            session.query(
+                ServiceInstance.resource_uuid,
+                ServiceInstance.id,
+                ServicePluginType.id.label("plugin_type_id"),
+            )
+            .join(ServiceDefinition, ServiceDefinition.id == ServiceInstance.service_definition_id)
+            .join(ServiceType, ServiceDefinition.service_type_id == ServiceType.id)
+            .outerjoin(ServicePluginType, ServicePluginType.objclass == ServiceType.objclass)
+            .filter(ServiceInstance.account_id == account_id)
+            .filter(ServiceInstance.resource_uuid != None)
+            .filter(ServiceInstance.expiry_date == None)
+            .order_by(ServiceInstance.id)
+        )
+        ret = {}
+        for r in query.all():
+            if r.resource_uuid not in ret:
+                ret[r.resource_uuid] = (r.id, r.plugin_type_id)
+        return ret
+
+    @query
+    def get_account_service_instances_with_type(
+        self, account_id: int
+    ) -> List[Tuple[ServiceInstance, ServiceDefinition, ServiceType]]:
+        """get_account_service_instances_with_type
+        return in one joined query all the not expired service instances of the account together with their
+        service definition and service type, so that the plugin of each instance can be built without
+        further queries
+
+        Args:
+            account_id (int): account id
+
+        Returns:
+            List[Tuple[ServiceInstance, ServiceDefinition, ServiceType]]: instance, definition and type rows
+        """
+        session: Session = self.get_session()
+        query: Query = (
+            session.query(ServiceInstance, ServiceDefinition, ServiceType)
+            .join(ServiceDefinition, ServiceDefinition.id == ServiceInstance.service_definition_id)
+            .join(ServiceType, ServiceDefinition.service_type_id == ServiceType.id)
+            .filter(ServiceInstance.account_id == account_id)
+            .filter(or_(ServiceInstance.expiry_date == None, ServiceInstance.expiry_date > datetime.today()))
+            .order_by(ServiceInstance.id)
+        )
+        return query.all()
+
+    @query
+    def get_account_service_instance_parents(self, account_id: int) -> List[Tuple[int, int, str]]:
+        """get_account_service_instance_parents
+        return in one query the parent links of all the service instances of the account. Parents in
+        DELETED status are skipped like in get_service_instance_parent
+
+        Args:
+            account_id (int): account id
+
+        Returns:
+            List[Tuple[int, int, str]]: child instance id, parent instance id and parent instance uuid
+        """
+        session: Session = self.get_session()
+        child = aliased(ServiceInstance)
+        parent = aliased(ServiceInstance)
+        query: Query = (
+            session.query(
+                ServiceLinkInstance.end_service_id,
+                parent.id,
+                parent.uuid,
+            )
+            .join(child, child.id == ServiceLinkInstance.end_service_id)
+            .join(parent, parent.id == ServiceLinkInstance.start_service_id)
+            .filter(child.account_id == account_id)
+            .filter(parent.status != SrvStatusType.DELETED)
+            .order_by(ServiceLinkInstance.id)
+        )
+        return query.all()
+
+    @query
+    def get_accounts_with_container_service(
+        self,
+        plugintype: str,
+        account_ids: List[int] = None,
+        account_uuids: List[str] = None,
+        account_names: List[str] = None,
+    ) -> List[Tuple[Account, Optional[int], Optional[str], Optional[str]]]:
+        """get_accounts_with_container_service
+        return in one joined query the not expired accounts selected by id, uuid or name together with their
+        active container service instance of type plugintype. Accounts without a container service are returned
+        with None instance id, objid and resource uuid
+
+        Args:
+            plugintype (str): plugin type name of the container service
+            account_ids (List[int], optional): account ids. Defaults to None.
+            account_uuids (List[str], optional): account uuids. Defaults to None.
+            account_names (List[str], optional): account names. Defaults to None.
+
+        Returns:
+            List[Tuple[Account, Optional[int], Optional[str], Optional[str]]]: account, service instance id, objid
+                and resource uuid
+        """
+        session: Session = self.get_session()
+        filters = []
+        if account_ids:
+            filters.append(Account.id.in_(account_ids))
+        if account_uuids:
+            filters.append(Account.uuid.in_(account_uuids))
+        if account_names:
+            filters.append(Account.name.in_(account_names))
+        if len(filters) == 0:
+            return []
+
+        now = datetime.today()
+        containers = (
+            session.query(
+                ServiceInstance.id.label("id"),
+                ServiceInstance.objid.label("objid"),
+                ServiceInstance.account_id.label("account_id"),
+                ServiceInstance.resource_uuid.label("resource_uuid"),
+            )
+            .join(ServiceDefinition, ServiceDefinition.id == ServiceInstance.service_definition_id)
+            .join(ServiceType, ServiceDefinition.service_type_id == ServiceType.id)
+            .join(ServicePluginType, ServicePluginType.objclass == ServiceType.objclass)
+            .filter(ServicePluginType.name_type == plugintype)
+            .filter(ServiceInstance.active == True)
+            .filter(or_(ServiceInstance.expiry_date == None, ServiceInstance.expiry_date > now))
+            .subquery()
+        )
+        query: Query = (
+            session.query(Account, containers.c.id, containers.c.objid, containers.c.resource_uuid)
+            .outerjoin(containers, containers.c.account_id == Account.id)
+            .filter(or_(*filters))
+            .filter(or_(Account.expiry_date == None, Account.expiry_date > now))
+            .order_by(Account.id, containers.c.id)
+        )
+        return query.all()
+
     @query
     def get_service_info(self, id: int = -99, uuid: str = "", resource_uuid: str = "") -> Union[Dict, None]:
         """get_service_info
@@ -2117,6 +2508,70 @@ class ServiceDbManager(AbstractDbManager):
                 "resource_uuid": result.resource_uuid,
             }
 
+    @query
+    def get_service_info_list(
+        self,
+        ids: List[int] = None,
+        uuids: List[str] = None,
+        resource_uuids: List[str] = None,
+    ) -> List[Dict]:
+        """get_service_info_list
+        set based version of get_service_info. Query in one statement all the not expired services
+        matching any of the given ids, uuids or resource_uuids.
+        return a list of dictionary ordered by service id
+        [
+            {
+                "service_id" : service_id,
+                "service_uuid" : service_uuid,
+                "account_id" : account_id,
+                "account_uuid" : account_uuid,
+                "resource_uuid": resource_uuid
+            },
+        ]
+
+        Args:
+            ids (List[int], optional): service instance ids. Defaults to None.
+            uuids (List[str], optional): service instance uuids. Defaults to None.
+            resource_uuids (List[str], optional): resource uuids. Defaults to None.
+
+        Returns:
+            List[Dict]: list of service info
+        """
+        clauses = []
+        if ids:
+            clauses.append(ServiceInstance.id.in_(ids))
+        if uuids:
+            clauses.append(ServiceInstance.uuid.in_(uuids))
+        if resource_uuids:
+            clauses.append(ServiceInstance.resource_uuid.in_(resource_uuids))
+        if len(clauses) == 0:
+            return []
+
+        session: Session = self.get_session()
+        query: Query = (
+            session.query(
+                ServiceInstance.id.label("service_id"),
+                ServiceInstance.uuid.label("service_uuid"),
+                Account.id.label("account_id"),
+                Account.uuid.label("account_uuid"),
+                ServiceInstance.resource_uuid.label("resource_uuid"),
+            )
+            .join(Account, Account.id == ServiceInstance.account_id)
+            .filter(ServiceInstance.expiry_date == None)
+            .filter(or_(*clauses))
+            .order_by(ServiceInstance.id)
+        )
+        return [
+            {
+                "service_id": r.service_id,
+                "service_uuid": r.service_uuid,
+                "account_id": r.account_id,
+                "account_uuid": r.account_uuid,
+                "resource_uuid": r.resource_uuid,
+            }
+            for r in query.all()
+        ]
+
     @query
     def get_service_instance(
         self,
@@ -2548,8 +3003,47 @@ class ServiceDbManager(AbstractDbManager):
             filters.append(" AND t3.resource_uuid IN :listServiceInstanceResourceUUID ")
             kvargs.update(listServiceInstanceResourceUUID=tuple(kvargs.pop("resource_uuid_list")))
 
+        # manage tags with semi join predicates evaluated only on the candidate instances
+        servicetags_or = kvargs.get("servicetags_or", None)
+        servicetags_and = kvargs.get("servicetags_and", None)
+        tag_exists = (
+            " AND EXISTS (SELECT 1 FROM tag_instance ti, service_tag st "
+            "WHERE ti.fk_service_instance_id=t3.id AND ti.fk_service_tag_id=st.id AND st.name %s) "
+        )
+        if servicetags_and is not None:
+            for i, tag in enumerate(sorted(set(servicetags_and))):
+                filters.append(tag_exists % ("=:servicetag_%s" % i))
+                kvargs["servicetag_%s" % i] = tag
+        elif servicetags_or is not None:
+            filters.append(tag_exists % "IN :servicetag_list")
+            kvargs["servicetag_list"] = tuple(servicetags_or)
+
         return tables, custom_select, filters, kvargs
 
+    @query
+    def get_service_instance_tags_idx(self, instance_ids: List[int]) -> Dict[int, str]:
+        """Get the tags of a list of service instances
+
+        :param instance_ids: list of service instance id
+        :return: comma separated tag names sorted by name indexed by service instance id
+        """
+        if len(instance_ids) == 0:
+            return {}
+
+        session = self.get_session()
+        query = (
+            session.query(tag_instance.c.fk_service_instance_id, ServiceTag.name)
+            .join(ServiceTag, ServiceTag.id == tag_instance.c.fk_service_tag_id)
+            .filter(tag_instance.c.fk_service_instance_id.in_(instance_ids))
+            .order_by(ServiceTag.name)
+        )
+        tags = {}
+        for instance_id, name in query.all():
+            instance_tags = tags.setdefault(instance_id, [])
+            if name not in instance_tags:
+                instance_tags.append(name)
+        return {k: ",".join(v) for k, v in tags.items()}
+
     @query
     def get_paginated_service_instances(self, *args, **kvargs) -> Tuple[List[ServiceInstance], int]:
         """Get paginated ServiceInstance.
@@ -2623,26 +3117,6 @@ class ServiceDbManager(AbstractDbManager):
             tables = [("service_type", "t4"), ("service_definition", "t6")]
             kvargs.update(flag_container=flag_container)
 
-        # manage tags
-        servicetags_or = kvargs.get("servicetags_or", None)
-        servicetags_and = kvargs.get("servicetags_and", None)
-        if servicetags_or is not None or servicetags_and is not None:
-            ## TODO FIX GROUP BY
-            custom_select = (
-                "(SELECT t1.*, GROUP_CONCAT(DISTINCT t2.name ORDER BY t2.name) as tags "
-                "FROM service_instance t1, service_tag t2, tag_instance t3 "
-                "WHERE t3.fk_service_tag_id=t2.id and t3.fk_service_instance_id=t1.id "
-                "and (t2.name in :servicetag_list) "
-                "GROUP BY t1.id)"
-            )
-            if servicetags_and is not None:
-                servicetags_and.sort()
-                kvargs["servicetag_list"] = servicetags_and
-                kvargs["servicetags"] = ",".join(servicetags_and)
-                filters.append("AND t3.tags=:servicetags")
-            elif servicetags_or is not None:
-                kvargs["servicetag_list"] = servicetags_or
-
         res, total = self.get_api_bo_paginated_entities(
             ServiceInstance,
             filters=filters,
@@ -2695,6 +3169,7 @@ class ServiceDbManager(AbstractDbManager):
         :param size: number of entities to show in list per page [default=0]
         :param order: sort order [default=DESC]
         :param field: sort field [default=id]
+        :param cursor_id: return instances after this id, in the sort order, ignoring page [optional]
         :return: list of ServiceInstance
         :raises TransactionError: raise :class:`TransactionError`
         """
@@ -2708,10 +3183,11 @@ class ServiceDbManager(AbstractDbManager):
             kvargs,
         ) = self.get_paginated_service_instance_filter(*args, **kvargs)
 
+        # tags are read only for the selected page of instances
         select_fields = [
             "t4.id as type_id",
             "t4.objclass as objclass",
-            "t3.tags as inst_tags",
+            "NULL as inst_tags",
             "t6.name as definition_name",
         ]
 
@@ -2730,34 +3206,16 @@ class ServiceDbManager(AbstractDbManager):
         if flag_container is not None:
             filters.append(" AND t4.flag_container = :flag_container ")
 
-        # manage tags
-        servicetags_or = kvargs.get("servicetags_or", None)
-        servicetags_and = kvargs.get("servicetags_and", None)
-        if servicetags_or is not None or servicetags_and is not None:
-            ## TODO FIX GROUP BY
-            custom_select = (
-                "(SELECT t1.*, GROUP_CONCAT(DISTINCT t2.name ORDER BY t2.name) as tags "
-                "FROM service_instance t1, service_tag t2, tag_instance t3 "
-                "WHERE t3.fk_service_tag_id=t2.id and t3.fk_service_instance_id=t1.id "
-                "and (t2.name in :servicetag_list) "
-                "GROUP BY t1.id)"
-            )
-            if servicetags_and is not None:
-                servicetags_and.sort()
-                kvargs["servicetag_list"] = servicetags_and
-                kvargs["servicetags"] = ",".join(servicetags_and)
-                filters.append("AND t3.tags=:servicetags")
-            elif servicetags_or is not None:
-                kvargs["servicetag_list"] = servicetags_or
-        else:
-            ## TODO FIX GROUP BY
-            custom_select = (
-                "(SELECT t1.*, GROUP_CONCAT(DISTINCT t2.name ORDER BY t2.name) as tags "
-                "FROM service_instance t1 "
-                "left outer join tag_instance t3 ON t3.fk_service_instance_id=t1.id "
-                "left outer join service_tag t2 ON t3.fk_service_tag_id=t2.id "
-                "GROUP BY t1.id)"
-            )
+        # keyset pagination: seek after the last id of the previous page in place of an offset
+        cursor_id = kvargs.get("cursor_id", None)
+        if cursor_id is not None:
+            if kvargs.get("field", "id") != "id":
+                raise QueryError("cursor pagination is supported only with sort field id")
+            if str(kvargs.get("order", "DESC")).upper() == "DESC":
+                filters.append(" AND t3.id < :cursor_id ")
+            else:
+                filters.append(" AND t3.id > :cursor_id ")
+            kvargs["page"] = 0
 
         res: List[ServiceTypePluginInstance]
         total: int
@@ -2770,133 +3228,12 @@ class ServiceDbManager(AbstractDbManager):
             *args,
             **kvargs,
         )
-        return res, total
-    
 
-    @query
-    def get_paginated_service_type_plugins_optimized(self, *args, **kvargs) -> Tuple[List[ServiceTypePluginInstance], int]:
-        """Get paginated ServiceInstance.
-        """
-        self.logger.info("fv - get_paginated_service_type_plugins_optimized")
-        (
-            tables_useless,
-            custom_select_useless,
-            filters,
-            kvargs,
-        ) = self.get_paginated_service_instance_filter(*args, **kvargs)
-
-        select_fields = [
-            # "t3.type_id",
-            # "t3.objclass",
-            # "t3.tags as inst_tags",
-            # "t3.definition_name",
-        ]
-
-        # filters.append(" AND t3.fk_service_definition_id=t6.id")
-        # filters.append(" AND t6.fk_service_type_id=t4.id")
-        # filters.append(" AND t4.objclass=t5.objclass")
-        tables = [
-            # ("service_type", "t4"),
-            # ("service_plugin_type", "t5"),
-            # ("service_definition", "t6"),
-        ]
-
-        filter_plugintype = ""
-        plugintype = kvargs.get("plugintype", None)
-        if plugintype is not None:
-            filter_plugintype = " AND t5.name_type = :plugintype "
-
-        filter_flag_container = ""
-        flag_container = kvargs.get("flag_container", None)
-        if flag_container is not None:
-            filter_flag_container = " AND t4.flag_container = :flag_container "
-
-        filter_expiry_date = ""
-        if "filter_expired" in kvargs and kvargs.get("filter_expired") is not None:
-            kvargs.update(filter_expiry_date=datetime.today())
-            if kvargs.get("filter_expired") is True:
-                filter_expiry_date = " AND t3.expiry_date<=:filter_expiry_date "
-            else:
-                filter_expiry_date = " AND (t1.expiry_date>:filter_expiry_date OR t1.expiry_date is null) "
-            kvargs.pop("filter_expired")
-
-        # manage tags
-        servicetags_or = kvargs.get("servicetags_or", None)
-        servicetags_and = kvargs.get("servicetags_and", None)
-        if servicetags_or is not None or servicetags_and is not None:
-            ## TODO FIX GROUP BY
-            custom_select = (
-                "("
-                " SELECT "
-                "   t1.*, "
-                "   t6.name as definition_name, "
-			    "   t4.id as type_id, "
-			    "   t4.objclass as objclass, "
-                "   GROUP_CONCAT(DISTINCT t2.name ORDER BY t2.name) as tags "
-                " FROM service_instance t1 "
-                " inner join tag_instance t3 on t3.fk_service_instance_id = t1.id "
-		        " inner join service_tag t2 on t3.fk_service_tag_id = t2.id "
-                " inner join service_definition t6 on t1.fk_service_definition_id = t6.id "
-			    " inner join service_type t4 on t6.fk_service_type_id = t4.id "
-                " WHERE "
-                "    (t2.name in :servicetag_list) "
-                f"   {filter_expiry_date} "
-                f"   {filter_flag_container} "
-                " AND EXISTS ( "
-                "   select * "
-                "   from service_plugin_type t5 "
-                "   where t4.objclass = t5.objclass "
-                f"   {filter_plugintype} "
-                " ) "
-                " GROUP BY t1.id )"
-            )
-            if servicetags_and is not None:
-                servicetags_and.sort()
-                kvargs["servicetag_list"] = servicetags_and
-                kvargs["servicetags"] = ",".join(servicetags_and)
-                filters.append("AND t3.tags=:servicetags")
-            elif servicetags_or is not None:
-                kvargs["servicetag_list"] = servicetags_or
-        else:
-            ## TODO FIX GROUP BY
-            custom_select = (
-                "("
-                " SELECT "
-                "   t1.*, "
-                "   t6.name as definition_name, "
-			    "   t4.id as type_id, "
-			    "   t4.objclass as objclass, "
-                "   GROUP_CONCAT(DISTINCT t2.name ORDER BY t2.name) as tags "
-                " FROM service_instance t1 "
-                " inner join service_definition t6 on t1.fk_service_definition_id = t6.id "
-			    " inner join service_type t4 on t6.fk_service_type_id = t4.id "
-                " left outer join tag_instance t3 ON t3.fk_service_instance_id=t1.id "
-                " left outer join service_tag t2 ON t3.fk_service_tag_id=t2.id "
-                " WHERE 1=1 "
-		        f"   {filter_expiry_date} "
-                f"   {filter_flag_container} "
-                " AND EXISTS ( "
-                "   select * "
-                "   from service_plugin_type t5 "
-                "   where t4.objclass = t5.objclass "
-                f"   {filter_plugintype} "
-                " ) "
-                " GROUP BY t1.id)"
-            )
+        tags_idx = self.get_service_instance_tags_idx([r.id for r in res])
+        for r in res:
+            set_committed_value(r, "inst_tags", tags_idx.get(r.id, None))
 
-        res: List[ServiceTypePluginInstance]
-        total: int
-        res, total = self.get_api_bo_paginated_entities(
-            ServiceTypePluginInstance,
-            filters=filters,
-            tables=tables,
-            select_fields=select_fields,
-            custom_select=custom_select,
-            *args,
-            **kvargs,
-        )
         return res, total
-    
 
     # @transaction
     def update_service_instance(self, *args, **kvargs):
@@ -3588,6 +3925,115 @@ class ServiceDbManager(AbstractDbManager):
 
         return res
 
+    # set to False the first time the database refuses a recursive CTE (ex. MySQL < 8.0)
+    hierarchy_cte_supported = True
+
+    def __hierarchy_query(self, session: Session, hierarchy):
+        """Select instances, plugin type name and hierarchy columns of a hierarchy cte or subquery"""
+        return (
+            session.query(ServiceInstance, ServicePluginType.name_type, hierarchy.c.depth, hierarchy.c.link_id)
+            .join(hierarchy, hierarchy.c.id == ServiceInstance.id)
+            .outerjoin(ServiceDefinition, ServiceDefinition.id == ServiceInstance.service_definition_id)
+            .outerjoin(ServiceType, ServiceType.id == ServiceDefinition.service_type_id)
+            .outerjoin(ServicePluginType, ServicePluginType.objclass == ServiceType.objclass)
+            .order_by(hierarchy.c.depth, ServiceInstance.id)
+        )
+
+    def __get_service_instance_hierarchy(self, instance_id: int, ancestors: bool, max_depth: int) -> List[Tuple]:
+        """Walk service_link_inst starting from instance_id with a recursive cte. When the database does not
+        support recursive cte fall back to one query for each level.
+
+        :param instance_id: start instance id
+        :param ancestors: if True walk parents else walk children
+        :param max_depth: max number of levels to walk
+        :return: list of (ServiceInstance, plugin type name, depth, linked instance id) ordered by depth
+        """
+        session: Session = self.get_session()
+        if ancestors is True:
+            next_field, prev_field = "start_service_id", "end_service_id"
+        else:
+            next_field, prev_field = "end_service_id", "start_service_id"
+
+        def link_query(link, instance, depth, link_id):
+            return (
+                session.query(
+                    getattr(link, next_field).label("id"),
+                    depth.label("depth"),
+                    link_id.label("link_id"),
+                )
+                .join(instance, instance.id == getattr(link, next_field))
+                .filter(instance.status != SrvStatusType.DELETED)
+                # links are soft deleted with expiry_date, like in the linkParent and linkChildren relationships
+                .filter(or_(link.expiry_date == None, link.expiry_date >= func.now()))
+            )
+
+        if ServiceDbManager.hierarchy_cte_supported is True:
+            hierarchy = (
+                link_query(ServiceLinkInstance, ServiceInstance, literal(1), getattr(ServiceLinkInstance, prev_field))
+                .filter(getattr(ServiceLinkInstance, prev_field) == instance_id)
+                .cte(name="hierarchy", recursive=True)
+            )
+            link = aliased(ServiceLinkInstance)
+            instance = aliased(ServiceInstance)
+            hierarchy = hierarchy.union_all(
+                link_query(link, instance, hierarchy.c.depth + 1, getattr(link, prev_field))
+                .filter(getattr(link, prev_field) == hierarchy.c.id)
+                .filter(hierarchy.c.depth < max_depth)
+            )
+            try:
+                return self.__hierarchy_query(session, hierarchy).all()
+            except (exc.OperationalError, exc.ProgrammingError) as ex:
+                self.logger.warning("Recursive cte not supported, use service hierarchy fallback: %s" % ex)
+                ServiceDbManager.hierarchy_cte_supported = False
+
+        res = []
+        frontier = [instance_id]
+        visited = {instance_id}
+        depth = 1
+        while len(frontier) > 0 and depth <= max_depth:
+            prev_id = getattr(ServiceLinkInstance, prev_field)
+            level = (
+                link_query(ServiceLinkInstance, ServiceInstance, literal(depth), prev_id)
+                .filter(prev_id.in_(frontier))
+                .subquery()
+            )
+            frontier = []
+            for row in self.__hierarchy_query(session, level).all():
+                if row[0].id not in visited:
+                    visited.add(row[0].id)
+                    frontier.append(row[0].id)
+                    res.append(row)
+            depth += 1
+        return res
+
+    @query
+    def get_service_instance_ancestors(self, instance_id: int, max_depth: int = 20) -> List[Tuple]:
+        """Get the ancestor chain of a service instance in one recursive query. Ancestors in DELETED status stop
+        the chain like in get_service_instance_parent
+
+        :param instance_id: service instance id
+        :param max_depth: max number of levels to walk [default=20]
+        :return: list of (ServiceInstance, plugin type name, depth, child instance id). depth is 1 for the parent
+        :raises QueryError: raise :class:`QueryError`
+        """
+        res = self.__get_service_instance_hierarchy(instance_id, True, max_depth)
+        self.logger.debug2("Get service instance %s ancestors: %s" % (instance_id, truncate(res)))
+        return res
+
+    @query
+    def get_service_instance_subtree(self, instance_id: int, max_depth: int = 20) -> List[Tuple]:
+        """Get the whole subtree of a service instance in one recursive query. Children in DELETED status are
+        skipped with their subtree like in get_service_instance_children
+
+        :param instance_id: service instance id
+        :param max_depth: max number of levels to walk [default=20]
+        :return: list of (ServiceInstance, plugin type name, depth, parent instance id) ordered by depth
+        :raises QueryError: raise :class:`QueryError`
+        """
+        res = self.__get_service_instance_hierarchy(instance_id, False, max_depth)
+        self.logger.debug2("Get service instance %s subtree: %s" % (instance_id, truncate(res)))
+        return res
+
     @query
     def get_service_instance_for_update(self, start_service_id):
         """Get all filtered ServiceLink.
@@ -5564,6 +6010,99 @@ class ServiceDbManager(AbstractDbManager):
 
         return rcs
 
+    @query
+    def get_report_costs_by_accounts_chunk(
+        self, account_ids, start_date=None, end_date=None, last=None, size=1000, active=None, filter_expired=None
+    ):
+        """Get a chunk of the daily ReportCost of a group of accounts with the metric type joined, ordered by plugin
+        name and period. Chunks are read by keyset: the next chunk starts after the last row of the previous one.
+
+        :param account_ids: array of account id
+        :param start_date: period start date (optional)
+        :param end_date: period end date (optional)
+        :param last: (plugin_name, period, id) of the last row of the previous chunk (optional)
+        :param size: max number of rows of the chunk
+        :param active: filter by active (optional)
+        :param filter_expired: if True get only expired costs, if False only not expired costs (optional)
+        :return: list of rows (plugin_name, period, metric_type_id, name, measure_unit, value, cost, id)
+        :raises QueryError: raise :class:`QueryError`
+        """
+        session = self.get_session()
+        query = session.query(
+            ReportCost.plugin_name,
+            ReportCost.period,
+            ReportCost.metric_type_id,
+            ServiceMetricType.name,
+            ServiceMetricType.measure_unit,
+            ReportCost.value,
+            ReportCost.cost,
+            ReportCost.id,
+        ).join(ServiceMetricType, ServiceMetricType.id == ReportCost.metric_type_id)
+
+        if account_ids is not None:
+            if len(account_ids) > 0:
+                query = query.filter(ReportCost.account_id.in_(account_ids))
+            else:
+                return []
+
+        if start_date is not None and end_date is not None:
+            query = query.filter(ReportCost.period >= start_date)
+            query = query.filter(ReportCost.period <= end_date)
+
+        # same active and expired filters of get_base_entity_sqlfilters used by get_paginated_report_costs
+        if active is not None:
+            query = query.filter(ReportCost.active == active)
+        if filter_expired is True:
+            query = query.filter(ReportCost.expiry_date <= datetime.today())
+        elif filter_expired is False:
+            query = query.filter(or_(ReportCost.expiry_date == None, ReportCost.expiry_date > datetime.today()))
+
+        if last is not None:
+            plugin_name, period, oid = last
+            query = query.filter(
+                or_(
+                    ReportCost.plugin_name > plugin_name,
+                    and_(
+                        ReportCost.plugin_name == plugin_name,
+                        or_(ReportCost.period < period, and_(ReportCost.period == period, ReportCost.id < oid)),
+                    ),
+                )
+            )
+
+        query = query.order_by(ReportCost.plugin_name, ReportCost.period.desc(), ReportCost.id.desc())
+        return query.limit(size).all()
+
+    def iter_report_costs_by_accounts(self, account_ids, start_date=None, end_date=None, chunk_size=1000, **kvargs):
+        """Stream the daily ReportCost of a group of accounts with the metric type joined, ordered by plugin name
+        and period so that the rows can be folded into days while they are read. Rows are read in chunks by
+        get_report_costs_by_accounts_chunk, every chunk is fetched entirely inside its own query.
+
+        :param account_ids: array of account id
+        :param start_date: period start date (optional)
+        :param end_date: period end date (optional)
+        :param chunk_size: number of rows read for each query
+        :param kvargs.active: filter by active (optional)
+        :param kvargs.filter_expired: if True get only expired costs, if False only not expired costs (optional)
+        :return: generator of rows (plugin_name, period, metric_type_id, name, measure_unit, value, cost)
+        :raises QueryError: raise :class:`QueryError`
+        """
+        last = None
+        while True:
+            rows = self.get_report_costs_by_accounts_chunk(
+                account_ids,
+                start_date=start_date,
+                end_date=end_date,
+                last=last,
+                size=chunk_size,
+                active=kvargs.get("active", None),
+                filter_expired=kvargs.get("filter_expired", None),
+            )
+            for row in rows:
+                yield tuple(row[:7])
+            if len(rows) < chunk_size:
+                break
+            last = (rows[-1][0], rows[-1][1], rows[-1][7])
+
     @query
     def get_plugin_type_by_account(self, account_ids, category=None):
         pass
@@ -6469,86 +7008,46 @@ class ServiceDbManager(AbstractDbManager):
 
     @query
     def get_instant_consumes(self, oid):
-        """Get instant consume.
+        """Get instant consume. Metrics are read from service_instant_metric_snapshot that keeps the metrics of the
+        last job of each service instance and metric type.
 
         :param int oid: account id
-        :return: list of metrics object
+        :return: list of (container_id, metric_type_name, group_name, value, extraction_date)
         :raise QueryError:
         """
         session = self.get_session()
-        params = {"oid": oid}
-        sql1 = [
-            "select v.parent as container_id, mc.metric_type_name as metric_type_name, smt.group_name as group_name, "
-            "sum(mc.value) as value,",
-            "max(mc.extraction_date) as extraction_date,",
-            "max(pt.category )  as category,",
-            "max(pt.name_type) as plugin_name,",
-            "max(p1.id) as instance_id",
-            "from service_instance i",
-            "join v_instance_horiz v on v.child = i.id",
-            "join service_instance p on p.id = v.parent",
-            "join service_definition d on d.id = p.fk_service_definition_id",
-            "join service_type t on t.id = d.fk_service_type_id",
-            "join service_instance p1 on p1.id=v.child",
-            "join service_definition d1 on d1.id = p1.fk_service_definition_id",
-            "join service_type t1 on t1.id = d1.fk_service_type_id",
-            "join service_plugin_type pt on pt.objclass=t1.objclass",
-            "left join v_metric_consume mc on mc.service_instance_id = i.id",
-            "join service_metric_type smt on smt.id=mc.metric_type_id",
-            "join (select fk_service_instance_id, max(fk_job_id) as fk_job_id from service_metric group by "
-            "fk_service_instance_id) as ljob on ljob.fk_job_id = mc.job_id",
-            "where t.flag_container = true and p.active = 1 and p.fk_account_id=:oid ",
-            "group by container_id, metric_type_name, group_name, extraction_date",
-        ]
-        smtp1 = text(" ".join(sql1))
-        self.logger.warning("%s" % smtp1)
+        snapshot = ServiceInstantMetricSnapshot
         # get all  metric of type consume
-        sql2 = [
-            "select container_id, metric_type_name, group_name, sum(value) as value, "
-            "max(extraction_date) as extraction_date from (",
-            "%s" % smtp1,
-            ") as b",
-            "group by b.container_id, b.metric_type_name, b.group_name",
-        ]
-
-        smtp2 = text(" ".join(sql2))
         query = (
             session.query(
-                "container_id",
-                "metric_type_name",
-                "group_name",
-                "value",
-                "extraction_date",
+                snapshot.container_id,
+                snapshot.metric_type_name,
+                snapshot.group_name,
+                func.sum(snapshot.value),
+                func.max(snapshot.extraction_date),
             )
-            .from_statement(smtp2)
-            .params(**params)
+            .filter(snapshot.account_id == oid)
+            .group_by(snapshot.container_id, snapshot.metric_type_name, snapshot.group_name)
         )
         res = query.all()
 
         # calculate istance metric, for example vm instance, database instance
         # ...
-        sql2 = [
-            "select container_id,  plugin_name as metric_type_name, max(group_name) as group_name, "
-            "count(distinct instance_id) as value, max(extraction_date) as extraction_date from ( ",
-            "%s" % smtp1,
-            ") as b ",
-            "where b.category = '%s' " % SrvPluginTypeCategory.INSTANCE,
-            "and b.group_name in ( select name_type from service_plugin_type where category = '%s' ) "
-            % SrvPluginTypeCategory.CONTAINER,
-            "group by b.container_id, b.instance_id, b.category, b.plugin_name, b.group_name ",
-        ]
-
-        smtp2 = text(" ".join(sql2))
+        container_types = session.query(ServicePluginType.name_type).filter(
+            ServicePluginType.category == SrvPluginTypeCategory.CONTAINER
+        )
         query = (
             session.query(
-                "container_id",
-                "metric_type_name",
-                "group_name",
-                "value",
-                "extraction_date",
+                snapshot.container_id,
+                snapshot.plugin_name,
+                func.max(snapshot.group_name),
+                func.count(snapshot.service_instance_id.distinct()),
+                func.max(snapshot.extraction_date),
             )
-            .from_statement(smtp2)
-            .params(**params)
+            .filter(snapshot.account_id == oid)
+            .filter(snapshot.category == SrvPluginTypeCategory.INSTANCE)
+            .filter(snapshot.group_name.in_(container_types))
+            .group_by(snapshot.container_id, snapshot.service_instance_id, snapshot.plugin_name)
         )
         res_instance = query.all()
         res.extend(res_instance)
@@ -6565,11 +7064,11 @@ class ServiceDbManager(AbstractDbManager):
         """Get a specific service instant consume.
 
         :param id: entity id
-        :return: one of ServiceInstantConsume
+        :return: one of ServiceInstantConsumeSnapshot
         :raises TransactionError: raise :class:`TransactionError`
         """
         session = self.get_session()
-        query = session.query(ServiceInstantConsume).filter(ServiceInstantConsume.id == id)
+        query = session.query(ServiceInstantConsumeSnapshot).filter(ServiceInstantConsumeSnapshot.id == id)
         res = query.one_or_none()
         return res
 
@@ -6583,17 +7082,18 @@ class ServiceDbManager(AbstractDbManager):
         :raises TransactionError: raise :class:TransactionError
         """
         session = self.get_session()
+        # read the snapshot refreshed by the metrics acquisition, v_service_instant_consume is computed on each read
         query = session.query(
-            ServiceInstantConsume.plugin_name,
-            ServiceInstantConsume.metric_group_name,
-            ServiceInstantConsume.metric_unit,
-            ServiceInstantConsume.metric_instant_value,
-            ServiceInstantConsume.metric_value,
-            ServiceInstantConsume.creation_date,
-        ).filter(ServiceInstantConsume.account_id.in_(account_list_id))
+            ServiceInstantConsumeSnapshot.plugin_name,
+            ServiceInstantConsumeSnapshot.metric_group_name,
+            ServiceInstantConsumeSnapshot.metric_unit,
+            ServiceInstantConsumeSnapshot.metric_instant_value,
+            ServiceInstantConsumeSnapshot.metric_value,
+            ServiceInstantConsumeSnapshot.creation_date,
+        ).filter(ServiceInstantConsumeSnapshot.account_id.in_(account_list_id))
 
         if plugin_name is not None:
-            query = query.filter(ServiceInstantConsume.plugin_name == plugin_name)
+            query = query.filter(ServiceInstantConsumeSnapshot.plugin_name == plugin_name)
 
         res = query.all()
 
@@ -6611,6 +7111,30 @@ class ServiceDbManager(AbstractDbManager):
         self.logger.debug2("Get service instant consumes: %s" % instance_consumes)
         return instance_consumes
 
+    @transaction
+    def refresh_instant_consume_snapshot(self, account_ids: Optional[List[int]] = None, job_id: int = None) -> int:
+        """Replace the rows of some accounts in the instant consume snapshots, service_instant_consume_snapshot and
+        service_instant_metric_snapshot
+
+        :param account_ids: list of account id. If None the snapshots of all the accounts are refreshed
+        :param job_id: id of the job that refreshes the snapshots [optional]
+        :return: number of snapshot rows written
+        :raise TransactionError:
+        """
+        if account_ids is not None and len(account_ids) == 0:
+            return 0
+
+        session = self.get_session()
+        res = 0
+        for table, delete_stmt, delete_params, insert_stmt, insert_params in snapshot_statements(
+            account_ids=account_ids, job_id=job_id
+        ):
+            session.execute(delete_stmt, delete_params)
+            rows = session.execute(insert_stmt, insert_params).rowcount
+            self.logger.debug("Refresh instant consume snapshot %s: %s rows" % (table, rows))
+            res += rows
+        return res
+
     @query
     def get_paginated_service_instant_consumes(
         self,
@@ -6648,7 +7172,7 @@ class ServiceDbManager(AbstractDbManager):
         :param size: number of entities to show in list per page [default=0]
         :param order: sort order [default=DESC]
         :param field: sort field [default=id]
-        :return: array of ServiceInstantConsume
+        :return: array of ServiceInstantConsumeSnapshot
         :raises TransactionError: raise :class:`TransactionError`
         """
 
@@ -6687,7 +7211,7 @@ class ServiceDbManager(AbstractDbManager):
         )
 
         res, total = self.get_api_bo_paginated_entities(
-            ServiceInstantConsume, tables=tables, filters=filters, *args, **kvargs
+            ServiceInstantConsumeSnapshot, tables=tables, filters=filters, *args, **kvargs
         )
 
         return res, total
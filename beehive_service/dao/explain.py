@@ -0,0 +1,117 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# Usage: python -m beehive_service.dao.explain db_uri
+#
+# Run EXPLAIN on the main service DAO queries and flag the tables read with a full scan. The statements are not
+# copied here: every DAO method is called on the database and the sql it sends is captured and explained.
+# Exit code is 1 when at least one full scan is found.
+
+import sys
+from typing import List, Dict, Tuple
+from uuid import uuid4
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from beehive.common.data import operation
+from beehive_service.dao.ServiceDao import ServiceDbManager
+
+SAMPLE_UUID = "00000000-0000-0000-0000-000000000000"
+
+# main queries of ServiceDbManager. Arguments are sample values, EXPLAIN does not depend on them
+MAIN_QUERIES = {
+    "get_service_info by resource_uuid": lambda manager: manager.get_service_info(resource_uuid=SAMPLE_UUID),
+    "get_service_instance_from_resource": lambda manager: manager.get_service_instance_from_resource(SAMPLE_UUID),
+    "get_service_instances by status": lambda manager: manager.get_service_instances(status="ERROR"),
+    "get_service_instances by account and definition": lambda manager: manager.get_service_instances(
+        fk_account_id=1, fk_service_definition_id=1
+    ),
+    "get_instant_consumes": lambda manager: manager.get_instant_consumes(1),
+    "get_service_instance_tags_idx": lambda manager: manager.get_service_instance_tags_idx([1, 2]),
+    "get_service_instance_parent": lambda manager: manager.get_service_instance_parent(1),
+    "get_service_instance_children": lambda manager: manager.get_service_instance_children(1, None),
+}
+
+# EXPLAIN access types that read a whole table or a whole index
+FULL_SCAN_TYPES = ["ALL", "index"]
+
+
+def capture_statements(engine, func) -> List[Tuple[str, object]]:
+    """Call a DAO method and capture the select statements it sends to the database
+
+    :param engine: database engine
+    :param func: function that calls the DAO method with a ServiceDbManager
+    :return: list of (statement, parameters) in the driver format
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:6].lower() == "select":
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    session = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    operation.id = str(uuid4())
+    operation.transaction = None
+    operation.session = session
+    try:
+        func(ServiceDbManager())
+    finally:
+        operation.session = None
+        session.close()
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return statements
+
+
+def explain_queries(db_uri: str) -> List[Dict]:
+    """Run EXPLAIN on the statements of the main DAO queries
+
+    :param db_uri: database uri
+    :return: list of dict with query name, table, access type, key, rows and full_scan flag
+    """
+    res = []
+    engine = create_engine(db_uri)
+    try:
+        for name, func in MAIN_QUERIES.items():
+            statements = capture_statements(engine, func)
+            if len(statements) == 0:
+                raise Exception("%s sent no select statement" % name)
+            with engine.connect() as conn:
+                for statement, parameters in statements:
+                    for row in conn.exec_driver_sql("EXPLAIN %s" % statement, parameters).fetchall():
+                        row = dict(row._mapping)
+                        res.append(
+                            {
+                                "query": name,
+                                "table": row.get("table"),
+                                "type": row.get("type"),
+                                "key": row.get("key"),
+                                "rows": row.get("rows"),
+                                "full_scan": row.get("type") in FULL_SCAN_TYPES,
+                            }
+                        )
+    finally:
+        engine.dispose()
+    return res
+
+
+def main(argv):
+    if len(argv) != 1:
+        print("Usage: python -m beehive_service.dao.explain db_uri")
+        return 2
+
+    full_scans = 0
+    for item in explain_queries(argv[0]):
+        flag = "FULL SCAN" if item["full_scan"] is True else "ok"
+        print(
+            "%-10s %-50s %-25s type=%-8s key=%-30s rows=%s"
+            % (flag, item["query"], item["table"], item["type"], item["key"], item["rows"])
+        )
+        if item["full_scan"] is True:
+            full_scans += 1
+    print("%s full scans found" % full_scans)
+    return 1 if full_scans > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,127 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# Usage: python -m beehive_service.dao.instant_consume_snapshot db_uri [account_id ...]
+#
+# Rebuild the instant consume snapshots:
+# - service_instant_consume_snapshot from v_service_instant_consume, that computes the instant consumes from service
+#   instances and aggregate costs
+# - service_instant_metric_snapshot with the metrics of the last job of each service instance and metric type, read
+#   by the account instant consumes
+# Without account ids the snapshots of all the accounts are rebuilt.
+
+import sys
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import create_engine, text, bindparam
+
+SNAPSHOT_TABLE = "service_instant_consume_snapshot"
+SNAPSHOT_COLUMNS = (
+    "creation_date, modification_date, expiry_date, plugin_name, metric_group_name, metric_instant_value, "
+    "metric_unit, metric_value, fk_service_instance_id, fk_account_id, fk_job_id"
+)
+SNAPSHOT_SOURCE = (
+    "SELECT v.creation_date, :refresh_date, NULL, v.plugin_name, v.metric_group_name, v.metric_instant_value, "
+    "v.metric_unit, v.metric_value, v.fk_service_instance_id, v.fk_account_id, :job_id "
+    "FROM v_service_instant_consume v {account_filter}"
+)
+SNAPSHOT_ACCOUNT_FILTER = "WHERE v.fk_account_id IN :account_ids"
+
+METRIC_SNAPSHOT_TABLE = "service_instant_metric_snapshot"
+METRIC_SNAPSHOT_COLUMNS = (
+    "creation_date, modification_date, expiry_date, fk_account_id, fk_container_id, fk_service_instance_id, "
+    "fk_metric_type_id, metric_type_name, group_name, plugin_name, category, value, extraction_date, fk_job_id"
+)
+# metrics of the last job of each service instance, grouped by container, service instance and metric type
+METRIC_SNAPSHOT_SOURCE = (
+    "SELECT :refresh_date, :refresh_date, NULL, p.fk_account_id, v.parent, i.id, mc.metric_type_id, "
+    "mc.metric_type_name, smt.group_name, pt.name_type, pt.category, SUM(mc.value), MAX(mc.extraction_date), "
+    "ljob.fk_job_id "
+    "FROM service_instance i "
+    "JOIN v_instance_horiz v ON v.child = i.id "
+    "JOIN service_instance p ON p.id = v.parent "
+    "JOIN service_definition d ON d.id = p.fk_service_definition_id "
+    "JOIN service_type t ON t.id = d.fk_service_type_id "
+    "JOIN service_definition d1 ON d1.id = i.fk_service_definition_id "
+    "JOIN service_type t1 ON t1.id = d1.fk_service_type_id "
+    "JOIN service_plugin_type pt ON pt.objclass = t1.objclass "
+    "JOIN v_metric_consume mc ON mc.service_instance_id = i.id "
+    "JOIN service_metric_type smt ON smt.id = mc.metric_type_id "
+    "JOIN (SELECT fk_service_instance_id, MAX(fk_job_id) AS fk_job_id FROM service_metric "
+    "GROUP BY fk_service_instance_id) ljob ON ljob.fk_service_instance_id = i.id AND ljob.fk_job_id = mc.job_id "
+    "WHERE t.flag_container = true AND p.active = 1 {account_filter} "
+    "GROUP BY p.fk_account_id, v.parent, i.id, mc.metric_type_id, mc.metric_type_name, smt.group_name, "
+    "pt.name_type, pt.category, ljob.fk_job_id"
+)
+METRIC_SNAPSHOT_ACCOUNT_FILTER = "AND p.fk_account_id IN :account_ids"
+
+# (table, columns, source, account filter) of every snapshot
+SNAPSHOTS = [
+    (SNAPSHOT_TABLE, SNAPSHOT_COLUMNS, SNAPSHOT_SOURCE, SNAPSHOT_ACCOUNT_FILTER),
+    (METRIC_SNAPSHOT_TABLE, METRIC_SNAPSHOT_COLUMNS, METRIC_SNAPSHOT_SOURCE, METRIC_SNAPSHOT_ACCOUNT_FILTER),
+]
+
+
+def snapshot_statements(account_ids: Optional[List[int]] = None, job_id: Optional[int] = None) -> list:
+    """Get the statements that replace the snapshot rows of some accounts with the rows computed from service
+    metrics. Statements must be executed in the same transaction.
+
+    :param account_ids: list of account id. If None the rows of all the accounts are replaced
+    :param job_id: id of the job that refreshes the snapshots [optional]
+    :return: list of (table, delete statement, delete params, insert statement, insert params)
+    """
+    res = []
+    refresh_date = datetime.today()
+    for table, columns, source, account_filter in SNAPSHOTS:
+        delete_sql = "DELETE FROM %s" % table
+        insert_sql = "INSERT INTO %s (%s) " % (table, columns)
+        params = {"refresh_date": refresh_date, "job_id": job_id}
+        if account_ids is None:
+            res.append((table, text(delete_sql), {}, text(insert_sql + source.format(account_filter="")), params))
+            continue
+
+        delete_stmt = text(delete_sql + " WHERE fk_account_id IN :account_ids").bindparams(
+            bindparam("account_ids", expanding=True)
+        )
+        insert_stmt = text(insert_sql + source.format(account_filter=account_filter)).bindparams(
+            bindparam("account_ids", expanding=True)
+        )
+        params["account_ids"] = list(account_ids)
+        res.append((table, delete_stmt, {"account_ids": list(account_ids)}, insert_stmt, params))
+    return res
+
+
+def rebuild_snapshot(db_uri: str, account_ids: Optional[List[int]] = None) -> dict:
+    """Rebuild the instant consume snapshots
+
+    :param db_uri: database uri
+    :param account_ids: list of account id. If None the snapshots of all the accounts are rebuilt
+    :return: dict with the number of rows written in every snapshot table
+    """
+    res = {}
+    engine = create_engine(db_uri)
+    try:
+        with engine.begin() as conn:
+            for table, delete_stmt, delete_params, insert_stmt, insert_params in snapshot_statements(account_ids):
+                conn.execute(delete_stmt, delete_params)
+                res[table] = conn.execute(insert_stmt, insert_params).rowcount
+    finally:
+        engine.dispose()
+    return res
+
+
+def main(argv):
+    if len(argv) < 1:
+        print("Usage: python -m beehive_service.dao.instant_consume_snapshot db_uri [account_id ...]")
+        return 2
+
+    account_ids = [int(a) for a in argv[1:]] or None
+    res = rebuild_snapshot(argv[0], account_ids=account_ids)
+    for table, rows in res.items():
+        print("%s %s rows written" % (table, rows))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
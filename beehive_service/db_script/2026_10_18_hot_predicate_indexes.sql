@@ -0,0 +1,25 @@
+-- MariaDB only: CREATE INDEX IF NOT EXISTS is not supported by MySQL. On MySQL drop IF NOT EXISTS and run each
+-- statement once, after checking information_schema.statistics for the index name.
+SET SESSION wsrep_OSU_method='RSU';
+SET wsrep_OSU_method='RSU';
+
+-- service instance lookup by resource (get_service_info, get_service_instance_from_resource)
+CREATE INDEX IF NOT EXISTS idx_srvinst_resource_uuid ON service_instance (resource_uuid);
+
+-- service instance filter by status
+CREATE INDEX IF NOT EXISTS idx_srvinst_status ON service_instance (status);
+
+-- service instance filter by account and service definition
+CREATE INDEX IF NOT EXISTS idx_srvinst_account_def ON service_instance (fk_account_id, fk_service_definition_id);
+
+-- last job of each service instance (max(fk_job_id) subquery of get_instant_consumes)
+CREATE INDEX IF NOT EXISTS idx_srvmetric_inst_job ON service_metric (fk_service_instance_id, fk_job_id);
+
+-- tags of a service instance
+CREATE INDEX IF NOT EXISTS idx_taginst_inst_tag ON tag_instance (fk_service_instance_id, fk_service_tag_id);
+
+SET SESSION wsrep_OSU_method='TOI';
+SET wsrep_OSU_method='TOI';
+
+SHOW status LIKE 'wsrep_local_state_comment';
+SHOW status LIKE 'wsrep_cluster_status';
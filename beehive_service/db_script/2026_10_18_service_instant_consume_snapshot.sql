@@ -0,0 +1,33 @@
+SET SESSION wsrep_OSU_method='RSU';
+SET wsrep_OSU_method='RSU';
+
+-- last instant consume of each account, plugin type and metric group. Refreshed at the end of each metrics
+-- acquisition, rebuild with: python -m beehive_service.dao.instant_consume_snapshot db_uri
+CREATE TABLE IF NOT EXISTS `service_instant_consume_snapshot` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `creation_date` datetime DEFAULT NULL,
+  `modification_date` datetime DEFAULT NULL,
+  `expiry_date` datetime DEFAULT NULL,
+  `plugin_name` varchar(100) DEFAULT NULL,
+  `metric_group_name` varchar(50) DEFAULT NULL,
+  `metric_instant_value` double NOT NULL DEFAULT 0,
+  `metric_unit` varchar(40) DEFAULT NULL,
+  `metric_value` double NOT NULL DEFAULT 0,
+  `fk_service_instance_id` int(11) DEFAULT NULL,
+  `fk_account_id` int(11) NOT NULL,
+  `fk_job_id` int(11) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `udx_srvinstcons_snap_1` (`fk_account_id`, `plugin_name`, `metric_group_name`),
+  CONSTRAINT `service_instant_consume_snapshot_ibfk_1` FOREIGN KEY (`fk_account_id`) REFERENCES `account` (`id`)
+) ENGINE=InnoDB;
+
+SET SESSION wsrep_OSU_method='TOI';
+SET wsrep_OSU_method='TOI';
+
+-- initial load
+DELETE FROM `service_instant_consume_snapshot`;
+INSERT INTO `service_instant_consume_snapshot` (creation_date, modification_date, expiry_date, plugin_name,
+  metric_group_name, metric_instant_value, metric_unit, metric_value, fk_service_instance_id, fk_account_id, fk_job_id)
+SELECT v.creation_date, now(), NULL, v.plugin_name, v.metric_group_name, v.metric_instant_value, v.metric_unit,
+  v.metric_value, v.fk_service_instance_id, v.fk_account_id, NULL
+FROM `v_service_instant_consume` v;
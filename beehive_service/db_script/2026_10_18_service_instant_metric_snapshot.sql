@@ -0,0 +1,53 @@
+SET SESSION wsrep_OSU_method='RSU';
+SET wsrep_OSU_method='RSU';
+
+-- metrics of the last job of each service instance and metric type, read by the account instant consumes. Refreshed
+-- at the end of each metrics acquisition and daily consumes, rebuild with:
+-- python -m beehive_service.dao.instant_consume_snapshot db_uri
+CREATE TABLE IF NOT EXISTS `service_instant_metric_snapshot` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `creation_date` datetime DEFAULT NULL,
+  `modification_date` datetime DEFAULT NULL,
+  `expiry_date` datetime DEFAULT NULL,
+  `fk_account_id` int(11) NOT NULL,
+  `fk_container_id` int(11) NOT NULL,
+  `fk_service_instance_id` int(11) NOT NULL,
+  `fk_metric_type_id` int(11) NOT NULL,
+  `metric_type_name` varchar(100) DEFAULT NULL,
+  `group_name` varchar(50) DEFAULT NULL,
+  `plugin_name` varchar(100) DEFAULT NULL,
+  `category` varchar(100) DEFAULT NULL,
+  `value` double NOT NULL DEFAULT 0,
+  `extraction_date` datetime DEFAULT NULL,
+  `fk_job_id` int(11) DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `udx_srvinstmetric_snap_1` (`fk_container_id`, `fk_service_instance_id`, `fk_metric_type_id`),
+  KEY `idx_srvinstmetric_snap_account` (`fk_account_id`),
+  CONSTRAINT `service_instant_metric_snapshot_ibfk_1` FOREIGN KEY (`fk_account_id`) REFERENCES `account` (`id`)
+) ENGINE=InnoDB;
+
+SET SESSION wsrep_OSU_method='TOI';
+SET wsrep_OSU_method='TOI';
+
+-- initial load
+DELETE FROM `service_instant_metric_snapshot`;
+INSERT INTO `service_instant_metric_snapshot` (creation_date, modification_date, expiry_date, fk_account_id,
+  fk_container_id, fk_service_instance_id, fk_metric_type_id, metric_type_name, group_name, plugin_name, category,
+  value, extraction_date, fk_job_id)
+SELECT now(), now(), NULL, p.fk_account_id, v.parent, i.id, mc.metric_type_id, mc.metric_type_name, smt.group_name,
+  pt.name_type, pt.category, SUM(mc.value), MAX(mc.extraction_date), ljob.fk_job_id
+FROM `service_instance` i
+  JOIN `v_instance_horiz` v ON v.child = i.id
+  JOIN `service_instance` p ON p.id = v.parent
+  JOIN `service_definition` d ON d.id = p.fk_service_definition_id
+  JOIN `service_type` t ON t.id = d.fk_service_type_id
+  JOIN `service_definition` d1 ON d1.id = i.fk_service_definition_id
+  JOIN `service_type` t1 ON t1.id = d1.fk_service_type_id
+  JOIN `service_plugin_type` pt ON pt.objclass = t1.objclass
+  JOIN `v_metric_consume` mc ON mc.service_instance_id = i.id
+  JOIN `service_metric_type` smt ON smt.id = mc.metric_type_id
+  JOIN (SELECT fk_service_instance_id, MAX(fk_job_id) AS fk_job_id FROM `service_metric`
+    GROUP BY fk_service_instance_id) ljob ON ljob.fk_service_instance_id = i.id AND ljob.fk_job_id = mc.job_id
+WHERE t.flag_container = true AND p.active = 1
+GROUP BY p.fk_account_id, v.parent, i.id, mc.metric_type_id, mc.metric_type_name, smt.group_name, pt.name_type,
+  pt.category, ljob.fk_job_id;
@@ -34,9 +34,9 @@ class ApiAccountServiceDefinition(ServiceApiObject):
         # child classes
         self.child_classes = []
 
-        self.update_object = self.manager.update_service_instance
-        self.delete_object = self.manager.delete
-        self.expunge_object = self.manager.purge
+        self.update_object = self.controller.catalog_cache.invalidate_after(self.manager.update_service_instance)
+        self.delete_object = self.controller.catalog_cache.invalidate_after(self.manager.delete)
+        self.expunge_object = self.controller.catalog_cache.invalidate_after(self.manager.purge)
 
     def __repr__(self):
         return "<%s id=%s objid=%s name=%s>" % (
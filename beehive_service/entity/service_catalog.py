@@ -67,8 +67,9 @@ class ApiServiceCatalog(ServiceApiObject):
         # child classes
         self.child_classes = []
 
-        self.update_object = self.manager.update_service_catalog
-        self.delete_object = self.manager.delete
+        self.update_object = self.controller.catalog_cache.invalidate_after(self.manager.update_service_catalog)
+        self.delete_object = self.controller.catalog_cache.invalidate_after(self.manager.delete)
+        self.expunge_object = self.controller.catalog_cache.invalidate_after(self.manager.purge)
 
     def info(self):
         """Get object info
@@ -35,8 +35,9 @@ class ApiServiceDefinition(ServiceApiObject):
         # child classes
         self.child_classes = [ApiServiceConfig, ApiServiceLinkDef]
 
-        self.update_object = self.manager.update_service_definition
-        self.delete_object = self.manager.delete
+        self.update_object = self.controller.catalog_cache.invalidate_after(self.manager.update_service_definition)
+        self.delete_object = self.controller.catalog_cache.invalidate_after(self.manager.delete)
+        self.expunge_object = self.controller.catalog_cache.invalidate_after(self.manager.purge)
 
     @property
     def service_category(self) -> str:
@@ -212,8 +213,9 @@ class ApiServiceConfig(ServiceApiObject):
         # child classes
         self.child_classes = []
 
-        self.update_object = self.manager.update_service_config
-        self.delete_object = self.manager.delete
+        self.update_object = self.controller.catalog_cache.invalidate_after(self.manager.update_service_config)
+        self.delete_object = self.controller.catalog_cache.invalidate_after(self.manager.delete)
+        self.expunge_object = self.controller.catalog_cache.invalidate_after(self.manager.purge)
 
     def info(self):
         """Get object info
@@ -3,6 +3,7 @@
 # (C) Copyright 2018-2026 CSI-Piemonte
 
 from __future__ import annotations
+from contextlib import contextmanager
 from time import sleep
 from typing import TYPE_CHECKING
 import ujson as json
@@ -17,7 +18,7 @@ from beehive.common.data import transaction, trace, operation
 from beehive_service.entity import ServiceApiObject, ApiServiceLink
 from beehive_service.model import ServiceInstance
 from beehive_service.model.base import SrvStatusType
-from beehive_service.service_util import ServiceUtil
+from beehive_service.service_util import ServiceUtil, __SRV_HIERARCHY_MAX_DEPTH__
 
 if TYPE_CHECKING:
     from .service_type import AsyncApiServiceTypePlugin
@@ -169,6 +170,42 @@ class ApiServiceInstance(ServiceApiObject):
             self.get_main_config()
         self.config_object.set_json_properties(data=data)
 
+    def begin_config_batch(self):
+        """Start buffering config changes. set_config calls only update the config in memory until flush_config.
+        Buffered changes are also written before every remote task wait of the plugin"""
+        if self.config_object is None:
+            self.get_main_config()
+        if self.config_object is not None:
+            self.config_object.write_behind = True
+            self.config_object.reset_write_counters()
+
+    def flush_config(self):
+        """Write the buffered config changes with a single update and stop buffering"""
+        if self.config_object is not None:
+            self.config_object.write_behind = False
+            self.config_object.flush()
+
+    @contextmanager
+    def config_batch(self):
+        """Context manager that buffers config changes and writes them once on exit, also when an error occurs
+
+        Example::
+
+            with instance.config_batch():
+                instance.set_config("k1", v1)
+                instance.set_config("k2", v2)
+        """
+        if self.config_object is not None and self.config_object.write_behind is True:
+            # already inside a batch, the outer one flushes
+            yield self
+            return
+
+        self.begin_config_batch()
+        try:
+            yield self
+        finally:
+            self.flush_config()
+
     #
     # params
     #
@@ -391,21 +428,46 @@ class ApiServiceInstance(ServiceApiObject):
         self.logger.debug("Change service definition %s to %s" % (self.uuid, definition))
         return service_def_config
 
+    def __instance_from_model(self, entity):
+        return ApiServiceInstance(
+            self.controller,
+            oid=entity.id,
+            objid=entity.objid,
+            name=entity.name,
+            desc=entity.desc,
+            active=entity.active,
+            model=entity,
+        )
+
+    def get_ancestors(self, max_depth=__SRV_HIERARCHY_MAX_DEPTH__):
+        """Get the ancestor chain of the service instance with a single query
+
+        :param max_depth: max number of levels to walk
+        :return: list of ServiceInstance from the parent to the root
+        """
+        rows = self.manager.get_service_instance_ancestors(self.oid, max_depth=max_depth)
+        return [self.__instance_from_model(row[0]) for row in rows]
+
+    def get_subtree(self, max_depth=__SRV_HIERARCHY_MAX_DEPTH__):
+        """Get the subtree of the service instance with a single query
+
+        :param max_depth: max number of levels to walk
+        :return: dict with parent instance id as key and list of (ServiceInstance, plugin type name) as value
+        """
+        subtree = {}
+        for entity, plugintype, depth, parent_id in self.manager.get_service_instance_subtree(
+            self.oid, max_depth=max_depth
+        ):
+            subtree.setdefault(parent_id, []).append((self.__instance_from_model(entity), plugintype))
+        return subtree
+
     def get_child_instances(self, plugintype=None):
         """Get instance children of a specific plugintype"""
-        instances = []
-        childs = self.manager.get_service_instance_children(start_service_id=self.oid, plugintype=plugintype)
-        for child in childs:
-            instance = ApiServiceInstance(
-                self.controller,
-                oid=child.id,
-                objid=child.objid,
-                name=child.name,
-                desc=child.desc,
-                active=child.active,
-                model=child,
-            )
-            instances.append(instance)
+        instances = [
+            child
+            for child, child_plugintype in self.get_subtree(max_depth=1).get(self.oid, [])
+            if plugintype is None or child_plugintype == plugintype
+        ]
         self.logger.debug("Get instance %s childs: %s" % (self.uuid, truncate(instances)))
         return instances
 
@@ -448,22 +510,14 @@ class ApiServiceInstance(ServiceApiObject):
         entity = self.manager.get_service_instance_parent(self.oid)
         res = None
         if entity is not None:
-            res = ApiServiceInstance(
-                self.controller,
-                oid=entity.id,
-                objid=entity.objid,
-                name=entity.name,
-                active=entity.active,
-                desc=entity.desc,
-                model=entity,
-            )
+            res = self.__instance_from_model(entity)
         return res
 
     def getRoot(self):
-        parent = self.getParent()
-        if parent is not None:
+        ancestors = self.get_ancestors()
+        if len(ancestors) > 0:
             # this isn't root instance.
-            return parent.getRoot()
+            return ancestors[-1]
         else:
             # I'm root
             return self
@@ -618,30 +672,31 @@ class ApiServiceInstance(ServiceApiObject):
             self.manager.get_service_instance_children(start_service_id=self.oid, plugintype=plugintype),
         )
 
-    def getInstanceChildrenHierarchy(self, plugintype=None, tree=[]):
+    def getInstanceChildrenHierarchy(self, plugintype=None, tree=None):
         """Get instance children of a specific plugintype"""
+        if tree is None:
+            tree = []
 
         # TBD: list of status to check
         status_list = [SrvStatusType.ACTIVE]
 
-        children = ServiceUtil.instanceApi(
-            self.controller,
-            ApiServiceInstance,
-            self.manager.get_service_instance_children(start_service_id=self.oid, plugintype=plugintype),
-        )
-        for child in children:
-            # TBD: check if user can view child
-            if child.is_active() is True:
-                if child.status in status_list:
+        subtree = self.get_subtree()
+
+        def walk(parent_id, plugintype=None):
+            for child, child_plugintype in subtree.get(parent_id, []):
+                if plugintype is not None and child_plugintype != plugintype:
+                    continue
+                # TBD: check if user can view child
+                if child.is_active() is True and child.status in status_list:
                     details = child.detail()
                     details.pop("is_container")
                     details.pop("bpmn_process_id")
                     details.pop("resource_uuid")
                     details.pop("service_definition_id")
                     tree.append(details)
-                    self.logger.warning(" $$$ %s" % child.getPluginTypeName())
-                    child.getInstanceChildrenHierarchy(tree=tree)
+                    walk(child.oid)
 
+        walk(self.oid, plugintype=plugintype)
         return tree
 
     def getInstanceByResourceUUID(self, resource_uuid):
@@ -864,6 +919,11 @@ class ApiServiceInstanceConfig(ServiceApiObject):
             elif isinstance(self.model.json_cfg, (str, bytes)):
                 self.json_cfg.update(json.loads(self.model.json_cfg))
 
+        # write behind: when enabled json_cfg changes are only marked dirty and written by flush()
+        self.write_behind = False
+        self.dirty = False
+        self.reset_write_counters()
+
         # child classes
         self.child_classes = []
 
@@ -897,6 +957,30 @@ class ApiServiceInstanceConfig(ServiceApiObject):
         info = self.info()
         return info
 
+    def reset_write_counters(self):
+        """Reset the counters of the json_cfg saves deferred by write behind and of the json_cfg database writes"""
+        self.deferred_saves = 0
+        self.writes = 0
+
+    def save_json_cfg(self):
+        """Write json_cfg, or only mark it dirty when write behind is enabled"""
+        if self.write_behind is True:
+            self.dirty = True
+            self.deferred_saves += 1
+        else:
+            self.update(json_cfg=self.json_cfg)
+            self.writes += 1
+
+    def flush(self):
+        """Write json_cfg if it was changed while write behind was enabled. Write behind stays enabled"""
+        if self.dirty is True:
+            self.update(json_cfg=self.json_cfg)
+            self.dirty = False
+            self.writes += 1
+            self.logger.debug(
+                "Flush config %s: %s deferred saves, %s writes" % (self.oid, self.deferred_saves, self.writes)
+            )
+
     def get_json_property(self, attr_key):
         """Get property from config
 
@@ -917,7 +1001,7 @@ class ApiServiceInstanceConfig(ServiceApiObject):
         """
         if self.json_cfg:
             dict_unset(self.json_cfg, attr_key)
-            self.update(json_cfg=self.json_cfg)
+            self.save_json_cfg()
 
     def set_json_properties(self, data: dict):
         """Set property in config
@@ -927,7 +1011,7 @@ class ApiServiceInstanceConfig(ServiceApiObject):
         """
         if self.json_cfg is not None:
             self.json_cfg = recursive_update(self.json_cfg, data)
-            self.update(json_cfg=self.json_cfg)
+            self.save_json_cfg()
 
     def set_json_property(self, attr_key, attr_value):
         """Set property in config
@@ -939,7 +1023,7 @@ class ApiServiceInstanceConfig(ServiceApiObject):
         if self.json_cfg is not None:
             dict_set(self.json_cfg, attr_key, attr_value)
             # self.json_cfg[attr_key] = attr_value
-            self.update(json_cfg=self.json_cfg)
+            self.save_json_cfg()
 
     def getJsonProperty(self, attrKey):
         """Get property from config [DEPRECATED]
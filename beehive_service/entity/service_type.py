@@ -3,7 +3,7 @@
 # (C) Copyright 2018-2026 CSI-Piemonte
 from __future__ import annotations
 from time import sleep
-from typing import List, TYPE_CHECKING, Dict, Optional
+from typing import List, TYPE_CHECKING, Dict, Optional, Callable
 from urllib.parse import urlencode
 from beecell.remote import NotFoundException
 from beecell.simple import str2bool, truncate, dict_get, format_date
@@ -13,12 +13,19 @@ from beehive.common.data import trace, operation
 from beehive.common.task_v2 import BaseTask, prepare_or_run_task
 from beehive_service.entity import ServiceApiObject
 from beehive_service.entity.service_definition import ApiServiceDefinition
+from beehive_service.entity.task_status_waiter import task_status_waiter
 from beehive_service.entity.service_instance import (
     ApiServiceInstance,
 )
 from beehive_service.model import SrvStatusType, ServiceInstance
-from beehive_service.service_util import __SRV_MODULE_BASE_PREFIX__
+from beehive_service.service_util import (
+    __SRV_MODULE_BASE_PREFIX__,
+    __SRV_RESOURCE_FETCH_BLOCK_SIZE__,
+    __SRV_RESOURCE_FETCH_POOL_SIZE__,
+    __SRV_RESOURCE_FETCH_RETRY__,
+)
 if TYPE_CHECKING:
+    from beehive_service.controller import ServiceController
     from beehive_service.model import ServiceType as ModelServiceType
     from beehive_service.controller import ApiAccount    
     from beehive_service.entity.service_instance import ApiServiceInstanceConfig
@@ -251,6 +258,73 @@ class ApiServiceTypePlugin(ApiServiceType):
         """
         return entities
 
+    @staticmethod
+    def fetch_resources(
+        controller: ServiceController,
+        fetch: Callable[[list], List[dict]],
+        items: list,
+        block_size: int = __SRV_RESOURCE_FETCH_BLOCK_SIZE__,
+        pool_size: int = __SRV_RESOURCE_FETCH_POOL_SIZE__,
+        retry: int = __SRV_RESOURCE_FETCH_RETRY__,
+        raise_error: bool = True,
+        index_key: str = "uuid",
+    ) -> Dict[str, dict]:
+        """Fetch resources for a list of items, usually resource uuids, used by the customize_list hooks. Items are
+        split in blocks and the blocks are fetched concurrently on a gevent pool. A failed block is retried.
+
+        :param controller: controller instance
+        :param fetch: function that receives a block of items and returns the list of resources
+        :param items: list of items
+        :param block_size: max number of items in a block [default=__SRV_RESOURCE_FETCH_BLOCK_SIZE__]
+        :param pool_size: max number of blocks fetched concurrently [default=__SRV_RESOURCE_FETCH_POOL_SIZE__]
+        :param retry: number of retries of a failed block [default=__SRV_RESOURCE_FETCH_RETRY__]
+        :param raise_error: if True raise the error of a block that fails all the retries, otherwise log it and
+            skip the block [default=True]
+        :param index_key: resource key used to index the result [default=uuid]
+        :return: resources indexed by index_key
+        :raise Exception: the error raised by fetch for a block that fails all the retries
+        """
+        import gevent
+        from gevent.pool import Pool
+        from uuid import uuid4
+        from beehive.common.data import get_operation_params, set_operation_params
+
+        def fetch_block(block: list) -> List[dict]:
+            for attempt in range(retry + 1):
+                try:
+                    return fetch(block)
+                except Exception as ex:
+                    if attempt < retry:
+                        controller.logger.warning("Fetch resources block failed, retry %s: %s" % (attempt + 1, ex))
+                        gevent.sleep(0.5 * (attempt + 1))
+                    elif raise_error is True:
+                        raise
+                    else:
+                        controller.logger.error("Fetch resources block failed: %s" % ex, exc_info=True)
+            return []
+
+        def fetch_block_greenlet(block: list) -> List[dict]:
+            operation.id = str(uuid4())
+            set_operation_params(operation_params)
+            return fetch_block(block)
+
+        blocks = [items[i : i + block_size] for i in range(0, len(items), block_size)]
+        resources = []
+        if len(blocks) == 1:
+            resources = fetch_block(blocks[0])
+        elif len(blocks) > 1:
+            operation_params = get_operation_params()
+            pool = Pool(min(pool_size, len(blocks)))
+            jobs = [pool.spawn(fetch_block_greenlet, block) for block in blocks]
+            gevent.joinall(jobs)
+            for job in jobs:
+                # raise the error of the block as it is, like a single block fetch does
+                if job.exception is not None:
+                    raise job.exception
+                resources.extend(job.value)
+
+        return {r[index_key]: r for r in resources}
+
     def info(self):
         """Get object info
 
@@ -1223,32 +1297,52 @@ class ApiServiceTypePlugin(ApiServiceType):
             return None
 
     # FF: ex maxtime=1200
-    def wait_for_task(self, taskid, delta=2, maxtime=3600, task=None, module="resource"):
+    def wait_for_task(self, taskid, delta=2, maxtime=3600, task=None, module="resource", shared=True):
         """Wait for task
         Warning!
         This method must be run only by an asyncronus worker!
 
         :param taskid: task id
-        :param delta: sample time
+        :param delta: sample time. With shared waiter it is the first interval of the exponential backoff
         :param maxtime: max time to wait
         :param task: task instance
         :param module: module where task is executed. [default=resource]
+        :param shared: if True status queries are done by the worker process shared task status waiter,
+            otherwise this method polls the task status every delta seconds [default=True]
         :return:
         """
 
+        def progress(state):
+            if task is not None:
+                baseTask: BaseTask = task
+                baseTask.progress(msg="Get %s task %s status: %s" % (module, taskid, state))
+
+        # write the config changes buffered by a config batch before the wait, so that they are visible to the api
+        # and to the other tasks, and are not lost if the worker stops while waiting
+        if self.instance is not None and self.instance.config_object is not None:
+            self.instance.config_object.flush()
+
         try:
             self.logger.info("Wait for task: %s" % taskid)
-            state, statemsg = self.__get_task_status(taskid, module)
-            elapsed = 0
-            while state not in ["SUCCESS", "FAILURE", "TIMEOUT"]:
-                sleep(delta)
+            if shared is True:
+                state, statemsg = task_status_waiter.wait(
+                    taskid,
+                    module,
+                    lambda: self.__get_task_status(taskid, module),
+                    delta=delta,
+                    maxtime=maxtime,
+                    progress=progress,
+                )
+            else:
                 state, statemsg = self.__get_task_status(taskid, module)
-                if task is not None:
-                    baseTask: BaseTask = task
-                    baseTask.progress(msg="Get %s task %s status: %s" % (module, taskid, state))
-                elapsed += delta
-                if elapsed > maxtime:
-                    state = "TIMEOUT"
+                elapsed = 0
+                while state not in ["SUCCESS", "FAILURE", "TIMEOUT"]:
+                    sleep(delta)
+                    state, statemsg = self.__get_task_status(taskid, module)
+                    progress(state)
+                    elapsed += delta
+                    if elapsed > maxtime:
+                        state = "TIMEOUT"
 
             if state == "TIMEOUT":
                 msg = "%s task %s timeout" % (module, taskid)
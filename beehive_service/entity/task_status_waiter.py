@@ -0,0 +1,193 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+import logging
+from time import time
+from typing import Callable, Dict, Optional, Tuple
+from uuid import uuid4
+import gevent
+from gevent.event import Event
+from gevent.pool import Pool
+from beehive.common.data import operation, get_operation_params, set_operation_params
+from beehive_service.service_util import (
+    __SRV_TASK_WAIT_MAX_DELTA__,
+    __SRV_TASK_WAIT_BACKOFF__,
+    __SRV_TASK_WAIT_POOL_SIZE__,
+    __SRV_TASK_WAIT_POLL_TIMEOUT__,
+)
+
+TASK_FINAL_STATES = ["SUCCESS", "FAILURE"]
+
+
+class TaskWait(object):
+    """Status of a remote task shared by all the greenlets waiting for it
+
+    :param taskid: task id
+    :param module: module where task is executed
+    :param get_status: callable returning (state, msg) of the task
+    :param delta: interval between the first and the second status query. The first query is done at once
+    """
+
+    def __init__(self, taskid: str, module: str, get_status: Callable[[], Tuple[str, str]], delta: float):
+        self.taskid = taskid
+        self.module = module
+        self.get_status = get_status
+        self.operation_params = get_operation_params()
+        self.delta = delta
+        self.next_poll = time()
+        self.state: Optional[str] = None
+        self.msg = ""
+        self.waiters = 0
+        self.polling = False
+        self.done = Event()
+
+    def finish(self, state: str, msg: str = ""):
+        self.state = state
+        self.msg = msg
+        self.done.set()
+
+
+class TaskStatusWaiter(object):
+    """Wait for remote tasks using one poller greenlet per worker process.
+    The poller queries in a single cycle the status of every task being waited on, applying to each task an
+    exponential backoff, and wakes the waiting greenlets through events. Tasks can also be completed by
+    notify, for example by a task completion event consumer, without waiting for the next status query.
+
+    :param max_delta: max seconds between two status queries of the same task
+    :param backoff: growth factor of the interval between two status queries
+    :param pool_size: max number of concurrent status queries
+    :param poll_timeout: max seconds of a single status query. A query that does not complete is abandoned and
+        the task is queried again in a next cycle
+    """
+
+    def __init__(
+        self,
+        max_delta: float = __SRV_TASK_WAIT_MAX_DELTA__,
+        backoff: float = __SRV_TASK_WAIT_BACKOFF__,
+        pool_size: int = __SRV_TASK_WAIT_POOL_SIZE__,
+        poll_timeout: float = __SRV_TASK_WAIT_POLL_TIMEOUT__,
+    ):
+        self.max_delta = max_delta
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.poll_timeout = poll_timeout
+        self.logger = logging.getLogger(self.__class__.__module__ + "." + self.__class__.__name__)
+        self._waits: Dict[Tuple[str, str], TaskWait] = {}
+        self._wakeup = Event()
+        self._poller: Optional[gevent.Greenlet] = None
+
+    def wait(
+        self,
+        taskid: str,
+        module: str,
+        get_status: Callable[[], Tuple[str, str]],
+        delta: float = 2,
+        maxtime: float = 3600,
+        progress: Callable[[str], None] = None,
+    ) -> Tuple[str, str]:
+        """Wait until task reach a final state or maxtime expires
+
+        :param taskid: task id
+        :param module: module where task is executed
+        :param get_status: callable returning (state, msg) of the task
+        :param delta: interval between the first and the second status query
+        :param maxtime: max time to wait
+        :param progress: callable invoked with the new state every time the task state changes [optional]
+        :return: (state, msg). state is SUCCESS, FAILURE or TIMEOUT
+        """
+        key = (module, taskid)
+        item = self._waits.get(key, None)
+        if item is None:
+            item = TaskWait(taskid, module, get_status, delta)
+            self._waits[key] = item
+            self._wakeup.set()
+        item.waiters += 1
+        self._start()
+
+        deadline = time() + maxtime
+        last_state = None
+        try:
+            while not item.done.is_set():
+                remaining = deadline - time()
+                if remaining <= 0:
+                    return "TIMEOUT", ""
+                item.done.wait(timeout=min(remaining, self.max_delta))
+                if progress is not None and item.state != last_state and item.state is not None:
+                    progress(item.state)
+                last_state = item.state
+            return item.state, item.msg
+        finally:
+            item.waiters -= 1
+            if item.waiters <= 0 and self._waits.get(key, None) is item:
+                self._waits.pop(key, None)
+
+    def notify(self, taskid: str, state: str, msg: str = "", module: str = "resource") -> bool:
+        """Complete the wait of a task without waiting for the next status query
+
+        :param taskid: task id
+        :param state: task state
+        :param msg: task error message
+        :param module: module where task is executed
+        :return: True if some greenlet was waiting for the task
+        """
+        item = self._waits.get((module, taskid), None)
+        if item is None:
+            return False
+        if state in TASK_FINAL_STATES:
+            self._waits.pop((module, taskid), None)
+            item.finish(state, msg)
+        else:
+            item.state = state
+        return True
+
+    def _start(self):
+        if self._poller is None or self._poller.dead:
+            self._poller = gevent.spawn(self._run)
+
+    def _poll(self, item: TaskWait):
+        operation.id = str(uuid4())
+        set_operation_params(item.operation_params)
+        item.polling = True
+        try:
+            # a hung status query must not stall the polling of the other tasks
+            with gevent.Timeout(self.poll_timeout):
+                state, msg = item.get_status()
+            if state in TASK_FINAL_STATES:
+                self._waits.pop((item.module, item.taskid), None)
+                item.finish(state, msg)
+                return
+            item.state = state
+        except gevent.Timeout:
+            self.logger.warning(
+                "Get %s task %s status timeout after %ss" % (item.module, item.taskid, self.poll_timeout)
+            )
+        except Exception as ex:
+            self.logger.error("Get %s task %s status error: %s" % (item.module, item.taskid, ex))
+        finally:
+            item.polling = False
+        item.next_poll = time() + min(item.delta, self.max_delta)
+        item.delta = min(item.delta * self.backoff, self.max_delta)
+
+    def _run(self):
+        pool = Pool(self.pool_size)
+        while len(self._waits) > 0:
+            now = time()
+            due = [item for item in list(self._waits.values()) if item.next_poll <= now and not item.polling]
+            if len(due) > 0:
+                self.logger.debug("Query status of %s tasks on %s waited" % (len(due), len(self._waits)))
+                jobs = [pool.spawn(self._poll, item) for item in due]
+                # polls are bounded by poll_timeout, the join timeout only guards against a poll that ignores it.
+                # Tasks whose poll is not finished are skipped until it ends and queried again in a next cycle
+                gevent.joinall(jobs, timeout=self.poll_timeout + 1)
+
+            if len(self._waits) == 0:
+                break
+            next_polls = [item.next_poll for item in self._waits.values() if not item.polling]
+            next_poll = min(next_polls) if len(next_polls) > 0 else time() + self.max_delta
+            self._wakeup.clear()
+            self._wakeup.wait(timeout=max(0, next_poll - time()))
+
+
+# one waiter per worker process
+task_status_waiter = TaskStatusWaiter()
@@ -3,9 +3,12 @@
 # (C) Copyright 2018-2026 CSI-Piemonte
 
 import logging
-from typing import TYPE_CHECKING
+from time import time
+from typing import TYPE_CHECKING, Dict, List, Tuple
 from datetime import datetime
 from copy import deepcopy
+import gevent
+from gevent.pool import Pool
 from beecell.simple import id_gen
 from beecell.logger.helper import LoggerHelper
 from signal import signal
@@ -16,7 +19,7 @@ from kombu.pools import producers
 from kombu import Connection, exceptions
 from beehive.module.event.model import EventDbManager
 from beehive.common.event import EventProducerRedis, Event
-from beehive.common.data import operation
+from beehive.common.data import operation, get_operation_params, set_operation_params
 from beecell.db import TransactionError
 from beehive.common.apimanager import ApiManager, ApiObject
 from beehive_service.controller import (
@@ -29,6 +32,11 @@ from beehive_service.entity.service_instance import (
     ApiServiceInstance,
     ApiServiceLinkInst,
 )
+from beehive_service.service_util import (
+    __SRV_EVENT_BATCH_SIZE__,
+    __SRV_EVENT_BATCH_WAIT__,
+    __SRV_EVENT_POOL_SIZE__,
+)
 if TYPE_CHECKING:
     from beehive_service.mod import ServiceModule
 
@@ -37,10 +45,41 @@ class ServiceConsumerError(Exception):
 
 
 class ServiceConsumerRedis(ConsumerMixin):
+    """Service event consumer. Messages are prefetched and buffered, then processed in batches: multiple
+    updateStatus events of the same service instance are coalesced and only the last one is applied. The batch
+    is split among a bounded pool of greenlets, each one using a single db session for all its messages.
+    Messages are acked only after the commit of their changes. Messages whose update fails are rejected without
+    requeue: a status event carries the whole instance status, so it is superseded by the next event of the same
+    instance, while requeueing an update that keeps failing (for example of a deleted instance) would redeliver it
+    forever. Failed updates are logged with their instance and counted in stats["failed"].
+
+    :param connection: kombu connection
+    :param api_manager: api manager
+    :param batch_size: max number of messages processed in a batch [default=__SRV_EVENT_BATCH_SIZE__]
+    :param batch_wait: max seconds a message waits in the buffer before its batch is processed
+        [default=__SRV_EVENT_BATCH_WAIT__]
+    :param pool_size: max number of greenlets processing a batch [default=__SRV_EVENT_POOL_SIZE__]
+    """
+
     api_module: 'ServiceModule'
 
-    def __init__(self, connection, api_manager: 'ApiManager'):
-        raise NotImplementedError("broken, do not use")
+    ops = [
+        ApiServiceType,
+        ApiServiceInstance,
+        ApiServiceDefinition,
+        ApiServiceLinkDef,
+        ApiServiceLinkInst,
+        ApiServiceConfig,
+    ]
+
+    def __init__(
+        self,
+        connection,
+        api_manager: 'ApiManager',
+        batch_size: int = __SRV_EVENT_BATCH_SIZE__,
+        batch_wait: float = __SRV_EVENT_BATCH_WAIT__,
+        pool_size: int = __SRV_EVENT_POOL_SIZE__,
+    ):
         self.logger = logging.getLogger(self.__class__.__module__ + "." + self.__class__.__name__)
 
         self.logger.info("ServiceConsumerRedis.__init__(...) ")
@@ -87,6 +126,33 @@ class ServiceConsumerRedis(ConsumerMixin):
         self.event_producer = EventProducerRedis(self.redis_uri, self.redis_exchange + ".sub", framework="kombu")
         self.conn = Connection(self.redis_uri)
 
+        self.init_batch(batch_size, batch_wait, pool_size)
+
+    def init_batch(self, batch_size: int, batch_wait: float, pool_size: int):
+        """Set the batch params and reset the message buffer and the counters
+
+        :param batch_size: max number of messages processed in a batch
+        :param batch_wait: max seconds a message waits in the buffer before its batch is processed
+        :param pool_size: max number of greenlets processing a batch
+        """
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.pool_size = pool_size
+        self.buffer: List[Tuple[dict, object]] = []
+        self.buffer_time = None
+
+        # counters
+        self.stats = {
+            "received": 0,
+            "applied": 0,
+            "coalesced": 0,
+            "failed": 0,
+            "batches": 0,
+            "lag": 0.0,
+            "max_lag": 0.0,
+            "throughput": 0.0,
+        }
+
     def get_consumers(self, Consumer, channel):
         return [
             Consumer(
@@ -94,9 +160,23 @@ class ServiceConsumerRedis(ConsumerMixin):
                 accept=["pickle", "json"],
                 callbacks=[self.callback],
                 on_decode_error=self.decode_error,
+                prefetch_count=self.batch_size,
             )
         ]
 
+    def on_iteration(self):
+        """Called by ConsumerMixin before every drain of the connection. Process the buffered messages when the
+        batch is full or the oldest message waited more than batch_wait seconds"""
+        if len(self.buffer) == 0:
+            return
+        if len(self.buffer) >= self.batch_size or time() - self.buffer_time >= self.batch_wait:
+            self.process_batch()
+
+    def on_consume_end(self, connection, channel):
+        """Process the messages still buffered when the consumer stops"""
+        if len(self.buffer) > 0:
+            self.process_batch()
+
     def decode_error(self, message, exc):
         self.logger.error(exc)
 
@@ -134,54 +214,122 @@ class ServiceConsumerRedis(ConsumerMixin):
     # Callback
     #
     def callback(self, event, message):
-        try:
-            ops = [
-                ApiServiceType,
-                ApiServiceInstance,
-                ApiServiceDefinition,
-                ApiServiceLinkDef,
-                ApiServiceLinkInst,
-                ApiServiceConfig,
-            ]
-
-            self.set_operation(ops)
+        """Buffer a received message. Messages are processed and acked in batches by process_batch"""
+        if len(self.buffer) == 0:
+            self.buffer_time = time()
+        self.buffer.append((event, message))
+        self.stats["received"] += 1
+        self.log_event(event, message)
 
-            # get db session
-            operation.session = self.api_module.get_session()
+        if len(self.buffer) >= self.batch_size:
+            self.process_batch()
 
-            msg = message.decode()
-            data = msg.get("data")
+    def coalesce(self, batch: List[Tuple[dict, object]]) -> Tuple[Dict[str, dict], Dict[str, list], list]:
+        """Coalesce the updateStatus events of a batch by service instance. Only the last event of each instance
+        is applied, while all the messages are acked together.
 
+        :param batch: list of (event, message)
+        :return: last status data by instance uuid, messages by instance uuid, messages to ack without processing
+        """
+        updates = {}
+        messages = {}
+        others = []
+        for event, message in batch:
+            data = event.get("data", {}) if isinstance(event, dict) else {}
             action = data.get("action")
-            self.logger.debug("action=%s" % action)
-
-            if action == "updateStatus":
-                entity = data.get("entity")
-
-                if entity in ("ServiceInstance"):
-                    inst_uuid = data.get("instance_uuid")
-
-                    self.logger.debug("%s %s  instance_uuid=%s" % (action, entity, inst_uuid))
-                    plugin = ApiServiceType(self.controller).instancePlugin(inst_uuid)
-                    plugin.callback_update_status(inst_uuid, data)
-
-            self.logger.debug("Service consume message : %s" % msg)
-            self.logger.debug("XXXXX    Messaggio Consumato    XXXXX")
-            message.ack()
-
-        except Exception as ex:
-            self.logger.error("Error consuming message  %s  - ERROR" % (str(msg)), exc_info=1)
-            raise ex
-
+            inst_uuid = data.get("instance_uuid")
+            if action == "updateStatus" and data.get("entity") == "ServiceInstance" and inst_uuid is not None:
+                if inst_uuid in updates:
+                    self.stats["coalesced"] += 1
+                updates[inst_uuid] = data
+                messages.setdefault(inst_uuid, []).append(message)
+            else:
+                self.logger.debug("Skip event action %s" % action)
+                others.append(message)
+        return updates, messages, others
+
+    def update_status(self, inst_uuid: str, data: dict):
+        """Apply an updateStatus event to a service instance
+
+        :param inst_uuid: service instance uuid
+        :param data: event data
+        """
+        instance: ApiServiceInstance = self.controller.get_service_instance(inst_uuid)
+        plugin = instance.get_service_type_plugin()
+        callback = getattr(plugin, "callback_update_status", None)
+        if callback is not None:
+            callback(inst_uuid, data)
+        else:
+            plugin.update_status(data.get("status"), error=data.get("error", None))
+        self.logger.debug("updateStatus ServiceInstance instance_uuid=%s" % inst_uuid)
+
+    def process_updates(self, updates: List[Tuple[str, dict, list]], operation_params: dict):
+        """Apply a chunk of coalesced updates using a single db session, then ack their messages after the commit
+
+        :param updates: list of (instance uuid, event data, messages)
+        :param operation_params: operation params of the consumer greenlet
+        """
+        set_operation_params(operation_params)
+        operation.transaction = None
+        self.set_operation(self.ops)
+        operation.session = self.api_module.get_session()
+        try:
+            for inst_uuid, data, messages in updates:
+                try:
+                    self.update_status(inst_uuid, data)
+                    operation.session.commit()
+                except Exception:
+                    self.logger.error(
+                        "Error applying status %s to service instance %s, %s messages rejected without requeue"
+                        % (data.get("status"), inst_uuid, len(messages)),
+                        exc_info=1,
+                    )
+                    operation.session.rollback()
+                    self.stats["failed"] += len(messages)
+                    for message in messages:
+                        message.reject(requeue=False)
+                    continue
+
+                self.stats["applied"] += 1
+                for message in messages:
+                    message.ack()
         finally:
+            self.api_module.release_session()
+
+    def process_batch(self):
+        """Process the buffered messages"""
+        batch = self.buffer
+        self.buffer = []
+        self.buffer_time = None
+        start = time()
+
+        # consumer lag measured from the event creation time
+        lags = [start - e.get("creation") for e, m in batch if isinstance(e, dict) and e.get("creation") is not None]
+        if len(lags) > 0:
+            self.stats["lag"] = max(lags)
+            self.stats["max_lag"] = max(self.stats["max_lag"], self.stats["lag"])
+
+        updates, messages, others = self.coalesce(batch)
+        for message in others:
             message.ack()
-            if operation.session is not None:
-                self.api_module.release_session()
-                self.logger.debug("XXXXX    Rilascio della session    XXXXX")
 
-        self.log_event(event, message)
-        # self.store_event(event, message)
-        # self.publish_event_to_subscriber(event, message)
+        # split the updates among the greenlets of the pool. Every greenlet uses one session for its chunk
+        items = [(inst_uuid, data, messages[inst_uuid]) for inst_uuid, data in updates.items()]
+        if len(items) > 0:
+            chunks = [items[i :: self.pool_size] for i in range(min(self.pool_size, len(items)))]
+            operation_params = get_operation_params()
+            pool = Pool(self.pool_size)
+            jobs = [pool.spawn(self.process_updates, chunk, operation_params) for chunk in chunks]
+            gevent.joinall(jobs)
+
+        elapsed = time() - start
+        self.stats["batches"] += 1
+        if elapsed > 0:
+            self.stats["throughput"] = len(batch) / elapsed
+        self.logger.info(
+            "Process batch of %s messages, %s instance updates in %.3fs - stats: %s"
+            % (len(batch), len(items), elapsed, self.stats)
+        )
 
     def log_event(self, event, message):
         """Log received event
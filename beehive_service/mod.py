@@ -89,6 +89,12 @@ class ServiceModule(ApiModule):
     def get_controller(self):
         return self.controller
 
+    def register_api(self, **kwargs):
+        # the page cursors returned by the apis are signed with a secret of the api config, so the apis are not
+        # registered without it
+        self.controller.load_page_cursor_key()
+        ApiModule.register_api(self, **kwargs)
+
     def set_apis(self, apis):
         self.apis.extend(apis)
         # # self.api_plugins
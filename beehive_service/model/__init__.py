@@ -33,6 +33,8 @@ from beehive_service.model.permtag_entity import PermTagEntity
 from beehive_service.model.service_catalog import ServiceCatalog
 from beehive_service.model.service_definition import ServiceDefinition, ServiceConfig
 from beehive_service.model.service_instance import ServiceInstance  # ,tags_links
+from beehive_service.model.service_instant_consume_snapshot import ServiceInstantConsumeSnapshot
+from beehive_service.model.service_instant_metric_snapshot import ServiceInstantMetricSnapshot
 from beehive_service.model.service_job import ServiceJob
 from beehive_service.model.service_job_schedule import ServiceJobSchedule
 from beehive_service.model.service_link import ServiceLink
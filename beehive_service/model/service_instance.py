@@ -2,7 +2,7 @@
 #
 # (C) Copyright 2018-2026 CSI-Piemonte
 
-from sqlalchemy import Column, Integer, ForeignKey, JSON, Text, String, Table
+from sqlalchemy import Column, Index, Integer, ForeignKey, JSON, Text, String, Table
 from sqlalchemy.orm import relationship, backref
 
 from beecell.sqlalchemy.custom_sqltype import TextDictType
@@ -22,6 +22,7 @@ tag_instance = Table(
     Column("id", Integer, primary_key=True),
     Column("fk_service_tag_id", Integer(), ForeignKey("service_tag.id")),
     Column("fk_service_instance_id", Integer(), ForeignKey("service_instance.id")),
+    Index("idx_taginst_inst_tag", "fk_service_instance_id", "fk_service_tag_id"),
     mysql_engine="InnoDB",
 )
 
@@ -32,7 +33,12 @@ class ServiceInstance(ApiBusinessObject, Base):
     """
 
     __tablename__ = "service_instance"
-    __table_args__ = {"mysql_engine": "InnoDB"}
+    __table_args__ = (
+        Index("idx_srvinst_resource_uuid", "resource_uuid"),
+        Index("idx_srvinst_status", "status"),
+        Index("idx_srvinst_account_def", "fk_account_id", "fk_service_definition_id"),
+        {"mysql_engine": "InnoDB"},
+    )
 
     # the account to which the ServiceInstance belong
     account_id = Column("fk_account_id", Integer(), ForeignKey("account.id"), nullable=False)
@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+from sqlalchemy import Index, Column, Integer, Float, String, ForeignKey
+from beehive.common.model import AuditData
+from beehive_service.model.base import Base
+
+
+class ServiceInstantConsumeSnapshot(AuditData, Base):
+    """ServiceInstantConsumeSnapshot contains the last instant consume of an account for a plugin type and a metric
+    group. It is a materialized copy of v_service_instant_consume refreshed at the end of each metrics acquisition and
+    daily consumes.
+    """
+
+    __tablename__ = "service_instant_consume_snapshot"
+    __table_args__ = (
+        Index(
+            "udx_srvinstcons_snap_1",
+            "fk_account_id",
+            "plugin_name",
+            "metric_group_name",
+            unique=True,
+        ),
+        {"mysql_engine": "InnoDB"},
+    )
+
+    def __init__(
+        self,
+        plugin_name,
+        group_name,
+        instant_value,
+        unit,
+        value,
+        service_instance_id,
+        account_id,
+        job_id=None,
+        creation_date=None,
+    ):
+        AuditData.__init__(self, creation_date=creation_date)
+
+        self.plugin_name = plugin_name
+        self.metric_group_name = group_name
+        self.metric_instant_value = instant_value
+        self.metric_unit = unit
+        self.metric_value = value
+        self.service_instance_id = service_instance_id
+        self.account_id = account_id
+        self.job_id = job_id
+
+    id = Column(Integer, primary_key=True)
+    plugin_name = Column(String(100))
+    metric_group_name = Column(String(50))
+    metric_instant_value = Column(Float, nullable=False, default=0.00)
+    metric_unit = Column(String(40))
+    metric_value = Column(Float, nullable=False, default=0.00)
+    service_instance_id = Column("fk_service_instance_id", Integer(), nullable=True)
+    account_id = Column("fk_account_id", Integer(), ForeignKey("account.id"), nullable=False)
+    # job that refreshed the snapshot, null when rebuilt outside a metrics acquisition
+    job_id = Column("fk_job_id", Integer(), nullable=True)
+
+    def __repr__(self):
+        return (
+            "<Model:ServiceInstantConsumeSnapshot(id=%s, account_id=%s, plugin_name=%s, metric_group_name=%s, "
+            "metric_instant_value=%s, metric_value=%s)>"
+            % (
+                self.id,
+                self.account_id,
+                self.plugin_name,
+                self.metric_group_name,
+                self.metric_instant_value,
+                self.metric_value,
+            )
+        )
@@ -0,0 +1,85 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+from sqlalchemy import Index, Column, Integer, Float, String, DateTime, ForeignKey
+from beehive.common.model import AuditData
+from beehive_service.model.base import Base
+
+
+class ServiceInstantMetricSnapshot(AuditData, Base):
+    """ServiceInstantMetricSnapshot contains the metrics of the last job of a service instance for a metric type,
+    with the container of the service instance. It replaces the scan of service_metric done by each read of the
+    account instant consumes and it is refreshed at the end of each metrics acquisition and daily consumes.
+    """
+
+    __tablename__ = "service_instant_metric_snapshot"
+    __table_args__ = (
+        Index(
+            "udx_srvinstmetric_snap_1",
+            "fk_container_id",
+            "fk_service_instance_id",
+            "fk_metric_type_id",
+            unique=True,
+        ),
+        Index("idx_srvinstmetric_snap_account", "fk_account_id"),
+        {"mysql_engine": "InnoDB"},
+    )
+
+    def __init__(
+        self,
+        account_id,
+        container_id,
+        service_instance_id,
+        metric_type_id,
+        metric_type_name,
+        group_name,
+        plugin_name,
+        category,
+        value,
+        extraction_date,
+        job_id=None,
+        creation_date=None,
+    ):
+        AuditData.__init__(self, creation_date=creation_date)
+
+        self.account_id = account_id
+        self.container_id = container_id
+        self.service_instance_id = service_instance_id
+        self.metric_type_id = metric_type_id
+        self.metric_type_name = metric_type_name
+        self.group_name = group_name
+        self.plugin_name = plugin_name
+        self.category = category
+        self.value = value
+        self.extraction_date = extraction_date
+        self.job_id = job_id
+
+    id = Column(Integer, primary_key=True)
+    account_id = Column("fk_account_id", Integer(), ForeignKey("account.id"), nullable=False)
+    container_id = Column("fk_container_id", Integer(), nullable=False)
+    service_instance_id = Column("fk_service_instance_id", Integer(), nullable=False)
+    metric_type_id = Column("fk_metric_type_id", Integer(), nullable=False)
+    metric_type_name = Column(String(100))
+    group_name = Column(String(50))
+    # plugin type and category of the service instance
+    plugin_name = Column(String(100))
+    category = Column(String(100))
+    value = Column(Float, nullable=False, default=0.00)
+    extraction_date = Column(DateTime())
+    # job that acquired the metrics
+    job_id = Column("fk_job_id", Integer(), nullable=True)
+
+    def __repr__(self):
+        return (
+            "<Model:ServiceInstantMetricSnapshot(id=%s, account_id=%s, container_id=%s, service_instance_id=%s, "
+            "metric_type_name=%s, value=%s)>"
+            % (
+                self.id,
+                self.account_id,
+                self.container_id,
+                self.service_instance_id,
+                self.metric_type_name,
+                self.value,
+            )
+        )
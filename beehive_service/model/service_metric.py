@@ -2,7 +2,7 @@
 #
 # (C) Copyright 2018-2026 CSI-Piemonte
 
-from sqlalchemy import Column, Integer, Float, ForeignKey, String
+from sqlalchemy import Column, Index, Integer, Float, ForeignKey, String
 from sqlalchemy.orm import relationship
 
 from beehive.common.model import AuditData
@@ -13,7 +13,10 @@ class ServiceMetric(AuditData, Base):
     """ServiceMetric describe the service type functionality."""
 
     __tablename__ = "service_metric"
-    __table_args__ = {"mysql_engine": "InnoDB"}
+    __table_args__ = (
+        Index("idx_srvmetric_inst_job", "fk_service_instance_id", "fk_job_id"),
+        {"mysql_engine": "InnoDB"},
+    )
 
     id = Column(Integer, primary_key=True)
     value = Column(Float, nullable=False, default=0.00)
@@ -1460,18 +1460,21 @@ class ApiComputeInstance(AsyncApiServiceTypePlugin):
         """
         if len(zones) > 0:
             api_compute_inst = ApiComputeInstance(controller)
-            resources = []
             res_uuids_threshold = 20
-            for zone in zones:
-                resource_uuids = uuids = zones[zone]
+
+            def fetch_zone(block):
+                zone = block[0]
+                resource_uuids = zones[zone]
                 """
                 The under hood code use get if there are to much param list_resources fail;
                 then we prefer ask all!
                 """
                 if len(resource_uuids) > res_uuids_threshold:
                     resource_uuids = None
-                resources += api_compute_inst.list_resources(zones=[zone], uuids=resource_uuids)
-            resources_idx = {r["uuid"]: r for r in resources}
+                return api_compute_inst.list_resources(zones=[zone], uuids=resource_uuids)
+
+            # zones are fetched concurrently
+            resources_idx = ApiComputeInstance.fetch_resources(controller, fetch_zone, list(zones), block_size=1)
 
         # assign resources
         for entity in entities:
@@ -1553,17 +1556,13 @@ class ApiComputeInstance(AsyncApiServiceTypePlugin):
             sg_info = kvargs.get("sg_info", False)
             flavor_info = kvargs.get("flavor_info", False)
             api_compute_inst = ApiComputeInstance(controller)
-            resources = []
-
-            block_size = 80
-            blocks = [resource_uuids[i:i + block_size] for i in range(0, len(resource_uuids), block_size)]
-            # logger.debug2(f"fv - customize_simple_list - blocks: {blocks}")
-            for block in blocks:
-                logger.debug2(f"fv - customize_simple_list - block length: {len(block)}")
-                resources += api_compute_inst.list_simple_resources(
+            resources_idx = ApiComputeInstance.fetch_resources(
+                controller,
+                lambda block: api_compute_inst.list_simple_resources(
                     uuids=block, sg_info=sg_info, flavor_info=flavor_info
-                )
-            resources_idx = {r["uuid"]: r for r in resources}
+                ),
+                resource_uuids,
+            )
 
         # assign resources
         for entity in entities:
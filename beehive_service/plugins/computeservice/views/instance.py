@@ -765,11 +765,12 @@ class DescribeInstanceTypes(ServiceApiView):
     response_schema = DescribeInstanceTypesApiResponseSchema
 
     def get(self, controller, data, *args, **kwargs):
-        instance_types_set, total = controller.get_catalog_service_definitions(
+        instance_types_set, total, etag = controller.get_catalog_service_definitions(
             size=data.pop("MaxResults", 10),
             page=int(data.pop("NextToken", 0)),
             plugintype="ComputeInstance",
             def_uuids=data.pop("instance_type_N", []),
+            with_etag=True,
         )
 
         res = {
@@ -780,7 +781,7 @@ class DescribeInstanceTypes(ServiceApiView):
                 "instanceTypesTotal": total,
             }
         }
-        return res
+        return self.get_etag_response(res, etag)
 
 
 class EbsBlockDeviceMappingApiRequestSchema(Schema):
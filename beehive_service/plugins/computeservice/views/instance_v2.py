@@ -449,7 +449,15 @@ class NetworkInterfaceApiRequestSchema(Schema):
 
 class DescribeInstancesV20ApiRequestSchema(Schema):
     MaxResults = fields.Integer(required=False, dump_default=10, context="query", metadata={"description": ""})
-    NextToken = fields.String(required=False, dump_default="0", context="query", metadata={"description": ""})
+    NextToken = fields.String(
+        required=False,
+        dump_default="0",
+        context="query",
+        metadata={
+            "description": "token of the next page returned by the previous call, or legacy page number. "
+            "With a token the instance total is not counted"
+        },
+    )
     owner_id_N = fields.List(
         fields.String(example=""),
         required=False,
@@ -583,7 +591,10 @@ class DescribeInstancesV20(ServiceApiView):
     def get(self, controller: ServiceController, data: Dict, *args, **kwargs):
         data_search = {}
         data_search["size"] = data.get("MaxResults", 10)
-        data_search["page"] = int(data.get("NextToken", 0))
+        data_search.update(controller.get_page_search_params(data.get("NextToken", None)))
+        # following pages of a cursor do not count the total, so every page costs the same
+        if data_search.get("cursor_id", None) is not None:
+            data_search["nocount"] = True
 
         # check Account
         account_id_list = data.get("owner_id_N", [])
@@ -653,6 +664,7 @@ class DescribeInstancesV20(ServiceApiView):
         resource_uuid_list = None
 
         # get instances list
+        page_info = {}
         res, total = controller.get_service_type_plugins(
             service_uuid_list=instance_id_list,
             service_name_list=instance_name_list,
@@ -665,16 +677,18 @@ class DescribeInstancesV20(ServiceApiView):
             service_status_name_list=status_name_list,
             plugintype=ApiComputeInstance.plugintype,
             resource_uuid_list=resource_uuid_list,
+            page_info=page_info,
             **data_search,
         )
 
         # format result
         instances_set = [r.aws_info(version="v2.0") for r in res]
+        next_token = controller.get_next_page_token(page_info, data_search["size"])
 
         res = {
             "DescribeInstancesResponse": {
                 "__xmlns": self.xmlns,
-                "nextToken": str(data_search["page"] + 1),
+                "nextToken": next_token,
                 "requestId": operation.id,
                 "reservationSet": [
                     {
@@ -928,7 +942,10 @@ class DescribeSimpleInstancesV20(ServiceApiView):
         data_search["flavor_info"] = data.get("flavor_info", False)
 
         data_search["size"] = data.get("MaxResults", 10)
-        data_search["page"] = int(data.get("NextToken", 0))
+        data_search.update(controller.get_page_search_params(data.get("NextToken", None)))
+        # following pages of a cursor do not count the total, so every page costs the same
+        if data_search.get("cursor_id", None) is not None:
+            data_search["nocount"] = True
 
         # check Account
         account_id_list = data.get("owner_id_N", [])
@@ -998,6 +1015,7 @@ class DescribeSimpleInstancesV20(ServiceApiView):
         resource_uuid_list = None
 
         # get instances list
+        page_info = {}
         res, total = controller.get_service_type_plugins(
             service_uuid_list=instance_id_list,
             service_name_list=instance_name_list,
@@ -1010,17 +1028,19 @@ class DescribeSimpleInstancesV20(ServiceApiView):
             service_status_name_list=status_name_list,
             plugintype=ApiComputeInstance.plugintype,
             resource_uuid_list=resource_uuid_list,
+            page_info=page_info,
             **data_search,
         )
         
 
         # format result
         instances_set = [r.aws_simple_info() for r in res]
+        next_token = controller.get_next_page_token(page_info, data_search["size"])
 
         res = {
             "DescribeInstancesResponse": {
                 "__xmlns": self.xmlns,
-                "nextToken": str(data_search["page"] + 1),
+                "nextToken": next_token,
                 "requestId": operation.id,
                 "reservationSet": [
                     {
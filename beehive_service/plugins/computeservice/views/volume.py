@@ -790,11 +790,12 @@ class DescribeVolumeTypes(ServiceApiView):
     response_schema = DescribeVolumeTypesApiResponseSchema
 
     def get(self, controller: ServiceController, data: dict, *args, **kwargs):
-        volume_types_set, total = controller.get_catalog_service_definitions(
+        volume_types_set, total, etag = controller.get_catalog_service_definitions(
             size=data.pop("MaxResults", 10),
             page=int(data.pop("NextToken", 0)),
             plugintype="ComputeVolume",
             def_uuids=data.pop("volume_type_N", []),
+            with_etag=True,
         )
 
         res = {
@@ -805,7 +806,7 @@ class DescribeVolumeTypes(ServiceApiView):
                 "volumeTypesTotal": total,
             }
         }
-        return res
+        return self.get_etag_response(res, etag)
 
 
 class ComputeVolumeAPI(ApiView):
@@ -190,17 +190,13 @@ class ApiDatabaseServiceInstanceV2(AsyncApiServiceTypePlugin):
             # sg_info = kvargs.get("sg_info", False)
             # flavor_info = kvargs.get("flavor_info", False)
             api_db_serv_inst = ApiDatabaseServiceInstanceV2(controller)
-            resources = []
-
-            block_size = 80
-            blocks = [resource_uuids[i:i + block_size] for i in range(0, len(resource_uuids), block_size)]
-            # logger.debug2(f"fv - customize_simple_list - blocks: {blocks}")
-            for block in blocks:
-                logger.debug2(f"fv - customize_simple_list - block length: {len(block)}")
-                resources += api_db_serv_inst.list_simple_resources(
+            resources_idx = ApiDatabaseServiceInstanceV2.fetch_resources(
+                controller,
+                lambda block: api_db_serv_inst.list_simple_resources(
                     uuids=block, # sg_info=sg_info, flavor_info=flavor_info
-                )
-            resources_idx = {r["uuid"]: r for r in resources}
+                ),
+                resource_uuids,
+            )
 
         # assign resources
         for entity in entities:
@@ -1124,11 +1124,12 @@ class DescribeDBInstanceTypes(ServiceApiView):
     response_schema = DescribeDBInstanceTypesApiResponseSchema
 
     def get(self, controller: ServiceController, data, *args, **kwargs):
-        instance_types_set, total = controller.get_catalog_service_definitions(
+        instance_types_set, total, etag = controller.get_catalog_service_definitions(
             size=data.pop("MaxResults", 10),
             page=int(data.pop("NextToken", 0)),
             plugintype="DatabaseInstance",
             def_uuids=data.pop("instance_type_N", []),
+            with_etag=True,
         )
 
         res = {
@@ -1139,7 +1140,7 @@ class DescribeDBInstanceTypes(ServiceApiView):
                 "instanceTypesTotal": total,
             }
         }
-        return res
+        return self.get_etag_response(res, etag)
 
 
 # deprecates use v2 instead
@@ -1237,7 +1238,9 @@ class DescribeDBInstanceEngineTypes(ServiceApiView):
 
     def get(self, controller: ServiceController, data, *args, **kwargs):
         # raise ApiManagerError("Deprecation Error please use non deprecated v2 ",410)
-        instance_engines_set, total = controller.get_catalog_service_definitions(plugintype="VirtualService", size=-1)
+        instance_engines_set, total, etag = controller.get_catalog_service_definitions(
+            plugintype="VirtualService", size=-1, with_etag=True
+        )
         self.logger.warn(instance_engines_set)
 
         engine_types_set, total = [], 0
@@ -1262,7 +1265,8 @@ class DescribeDBInstanceEngineTypes(ServiceApiView):
         }
 
         self.logger.warning("res=%s" % res)
-        return res
+        # engine types are derived from the engine definitions so they share the entity tag
+        return self.get_etag_response(res, etag)
 
 
 class DatabaseInstanceAPI(ApiView):
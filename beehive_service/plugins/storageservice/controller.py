@@ -5,7 +5,7 @@
 from copy import deepcopy
 from typing import List, Dict, TYPE_CHECKING, Set, Any
 from beecell.simple import format_date, obscure_data, dict_get
-from beecell.types.type_id import test_oid
+from beecell.types.type_id import test_oid, is_uuid
 from beehive.common.apimanager import ApiManagerWarning, ApiManagerError
 from urllib.parse import urlencode
 from beehive_service.entity.service_type import (
@@ -643,15 +643,35 @@ class ApiStorageEFS(AsyncApiServiceTypePlugin):
         if not entities:
             return entities
 
-        account_idx = controller.get_account_idx()
-        subnet_idx = controller.get_service_instance_idx(ApiComputeSubnet.plugintype)
+        # read only the accounts and the legacy subnets referenced by the entities of the page
+        account_ids = list({e.instance.account_id for e in entities})
+        account_idx = controller.get_account_idx(id_list=account_ids)
+        subnet_refs = {"service_id_list": set(), "service_uuid_list": set(), "service_name_list": set()}
+        for entity in entities:
+            subnet_ref = entity.subnet_id
+            if subnet_ref is None:
+                continue
+            subnet_ref = str(subnet_ref)
+            if subnet_ref.isdigit():
+                subnet_refs["service_id_list"].add(int(subnet_ref))
+            elif is_uuid(subnet_ref):
+                subnet_refs["service_uuid_list"].add(subnet_ref)
+            else:
+                subnet_refs["service_name_list"].add(subnet_ref)
+        subnet_idx = {}
+        for ref_filter, refs in subnet_refs.items():
+            if len(refs) > 0:
+                subnet_idx.update(
+                    controller.get_service_instance_idx(ApiComputeSubnet.plugintype, **{ref_filter: list(refs)})
+                )
         # vpc_idx = controller.get_service_instance_idx(ApiComputeVPC.plugintype)
         # security_group_idx = controller.get_service_instance_idx(ApiComputeSecurityGroup.plugintype)
-        account_ids = [e.instance.account_id for e in entities]
-        storage_service_idx = controller.get_service_instance_idx(
+        # only the compute zone of the storage services is read, so index the resource uuid
+        storage_zone_idx = controller.get_service_instance_idx(
             ApiStorageService.plugintype,
             account_id_list=account_ids,
-            index_key="account_id"
+            index_key="account_id",
+            value_key="resource_uuid",
         )
         #instance_type_idx = controller.get_service_definition_idx(ApiStorageEFS.plugintype) # TODO
 
@@ -661,9 +681,9 @@ class ApiStorageEFS(AsyncApiServiceTypePlugin):
         for entity in entities:
             account_id = str(entity.instance.account_id)
             entity.account = account_idx.get(account_id)
-            entity.legacy_share_subnet = subnet_idx.get(entity.subnet_id)
-            account_compute_service = storage_service_idx.get(account_id)
-            compute_zone_uuid = account_compute_service.resource_uuid
+            if entity.subnet_id is not None:
+                entity.legacy_share_subnet = subnet_idx.get(str(entity.subnet_id))
+            compute_zone_uuid = storage_zone_idx.get(account_id)
             entity_resource_uuid = entity.instance.resource_uuid
             version = entity.instance.version
             if not entity_resource_uuid:
@@ -684,11 +704,6 @@ class ApiStorageEFS(AsyncApiServiceTypePlugin):
             # if just one, assume we need details. call detail endpoint later
             return entities
 
-        from itertools import islice
-        def slice_list(iterable, size):
-            it = iter(iterable)
-            return iter(lambda: list(islice(it, size)), [])
-
         # simplification: either one account is passed as filter (e.g. -account), or uuid lists (-size ... -page...)
         # so if more than one account, thus more than one zone, just consider uuids
 
@@ -696,50 +711,29 @@ class ApiStorageEFS(AsyncApiServiceTypePlugin):
         pagination = 20
         resources_idx = {}
 
-        resources = []
-        if zones_legacy:
-            _zones = list(zones_legacy.keys())
-            _resources = [zone for subset in zones_legacy.values() for zone in subset] # flatten
+        for version, version_zones in (("1.0", zones_legacy), ("2.0", zones)):
+            if not version_zones:
+                continue
+            _zones = list(version_zones.keys())
+            _resources = [zone for subset in version_zones.values() for zone in subset] # flatten
             if len(_zones)>1:
                 # do not filter by zone, but use uuids and paginate if necessary
                 _zones = []
             else:
                 # filter by single zone and use uuids and paginate if necessary
                 pass
-            list_slices = slice_list(_resources,pagination)
-            for sublist in list_slices:
-                try:
-                    resources += ApiStorageEFS(controller).list_mount_target_resources(
-                        zones = _zones,
-                        uuids = sublist,
-                        version="1.0",
-                        size=len(sublist)
-                    )
-                except Exception as ex:
-                    controller.logger.error(ex)
 
-        if zones:
-            _zones = list(zones.keys())
-            _resources = [zone for subset in zones.values() for zone in subset] # flatten
-            if len(_zones)>1:
-                # do not filter by zone, but use uuids and paginate if necessary
-                _zones = []
-            else:
-                # filter by single zone and use uuids and paginate if necessary
-                pass
-            list_slices = slice_list(_resources,pagination)
-            for sublist in list_slices:
-                try:
-                    resources += ApiStorageEFS(controller).list_mount_target_resources(
-                        zones = _zones,
-                        uuids = sublist,
-                        version="2.0",
-                        size=len(sublist)
-                    )
-                except Exception as ex:
-                    controller.logger.error(ex)
+            def fetch(sublist, _zones=_zones, version=version):
+                return ApiStorageEFS(controller).list_mount_target_resources(
+                    zones = _zones,
+                    uuids = sublist,
+                    version=version,
+                    size=len(sublist)
+                )
 
-        resources_idx = {r["uuid"]: r for r in resources}
+            resources_idx.update(
+                ApiStorageEFS.fetch_resources(controller, fetch, _resources, block_size=pagination, raise_error=False)
+            )
 
         # assign resources
         for entity in entities:
@@ -2,6 +2,10 @@
 #
 # (C) Copyright 2018-2026 CSI-Piemonte
 
+from hashlib import sha1
+from threading import RLock
+from time import time
+import json
 from beehive.common.assert_util import AssertUtil
 from beehive_service.model.base import SrvStatusType
 
@@ -108,6 +112,27 @@ __SRV_METRICTYPE_BUNDLE__ = "BUNDLE"
 __SRV_METRICTYPE_OPT_BUNDLE__ = "OPT_BUNDLE"
 __SRV_METRICTYPE_PROF_SERVICE__ = "PROF_SERVICE"
 __SRV_METRICTYPE__ = ["CONSUME", "BUNDLE", "OPT_BUNDLE", "PROF_SERVICE"]
+__SRV_METRIC_ACQUIRE_POOL_SIZE__ = 10  # max number of containers acquired concurrently
+__SRV_METRIC_ACQUIRE_TIMEOUT__ = 300  # seconds to wait for a single container metrics
+__SRV_DAILY_CONSUMES_ENGINE__ = "procedure"  # daily consumes engine: procedure or python
+__SRV_DAILY_CONSUMES_BLOCK_SIZE__ = 100  # number of accounts processed together by the python daily consumes engine
+__SRV_INSTANT_CONSUME_SNAPSHOT_RETRY__ = 3  # max number of attempts of an instant consume snapshot refresh
+__SRV_INSTANT_CONSUME_SNAPSHOT_RETRY_DELAY__ = 5  # seconds between two attempts of an instant consume snapshot refresh
+__SRV_TASK_WAIT_MAX_DELTA__ = 30  # max seconds between two status queries of the same task
+__SRV_TASK_WAIT_BACKOFF__ = 2  # growth factor of the interval between two status queries
+__SRV_TASK_WAIT_POOL_SIZE__ = 20  # max number of concurrent status queries
+__SRV_TASK_WAIT_POLL_TIMEOUT__ = 30  # max seconds of a single task status query
+__SRV_EVENT_BATCH_SIZE__ = 50  # max number of event messages processed in a batch
+__SRV_EVENT_BATCH_WAIT__ = 1.0  # max seconds an event message waits before its batch is processed
+__SRV_EVENT_POOL_SIZE__ = 5  # max number of greenlets processing an event batch
+__SRV_RESOURCE_FETCH_BLOCK_SIZE__ = 80  # max number of resources requested in a single call by list hooks
+__SRV_RESOURCE_FETCH_POOL_SIZE__ = 10  # max number of resource blocks fetched concurrently by list hooks
+__SRV_RESOURCE_FETCH_RETRY__ = 1  # number of retries of a failed resource block
+__SRV_HIERARCHY_MAX_DEPTH__ = 20  # max number of levels walked by service instance hierarchy queries
+__SRV_AUTH_CACHE_TTL__ = 10  # seconds the user groups and roles read from the auth api are cached
+__SRV_AUTH_POOL_SIZE__ = 10  # max number of concurrent role requests to the auth api
+__SRV_CATALOG_CACHE_TTL__ = 60  # seconds the computed catalog listings are cached
+__SRV_PAGE_CURSOR_SECRET_PARAM__ = "page_cursor_secret"  # api config param with the page cursors signing secret
 __SRV_REPORT_MODE__ = ["SUMMARY", "COMPLETE"]
 __SRV_REPORT_SUMMARY_MODE__ = "SUMMARY"
 __SRV_REPORT_COMPLETE_MODE__ = "COMPLETE"
@@ -189,6 +214,120 @@ __SRV_PLUGIN_TYPE__ = [
 ]
 
 
+class TtlCache(object):
+    """Process wide cache whose items expire after ttl seconds. Access is serialized with a lock so it can be shared
+    among threads and greenlets.
+
+    :param ttl: seconds after which an item expires
+    :param max_size: number of items over which the expired items are purged
+    """
+
+    def __init__(self, ttl: float, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = RLock()
+        self._items = {}
+
+    def get(self, key):
+        """Get a not expired item
+
+        :param key: item key
+        :return: item value or None
+        """
+        with self._lock:
+            item = self._items.get(key, None)
+            if item is None:
+                return None
+            if item[0] < time():
+                self._items.pop(key, None)
+                return None
+            return item[1]
+
+    def set(self, key, value):
+        """Set an item
+
+        :param key: item key
+        :param value: item value
+        """
+        with self._lock:
+            if len(self._items) >= self.max_size:
+                now = time()
+                self._items = {k: v for k, v in self._items.items() if v[0] >= now}
+            self._items[key] = (time() + self.ttl, value)
+
+    def invalidate(self, key=None):
+        """Remove an item or all the items
+
+        :param key: item key. If None remove all the items [optional]
+        """
+        with self._lock:
+            if key is None:
+                self._items = {}
+            else:
+                self._items.pop(key, None)
+
+
+class VersionedTtlCache(TtlCache):
+    """TtlCache with a version that changes on each full invalidation. A value computed while the cache was
+    invalidated is not stored, so a listing read before a write can not be cached after it.
+
+    :param ttl: seconds after which an item expires
+    :param max_size: number of items over which the expired items are purged
+    """
+
+    def __init__(self, ttl: float, max_size: int = 10000):
+        TtlCache.__init__(self, ttl, max_size=max_size)
+        self.version = 0
+
+    def set(self, key, value, version: int = None):
+        """Set an item
+
+        :param key: item key
+        :param value: item value
+        :param version: cache version read before computing the value. If it is not the current version the item is
+            not set [optional]
+        """
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            TtlCache.set(self, key, value)
+
+    def invalidate(self, key=None):
+        """Remove an item or all the items. Removing all the items changes the cache version
+
+        :param key: item key. If None remove all the items [optional]
+        """
+        with self._lock:
+            if key is None:
+                self.version += 1
+            TtlCache.invalidate(self, key)
+
+    def invalidate_after(self, func):
+        """Wrap a function so that all the items are removed after it
+
+        :param func: function to wrap
+        :return: wrapped function
+        """
+
+        def wrapper(*args, **kvargs):
+            res = func(*args, **kvargs)
+            self.invalidate()
+            return res
+
+        return wrapper
+
+
+def compute_etag(data) -> str:
+    """Compute a weak entity tag of some response data. The tag depends only on the data so it is the same in all the
+    api processes
+
+    :param data: json serializable data
+    :return: entity tag like W/"<sha1>"
+    """
+    dump = json.dumps(data, sort_keys=True, default=str)
+    return 'W/"%s"' % sha1(dump.encode("utf-8")).hexdigest()
+
+
 class ServiceUtil(object):
     @staticmethod
     def instance_api(controller, api_class, model):
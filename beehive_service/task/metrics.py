@@ -24,7 +24,8 @@ from beehive_service.model import (
 )
 from beehive.common.apimanager import ApiManagerWarning, ApiManagerError
 #from sqlalchemy.sql.expression import false
-from beehive_service.service_util import ServiceUtil
+from beehive_service.service_util import ServiceUtil, __SRV_DAILY_CONSUMES_BLOCK_SIZE__
+from beehive_service.controller.daily_consumes import DailyConsumesEngine, get_daily_consumes_engine
 from .common import logger, MAX_CONCURRENT_TASKS_CELERY
 
 task_manager = get_task_manager()
@@ -337,8 +338,7 @@ def acquire_service_metrics(self, objid, params):
     )
 
     # make dict metric type {name: id}
-    metric_types = controller.manager.get_service_metric_types()
-    mtype = {mt.name: mt.id for mt in metric_types}
+    mtype = controller.get_service_metric_type_idx()
 
     params["mtype_dict"] = mtype
     self.set_shared_data(params)
@@ -669,7 +669,7 @@ def finalize_metrics_acquisition(self, options):
 @task_manager.task(bind=True, base=ServiceJobTask)
 @job_task(synchronous=False)
 def compute_daily_costs(self, options, period, current_job_id):
-    """Call stored procedure  dailyconsumes
+    """Call stored procedure  dailyconsumes, or the python engine selected by the engine param,
     in order to compute daily consume and costs
 
     :param tupla options: Task config params. (class_name, objid, job, job id, start time, time before new query, user)
@@ -695,7 +695,15 @@ def compute_daily_costs(self, options, period, current_job_id):
     #                               task_id=self.request.id, params=params)
     # controller.manager.add(job)
 
-    controller.manager.call_dailyconsumes(period, current_job_id)
+    try:
+        engine = get_daily_consumes_engine(params.get("engine", None))
+    except ValueError as ex:
+        raise ApiManagerError(str(ex))
+    if engine == "python":
+        block_size = params.get("block_size", None) or __SRV_DAILY_CONSUMES_BLOCK_SIZE__
+        DailyConsumesEngine(controller.manager, block_size=block_size).run(period, current_job_id)
+    else:
+        controller.manager.call_dailyconsumes(period, current_job_id)
 
     return None
 
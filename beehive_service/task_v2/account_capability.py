@@ -3,7 +3,7 @@
 # (C) Copyright 2018-2026 CSI-Piemonte
 
 import logging
-from time import sleep
+from gevent import sleep
 from beehive.common.apimanager import ApiObject, ApiManagerError
 from beehive_service.controller import (
     ApiAccount,
@@ -24,6 +24,7 @@ logger = logging.getLogger(__name__)
 class CAPABILITY_TASK_SETTINGS(object):
     RETRY_CONTDOWN = 60
     RETRY_MAX = 99
+    POOL_SIZE = 5
 
 
 class AccountCapabilityTask(ServiceTask):
@@ -356,6 +357,53 @@ class AccountCapabilityTask(ServiceTask):
             raise TaskError("service %s creation error: %s" % (service.get("name"), str(ex)))
         return True
 
+    def add_services_level(self, account: ApiAccount, service_list: List[dict], pool_size: int) -> Dict[str, str]:
+        """Add concurrently the services of a creation level. Services in the same level do not depend on each
+        other, so they are created on a bounded gevent pool. Each greenlet uses its own database session.
+
+        :param account: account
+        :param service_list: services of the level
+        :param pool_size: max number of services created concurrently
+        :return: error message indexed by the name of the failed services
+        """
+        import gevent
+        from gevent.pool import Pool
+        from beehive.common.data import operation, get_operation_params, set_operation_params
+
+        def add_one(service: dict):
+            set_operation_params(operation_params)
+            operation.transaction = None
+            self.get_session(reopen=True)
+            try:
+                self.add_service(account, service)
+                self.progress(msg="service %s - DONE" % service["name"])
+            finally:
+                self.release_session()
+
+        errors = {}
+        if len(service_list) == 1:
+            service = service_list[0]
+            self.progress(msg="Scheduling check for %s" % service["name"])
+            try:
+                self.add_service(account, service)
+            except Exception as ex:
+                errors[service["name"]] = str(ex)
+            return errors
+
+        operation_params = get_operation_params()
+        pool = Pool(pool_size)
+        jobs = []
+        for service in service_list:
+            self.progress(msg="Scheduling check for %s" % service["name"])
+            jobs.append((service, pool.spawn(add_one, service)))
+        gevent.joinall([job for _, job in jobs])
+
+        for service, job in jobs:
+            if job.exception is not None:
+                self.progress(msg="service %s - ERROR: %s" % (service["name"], job.exception))
+                errors[service["name"]] = str(job.exception)
+        return errors
+
     def add_definitions(self, account: ApiAccount, definitions: List[str]):
         for definition in definitions:
             try:
@@ -385,16 +433,19 @@ class AccountCapabilityTask(ServiceTask):
     def add_or_update_capability(self, params: dict, capability_id: str, *args, **kvargs):
         """Step add capability to account
         First of all add service definitions if any to account; this operation does not involve any resource.
-        Then services described by the capability are created.
+        Then services described by the capability are created level by level: the services of the same level are
+        created concurrently and the next level starts when all the services of the current level are created.
         All the operations are idempotent so that capabilities that partially overlaps can be added to the same
         account without errors.
         If the account already has the service or the service definition, nothing is created.
 
         :param str capability_id: capability
         :param dict params: step params
+        :param int params.pool_size: max number of services created concurrently [optional]
         :return: True, params
         """
         account_id = params.get("account")
+        pool_size = params.get("pool_size", None) or CAPABILITY_TASK_SETTINGS.POOL_SIZE
         self._current_capability = capability_id
         account: ApiAccount
         capability: ApiAccountCapability
@@ -413,12 +464,14 @@ class AccountCapabilityTask(ServiceTask):
         # ordered_services.reverse()
         for service_list in ordered_services:
             self.logger.warning(service_list)
-        res = None
-        for service_list in ordered_services:
-            for service in service_list:
-                self.progress(msg="Scheduling check for %s" % service["name"])
-                # self.get_session(reopen=True)
-                res = self.add_service(account, service)
+        for level, service_list in enumerate(ordered_services):
+            self.progress(msg="create %s services of level %s" % (len(service_list), level))
+            errors = self.add_services_level(account, service_list, pool_size)
+            if len(errors) > 0:
+                raise TaskError(
+                    "level %s services creation error: %s"
+                    % (level, ", ".join(["%s: %s" % (k, v) for k, v in errors.items()]))
+                )
 
         # set account status
         account, capability = self.get_account_and_capability(account_id, capability_id)
@@ -9,18 +9,56 @@ from beehive_service.entity.service_type import ApiServiceTypeContainer
 from beehive.common.task.job import task_local
 from beehive_service.controller import ApiServiceType
 from beehive_service.entity.service_instance import ApiServiceInstance
-from beehive.common.task_v2 import task_step
+from beehive.common.task_v2 import TaskError, task_step
 from beehive.common.task_v2.manager import get_task_manager
 from datetime import datetime, timedelta, date
+from gevent import sleep
 from beecell.simple import id_gen
 from beehive_service.model import ServiceMetric, SrvStatusType, ServiceMetricType
-from beehive_service.service_util import ServiceUtil
+from beehive_service.controller.daily_consumes import DailyConsumesEngine, get_daily_consumes_engine
+from beehive_service.service_util import (
+    ServiceUtil,
+    __SRV_METRIC_ACQUIRE_POOL_SIZE__,
+    __SRV_METRIC_ACQUIRE_TIMEOUT__,
+    __SRV_DAILY_CONSUMES_BLOCK_SIZE__,
+    __SRV_INSTANT_CONSUME_SNAPSHOT_RETRY__,
+    __SRV_INSTANT_CONSUME_SNAPSHOT_RETRY_DELAY__,
+)
 from typing import List, Type, Tuple, Any, Union, Dict
 
 
 #
 # Metrics And Consumes Tasks
 #
+def refresh_instant_consume_snapshot(task: ServiceTask, account_ids: List[int] = None, job_id: int = None) -> int:
+    """Refresh the instant consume snapshots. A failed refresh is retried and the task fails when the last attempt
+    fails
+
+    :param task: parent celery task
+    :param account_ids: list of account id. If None the snapshots of all the accounts are refreshed
+    :param job_id: id of the job that refreshes the snapshots [optional]
+    :return: number of snapshot rows written
+    :raise TaskError: if all the attempts fail
+    """
+    attempt = 1
+    while True:
+        try:
+            res = task.controller.manager.refresh_instant_consume_snapshot(account_ids=account_ids, job_id=job_id)
+            task.logger.info("Refreshed {} instant consume snapshot rows".format(res))
+            return res
+        except Exception as ex:
+            if attempt >= __SRV_INSTANT_CONSUME_SNAPSHOT_RETRY__:
+                task.logger.error("Refresh of instant consume snapshot failed: {}".format(ex), exc_info=True)
+                raise TaskError("Refresh of instant consume snapshot failed after {} attempts: {}".format(attempt, ex))
+            task.logger.warning(
+                "Refresh of instant consume snapshot failed: {}. Retry in {}s".format(
+                    ex, __SRV_INSTANT_CONSUME_SNAPSHOT_RETRY_DELAY__
+                )
+            )
+            sleep(__SRV_INSTANT_CONSUME_SNAPSHOT_RETRY_DELAY__)
+            attempt += 1
+
+
 class AcquireMetricTask(ServiceTask):
     entity_class = ApiAccount
     name = "acquire_metric_task"
@@ -91,55 +129,144 @@ class AcquireMetricTask(ServiceTask):
 
         return ServiceTask.on_success(self, retval, task_id, args, kwargs)
 
-    def acquire_metrics_by_account(
+    def get_metric_containers(
         self,
         account_id: int,
-        current_job_id: int,
-        metric_num: int,
-        metric_dict: dict,
         instance_id: int = None,
         plugintype: str = None,
-    ) -> bool:
-        """Acquire resource metrics by account.
+    ) -> List[Tuple[ApiServiceInstance, ApiServiceTypeContainer]]:
+        """Get the active containers of an account with their plugin.
 
-        :param plugintype:
-        :param instance_id:
-        :param metric_dict:
-        :param metric_num:
-        :param str account_id: account id
-        :param current_job_id: current job id
-        :dict sharedarea: input params
-        :return:
+        :param account_id: account id
+        :param instance_id: container instance id [optional]
+        :param plugintype: container plugin type [optional]
+        :return: list of (container, plugin_container)
         """
-        # get container
         controller = self.controller
 
-        def compute_service_id_from_resource(acc_id: int, res_uuid: str, cont_id: int) -> Tuple[int, int]:
-            service_id: int = cont_id
-            service_plugin_type_id = None
+        self.logger.debug("01 Get resource for account {}".format(account_id))
+        service_status_list_active = [
+            SrvStatusType.STOPPING,
+            SrvStatusType.STOPPED,
+            SrvStatusType.ACTIVE,
+            SrvStatusType.DELETING,
+            SrvStatusType.UPDATING,
+        ]
+        container_srvs: List[ApiServiceInstance]
+        total: int
+        container_srvs, total = controller.get_paginated_service_instances(
+            account_id=account_id,
+            id=instance_id,
+            plugintype=plugintype,
+            flag_container=True,
+            service_status_name_list=service_status_list_active,
+            filter_expired=False,
+            authorize=False,
+            size=0,
+        )
+        self.logger.debug(
+            "03 Acquire metrics for {} instances on account {} and instance {}".format(
+                len(container_srvs), account_id, instance_id
+            )
+        )
+
+        containers = []
+        for container in container_srvs:
             try:
-                if res_uuid is not None:
-                    inst_from_resource: ServiceInstance
-                    inst_from_resource = controller.manager.get_service_instance(
-                        fk_account_id=acc_id, resource_uuid=res_uuid
-                    )
-                    if inst_from_resource is None:
-                        raise Exception("05 Resource %s has not service instance associated" % res_uuid)
-                    self.logger.debug(
-                        "05 Resource {} has service instance {}associated".format(res_uuid, inst_from_resource.uuid)
+                plugin_container: ApiServiceTypeContainer
+                plugin_container = ApiServiceType(controller).instancePlugin(None, container)
+                containers.append((container, plugin_container))
+            except Exception as ex:
+                self.logger.error(
+                    "Exception occurred on account {} while getting plugin for {} container: {}".format(
+                        account_id, container, ex
                     )
+                )
+        return containers
 
-                    if inst_from_resource is not None:
-                        service_id = inst_from_resource.id
+    def fetch_containers_metrics(
+        self,
+        containers: List[Tuple[ApiServiceInstance, ApiServiceTypeContainer]],
+        pool_size: int = __SRV_METRIC_ACQUIRE_POOL_SIZE__,
+        timeout: int = __SRV_METRIC_ACQUIRE_TIMEOUT__,
+    ) -> Dict[int, List[dict]]:
+        """Call acquire_metric of many containers concurrently using a bounded gevent pool.
+        Containers that fail or exceed the timeout are logged and mapped to None.
+
+        :param containers: list of (container, plugin_container)
+        :param pool_size: max number of concurrent greenlets
+        :param timeout: max seconds to wait for the metrics of a single container
+        :return: dict {container id: metrics_resource}
+        """
+        import gevent
+        from gevent.pool import Pool
+        from beehive.common.data import operation, get_operation_params, set_operation_params
 
-                        # search plugin_type id of instance
-                        api_instance = ServiceUtil.instanceApi(controller, ApiServiceInstance, inst_from_resource)
-                        plugin = api_instance.instancePlugin(None, inst=api_instance)
-                        if plugin is not None:
-                            service_plugin_type_id = plugin.model.plugintype.id
+        def fetch_one(container: ApiServiceInstance, plugin_container: ApiServiceTypeContainer) -> List[dict]:
+            """Fetch metrics for a single container."""
+            from uuid import uuid4
 
+            operation.id = str(uuid4())
+            set_operation_params(operation_params)
+
+            try:
+                with gevent.Timeout(timeout):
+                    metrics_resource = plugin_container.acquire_metric(container.resource_uuid)
+                self.logger.debug("04 acquire metrics for container {} {}".format(container.uuid, container.name))
+                return metrics_resource
+            except gevent.Timeout:
+                self.logger.error(
+                    "Timeout of {}s occurred while acquiring metrics for {} container".format(timeout, container)
+                )
             except Exception as ex:
-                self.logger.error("05 No instance_id detected for resource {} ".format(cs.get("uuid")))
+                self.logger.error(
+                    "Exception occurred while acquiring metrics for {} container: {}".format(container, ex)
+                )
+            return None
+
+        operation_params = get_operation_params()
+        pool = Pool(pool_size)
+        jobs = {container.oid: pool.spawn(fetch_one, container, plugin) for container, plugin in containers}
+        gevent.joinall(list(jobs.values()))
+
+        return {oid: job.value for oid, job in jobs.items()}
+
+    def save_account_metrics(
+        self,
+        account_id: int,
+        current_job_id: int,
+        metric_num: int,
+        metric_dict: dict,
+        containers_metrics: List[Tuple[ApiServiceInstance, List[dict]]],
+    ) -> int:
+        """Save the metrics acquired from the containers of an account.
+
+        :param account_id: account id
+        :param current_job_id: current job id
+        :param metric_num: metric survey number
+        :param metric_dict: metric type id indexed by name
+        :param containers_metrics: list of (container, metrics_resource)
+        :return: number of saved metrics
+        """
+        controller = self.controller
+
+        resource_idx: Dict[str, Tuple[int, int]] = None
+        unresolved_resources = set()
+
+        def compute_service_id_from_resource(res_uuid: str, cont_id: int) -> Tuple[int, int]:
+            nonlocal resource_idx
+            service_id: int = cont_id
+            service_plugin_type_id = None
+            if res_uuid is not None:
+                if resource_idx is None:
+                    # load once all the service instances of the account indexed by resource uuid
+                    resource_idx = controller.manager.get_service_resource_idx_for_account(account_id)
+                    self.logger.debug("05 Loaded {} resources for account {}".format(len(resource_idx), account_id))
+                item = resource_idx.get(res_uuid, None)
+                if item is None:
+                    unresolved_resources.add(res_uuid)
+                else:
+                    service_id, service_plugin_type_id = item
             return service_id, service_plugin_type_id
 
         def compute_metric_type_id(
@@ -149,6 +276,8 @@ class AcquireMetricTask(ServiceTask):
             metric_unit: str,
         ) -> int:
             type_id: int = metric_dict.get(metric_name, None)
+            if type_id is None:
+                type_id = controller.get_service_metric_type_id(metric_name)
 
             mtp = None
             # check if MetricType exist
@@ -168,7 +297,7 @@ class AcquireMetricTask(ServiceTask):
 
                 type_id = metric_type_new.id
 
-                metric_dict.update({metric_name: metric_type_id})
+            metric_dict.update({metric_name: type_id})
             # no deprecated metric_type_plugin_type
             # check if the association between metric_type and plugin_type exist
             # mtp = controller.manager.get_metric_type_plugin_type(plugin_type_id, metric_type_id)
@@ -179,96 +308,104 @@ class AcquireMetricTask(ServiceTask):
 
             return type_id
 
-        try:
-            self.logger.debug("01 Get resource for account {}".format(account_id))
-            service_status_list_active = [
-                SrvStatusType.STOPPING,
-                SrvStatusType.STOPPED,
-                SrvStatusType.ACTIVE,
-                SrvStatusType.DELETING,
-                SrvStatusType.UPDATING,
-            ]
-            container_srvs: List[ServiceInstance]
-            total: int
-            container_srvs, total = controller.get_paginated_service_instances(
-                account_id=account_id,
-                id=instance_id,
-                plugintype=plugintype,
-                flag_container=True,
-                service_status_name_list=service_status_list_active,
-                filter_expired=False,
-                authorize=False,
-                size=0,
-            )
-            self.logger.debug(
-                "03 Acquire metrics for %s instances on account %s and instance %s".format(
-                    len(container_srvs), account_id, instance_id
+        metrics = []
+        for container, metrics_resource in containers_metrics:
+            if metrics_resource is None:
+                continue
+            try:
+                for cs in metrics_resource:
+                    # for any metric find service_id association
+                    resource_uuid: str = cs.get("uuid", None)
+                    srv_id: int
+                    plugin_type_id: int
+                    srv_id, plugin_type_id = compute_service_id_from_resource(resource_uuid, container.oid)
+                    # SAVE metrics;
+                    for m in cs.get("metrics", []):
+                        # decode instance id from resource_uuid
+                        name = m.get("key")
+                        unit = m.get("unit")
+                        measure_type = m.get("type")
+                        metric_type_id = compute_metric_type_id(name, measure_type, container.getPluginTypeName(), unit)
+                        metric = (
+                            m.get("value"),
+                            metric_type_id,
+                            metric_num,
+                            srv_id,
+                            resource_uuid,
+                        )
+                        metrics.append(metric)
+
+            except Exception as ex:
+                self.logger.error(
+                    "Exception occurred on account {} while acquiring metrics for {} container: {}".format(
+                        account_id, container, ex
+                    )
+                )
+
+        if len(unresolved_resources) > 0:
+            self.logger.warning(
+                "05 {} resources on account {} have not service instance associated: {}".format(
+                    len(unresolved_resources), account_id, ", ".join(sorted(unresolved_resources))
                 )
             )
 
-            metrics = []
-            self.logger.debug("01 Get resource quota on account {}".format(account_id))
-            for container in container_srvs:
-                try:
-                    plugin_container: ApiServiceTypeContainer
-                    plugin_container = ApiServiceType(controller).instancePlugin(None, container)
-                    metrics_resource = plugin_container.acquire_metric(container.resource_uuid)
-                    self.logger.debug("04 acquire metrics for container {} {}".format(container.uuid, container.name))
-
-                    for cs in metrics_resource:
-                        # for any metric find service_id association
-                        resource_uuid: str = cs.get("uuid", None)
-                        srv_id: int
-                        plugin_type_id: int
-                        srv_id, plugin_type_id = compute_service_id_from_resource(
-                            account_id, resource_uuid, container.oid
-                        )
-                        # SAVE metrics;
-                        for m in cs.get("metrics", []):
-                            # decode instance id from resource_uuid
-                            name = m.get("key")
-                            unit = m.get("unit")
-                            measure_type = m.get("type")
-                            metric_type_id = compute_metric_type_id(
-                                name, measure_type, container.getPluginTypeName(), unit
-                            )
-                            metric = (
-                                m.get("value"),
-                                metric_type_id,
-                                metric_num,
-                                srv_id,
-                                resource_uuid,
-                            )
-                            metrics.append(metric)
-
-                except Exception as ex:
-                    self.logger.error(
-                            "Exception occurred on account {} while acquiring metrics for {} container: {}".format(
-                            account_id, container, ex
-                        )
-                    )
+        res = 0
+        if len(metrics) > 0:
+            self.logger.debug("07 add metrics")
+
+            # generate orm entities for metrics
+            metrics = [
+                ServiceMetric(
+                    value=m[0],
+                    metric_type_id=m[1],
+                    metric_num=m[2],
+                    service_instance_id=m[3],
+                    resource_uuid=m[4],
+                    job_id=current_job_id,
+                )
+                for m in metrics
+            ]
+            # Insert aggregate cost batch
+            controller.manager.bulk_save_entities(metrics)
+            res = len(metrics)
+            self.logger.debug("07 add metrics: {}".format(res))
 
-            res = 0
-            if len(metrics) > 0:
-                self.logger.debug("07 add metrics")
-
-                # generate orm entities for metrics
-                metrics = [
-                    ServiceMetric(
-                        value=m[0],
-                        metric_type_id=m[1],
-                        metric_num=m[2],
-                        service_instance_id=m[3],
-                        resource_uuid=m[4],
-                        job_id=current_job_id,
-                    )
-                    for m in metrics
-                ]
-                # Insert aggregate cost batch
-                controller.manager.bulk_save_entities(metrics)
-                res = len(metrics)
-                self.logger.debug("07 add metrics: {}".format(res))
+        return res
+
+    def acquire_metrics_by_account(
+        self,
+        account_id: int,
+        current_job_id: int,
+        metric_num: int,
+        metric_dict: dict,
+        instance_id: int = None,
+        plugintype: str = None,
+        pool_size: int = __SRV_METRIC_ACQUIRE_POOL_SIZE__,
+        timeout: int = __SRV_METRIC_ACQUIRE_TIMEOUT__,
+    ) -> int:
+        """Acquire resource metrics by account.
 
+        :param plugintype:
+        :param instance_id:
+        :param metric_dict:
+        :param metric_num:
+        :param str account_id: account id
+        :param current_job_id: current job id
+        :param pool_size: max number of containers acquired concurrently
+        :param timeout: max seconds to wait for the metrics of a single container
+        :return: number of saved metrics
+        """
+        res = 0
+        try:
+            containers = self.get_metric_containers(account_id, instance_id=instance_id, plugintype=plugintype)
+            containers_metrics = self.fetch_containers_metrics(containers, pool_size=pool_size, timeout=timeout)
+            res = self.save_account_metrics(
+                account_id,
+                current_job_id,
+                metric_num,
+                metric_dict,
+                [(container, containers_metrics.get(container.oid)) for container, _ in containers],
+            )
         except Exception as ex:
             self.logger.error("Exception occurred: {} while acquiring metrics for {}".format(ex, account_id))
 
@@ -319,25 +456,51 @@ class AcquireMetricTask(ServiceTask):
         task.logger.info("Acquire metric got {} accounts".format(total_acc))
 
         # make dict metric type {name: id}
-        metric_types: List[ServiceMetricType]
-        metric_types = controller.manager.get_service_metric_types()
-        mtype = {mt.name: mt.id for mt in metric_types}
+        mtype = controller.get_service_metric_type_idx()
 
         # log job
         current_job = controller.add_job(task.request.id, "acquire_service_metrics", params)
 
+        pool_size = params.get("pool_size", None) or __SRV_METRIC_ACQUIRE_POOL_SIZE__
+        timeout = params.get("container_timeout", None) or __SRV_METRIC_ACQUIRE_TIMEOUT__
+
         task.logger.info("Get accounts total: %s" % total_acc)
+        account_containers = []
         for account in accounts:
+            try:
+                account_containers.append((account, task.get_metric_containers(account.id)))
+            except Exception as ex:
+                task.logger.error("Exception occurred: {} while getting containers for {}".format(ex, account.id))
+
+        # fetch metrics of the containers of all the accounts at once
+        containers = [container for _, account_conts in account_containers for container in account_conts]
+        task.logger.info("Acquire metric for {} containers with pool size {}".format(len(containers), pool_size))
+        containers_metrics = task.fetch_containers_metrics(containers, pool_size=pool_size, timeout=timeout)
+
+        for account, account_conts in account_containers:
             params["account_id"] = account.id
-            task.acquire_metrics_by_account(account.id, current_job.id, metric_num, mtype)
-            task.logger.info("Generate task for acquire metric for account {}".format(account))
+            try:
+                res = task.save_account_metrics(
+                    account.id,
+                    current_job.id,
+                    metric_num,
+                    mtype,
+                    [(container, containers_metrics.get(container.oid)) for container, _ in account_conts],
+                )
+                task.logger.info("Saved {} metrics for account {}".format(res, account))
+            except Exception as ex:
+                task.logger.error("Exception occurred: {} while saving metrics for {}".format(ex, account.id))
 
+        # accounts whose instant consume snapshot is refreshed by the finalize step. None means all the accounts
+        params["snapshot_account_ids"] = None if obj_id is None else [account.id for account in accounts]
+        params["job_id"] = current_job.id
         return True, params
 
     @staticmethod
     @task_step()
     def finalize_metrics_acquisition_step(task: ServiceTask, step_id: str, params: dict, *args, **kvargs):
-        """Finalize the metrics acquistion by computing the next acqusition id
+        """Finalize the metrics acquistion by computing the next acqusition id and refreshing the instant consume
+        snapshot
 
         :param task: parent celery task
         :param str step_id: step id
@@ -347,6 +510,10 @@ class AcquireMetricTask(ServiceTask):
         task.logger.debug("FinalizeMetricAcquisition calling stored procedure")
         controller = task.controller
         controller.manager.call_smsmpopulate(10000)
+
+        refresh_instant_consume_snapshot(
+            task, account_ids=params.get("snapshot_account_ids", None), job_id=params.get("job_id", None)
+        )
         task.logger.debug("FinalizeMetricAcquisition done")
 
         return True, params
@@ -386,9 +553,21 @@ class GenerateDailyConsumesTask(ServiceTask):
             yesterday = date.today() - timedelta(days=1)
             period = yesterday.strftime("%Y-%m-%d")
 
-        task.logger.debug("a. Generate Daily Consumes for  {}".format(period))
+        try:
+            engine = get_daily_consumes_engine(params.get("engine", None))
+        except ValueError as ex:
+            raise TaskError(str(ex))
+
+        task.logger.debug("a. Generate Daily Consumes for  {} with engine {}".format(period, engine))
         current_job = controller.add_job(task.request.id, "Daily_Costs", params)
-        controller.manager.call_dailycosts(period, current_job.id)
+        if engine == "python":
+            block_size = params.get("block_size", None) or __SRV_DAILY_CONSUMES_BLOCK_SIZE__
+            DailyConsumesEngine(controller.manager, block_size=block_size).run(period, current_job.id)
+        else:
+            controller.manager.call_dailycosts(period, current_job.id)
+
+        # instant consumes are read from the snapshots, refresh them with the metrics of the day
+        refresh_instant_consume_snapshot(task, job_id=current_job.id)
         return True, params
 
 
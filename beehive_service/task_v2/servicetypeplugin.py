@@ -12,12 +12,16 @@ from beehive_service.entity.service_instance import ApiServiceInstance
 from beehive_service.model import SrvStatusType
 from beehive_service.task_v2 import ServiceTask
 from datetime import datetime, timedelta
+from typing import List, Tuple, Dict
 import logging
 from celery import shared_task
 logger = logging.getLogger(__name__)
 
 task_manager = get_task_manager()
 
+# max number of services deleted concurrently by AccountDeleteTask
+DELETE_TASK_POOL_SIZE = 10
+
 class AccountDeleteTask(ServiceTask):
     """AccountDeleteTask task"""
 
@@ -39,38 +43,128 @@ class AccountDeleteTask(ServiceTask):
         account = self.controller.get_account(account_id)
         return account
 
+    def delete_service(self, step_id: str, service_uuid: str, operation_params: dict):
+        """Delete a single account service in its own greenlet and database session
+
+        :param step_id: step id
+        :param service_uuid: service instance uuid
+        :param operation_params: operation params of the parent greenlet
+        """
+        from beehive.common.data import operation, set_operation_params
+
+        set_operation_params(operation_params)
+        operation.transaction = None
+        self.get_session(reopen=True)
+        try:
+            instance: ApiServiceInstance = self.controller.get_service_instance(service_uuid)
+            plugin = instance.get_service_type_plugin()
+            self.progress(step_id, msg="delete service %s - START" % instance.name)
+            plugin.delete(sync=True)
+            prepared_task = plugin.active_task
+            if prepared_task is not None and prepared_task != {}:
+                run_sync_task(prepared_task, self, step_id)
+            self.progress(step_id, msg="delete service %s - STOP" % instance.name)
+        finally:
+            self.release_session()
+
+    def delete_service_index(
+        self, step_id: str, service_idx: dict, pool_size: int, skip: List[str] = None
+    ) -> Tuple[List[str], Dict[str, str]]:
+        """Delete the services of an account index concurrently. A service is scheduled when all its children are
+        deleted, so independent subtrees are deleted in parallel and children are always deleted before parents.
+        When a service deletion fails its ancestors are not deleted, while the other subtrees go on.
+
+        :param step_id: step id
+        :param service_idx: service index as returned by ApiAccount.get_service_index
+        :param pool_size: max number of services deleted concurrently
+        :param skip: uuids of the services already deleted by a previous run, they are not deleted again [optional]
+        :return: list of deleted service uuids, error message indexed by the uuid of the failed services
+        """
+        import gevent
+        from gevent.pool import Pool
+        from beehive.common.data import get_operation_params
+
+        # walk the trees of the core services, count the children still to delete for each service and index parents
+        skip = set(skip or [])
+        pending = {}
+        parents = {}
+        stack = [
+            uuid
+            for uuid, item in service_idx.items()
+            if item["core"] is True and item["plugin"] is not None and uuid not in skip
+        ]
+        while len(stack) > 0:
+            uuid = stack.pop()
+            childs = [
+                c
+                for c in service_idx[uuid]["childs"]
+                if service_idx.get(c, {}).get("plugin") is not None and c not in skip
+            ]
+            pending[uuid] = len(childs)
+            for child in childs:
+                parents[child] = uuid
+                stack.append(child)
+
+        operation_params = get_operation_params()
+        pool = Pool(pool_size)
+        ready = [uuid for uuid, count in pending.items() if count == 0]
+        running = {}
+        deleted = []
+        errors = {}
+        while len(ready) > 0 or len(running) > 0:
+            while len(ready) > 0:
+                uuid = ready.pop()
+                running[uuid] = pool.spawn(self.delete_service, step_id, uuid, operation_params)
+
+            gevent.wait(list(running.values()), count=1)
+            for uuid, job in list(running.items()):
+                if not job.ready():
+                    continue
+                running.pop(uuid)
+                if job.exception is not None:
+                    self.progress(step_id, msg="delete service %s - ERROR: %s" % (uuid, job.exception))
+                    errors[uuid] = str(job.exception)
+                    continue
+                deleted.append(uuid)
+                parent = parents.get(uuid, None)
+                if parent is not None:
+                    pending[parent] -= 1
+                    if pending[parent] == 0:
+                        ready.append(parent)
+
+        return deleted, errors
+
     @staticmethod
     @task_step()
     def delete_services_step(task, step_id, params, *args, **kvargs):
-        """Delete account services
+        """Delete account services. Services still present on the account are deleted, so a partially failed
+        deletion can be resumed by running the task again. The services deleted by a previous run are kept in
+        params.deleted_services and skipped on retry.
 
         :param task: parent celery task
         :param str step_id: step id
         :param dict params: step params
         :param params.account_id: account id
+        :param params.pool_size: max number of services deleted concurrently [optional]
         :return: account_id, params
         """
         account_id = params.get("account")
+        pool_size = params.get("pool_size", None) or DELETE_TASK_POOL_SIZE
         account = task.get_account(account_id)
 
         task.progress(step_id, msg="delete all account %s services - START" % account_id)
         service_idx = account.get_service_index()
 
-        def loop_childs(service):
-            plugin = service["plugin"]
-            task.progress(step_id, msg="delete service %s - START" % plugin.instance.name)
-            for child_id in service["childs"]:
-                loop_childs(service_idx.get(child_id))
-            # delete service
-            plugin.delete(sync=True)
-            prepared_task = plugin.active_task
-            if prepared_task is not None and prepared_task != {}:
-                run_sync_task(prepared_task, task, step_id)
-            task.progress(step_id, msg="delete service %s - STOP" % plugin.instance.name)
-
-        for k, v in service_idx.items():
-            if v["core"] is True:
-                loop_childs(v)
+        skip = params.get("deleted_services", [])
+        if len(skip) > 0:
+            task.progress(step_id, msg="skip %s services already deleted" % len(skip))
+        deleted, errors = task.delete_service_index(step_id, service_idx, pool_size, skip=skip)
+        params["deleted_services"] = skip + deleted
+        if len(errors) > 0:
+            raise ApiManagerError(
+                "delete account %s services error: %s"
+                % (account_id, ", ".join(["%s: %s" % (k, v) for k, v in errors.items()]))
+            )
 
         task.progress(step_id, msg="delete all account %s services - STOP" % account_id)
 
@@ -198,8 +292,9 @@ class AbstractServiceTypePluginTask(ServiceTask):
 
         plugin = task.get_type_plugin(instance_id)
 
-        # create resource
-        res = plugin.create_resource(task, resource_params)
+        # create resource, config changes are written at the end and before every remote task wait
+        with plugin.instance.config_batch():
+            res = plugin.create_resource(task, resource_params)
         task.progress(step_id, msg="create resource %s" % res)
 
         # update configuration
@@ -10,6 +10,7 @@ from beehive.common.apimanager import (
     ApiManagerWarning,
 )
 from flasgger import fields, Schema
+from flask import request, after_this_request
 from marshmallow.validate import Regexp
 from beehive.common.data import operation
 from marshmallow.decorators import validates_schema
@@ -43,6 +44,23 @@ class ServiceApiView(SwaggerApiView):
         self.logger.debug("Service Aws response: %s" % res)
         return res
 
+    def get_etag_response(self, res, etag: str):
+        """Return the response data and set its entity tag on the response built by the api view. When the
+        If-None-Match header of the request matches the tag the response is turned in a 304 without payload
+
+        :param res: response data
+        :param etag: entity tag of the response data
+        :return: response data
+        """
+
+        @after_this_request
+        def set_etag(response):
+            response.headers["ETag"] = etag
+            # entity tags are compared with the weak comparison, only 200 responses to GET and HEAD are changed
+            return response.make_conditional(request)
+
+        return res
+
     def service_exist(self, controller: 'ServiceController', name: str, plugintype: str):
         exist = controller.exist_service_instance(name, plugintype)
         if exist is True:
@@ -87,23 +105,15 @@ class ServiceApiView(SwaggerApiView):
 
         account_id_list = []
         zone_list = []
-        for account_id in account_ids:
-            try:
-                account = controller.get_account(account_id)
-                services = controller.get_service_instances(
-                    fk_account_id=account.oid,
-                    plugintype=service_class.plugintype,
-                    active=True,
-                )
-                if len(services) > 0:
-                    account_id_list.append(str(account.oid))
-                    if services[0].resource_uuid is not None:
-                        zone_list.append(services[0].resource_uuid)
-                else:
-                    self.logger.warning("account %s does not have associated compute service" % account_id)
-            except ApiManagerError as ex:
-                if ex.code != 403:
-                    raise
+        for account, resource_uuid, has_service in controller.get_accounts_container_service(
+            account_ids, service_class.plugintype
+        ):
+            if has_service is True:
+                account_id_list.append(str(account.oid))
+                if resource_uuid is not None:
+                    zone_list.append(resource_uuid)
+            else:
+                self.logger.warning("account %s does not have associated compute service" % account.uuid)
         self.logger.debug("Get accounts and zones by filter: %s %s" % (account_id_list, zone_list))
         return account_id_list, zone_list
 
@@ -101,20 +101,11 @@ class GetUserRolesAndServicesByUserName(ServiceApiView):
         portal_roles.extend(portal_accounts_roles)
         portal_roles.extend(portal_catalogs_roles)
 
-        roles = []
-
         user_name = data.get("user_name")
-        # get roles by groups
-        groups = controller.get_user_groups(user_name, size=0).get("groups", [])
-        for g in groups:
-            roles.extend(controller.get_user_roles(group_name=g.get("id"), size=0).get("roles"))
-
-        # Attention: optimized call has a problem with the group_id_list request parameter
-        # group_id_list = [str(g.get('id')) for g in groups]
-        # roles.extend(controller.get_user_roles(group_id_list=group_id_list).get('roles'))
-
-        # get roles by user name
-        roles.extend(controller.get_user_roles(user_name=user_name, size=0).get("roles"))
+        # get roles by groups and by user name
+        # Attention: optimized call has a problem with the group_id_list request parameter, so roles are read
+        # concurrently one group at a time
+        roles = controller.get_user_and_groups_roles(user_name)
 
         # split roles to get object id
         for r in roles:
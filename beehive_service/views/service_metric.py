@@ -210,6 +210,16 @@ class CreateServiceMetricRequestSchema(Schema):
         load_default=None,
         metadata={"description": "account only when bulk inserting"},
     )
+    bulk = fields.Boolean(
+        required=False,
+        load_default=False,
+        metadata={
+            "description": (
+                "if True metrics are ingested set based with a single database insert "
+                "and a single elastic search bulk request"
+            )
+        },
+    )
     metrics = fields.Nested(
         CreateServiceMetricParamRequestSchema,
         required=False,
@@ -238,7 +248,8 @@ class CreateServiceMetricBodyRequestSchema(Schema):
 
 
 class CreateServiceMetricResponseSchema(Schema):
-    id = fields.Integer(required=True)
+    id = fields.Integer(required=False, metadata={"description": "last generated metric id"})
+    count = fields.Integer(required=False, metadata={"description": "number of inserted metrics in bulk mode"})
 
 
 class CreateServiceMetric(ServiceApiView):
@@ -260,6 +271,8 @@ class CreateServiceMetric(ServiceApiView):
 
         ctrl: ServiceController = controller
         resp = ctrl.add_service_metrics(data)
+        if data.get("bulk", False) is True:
+            return ({"count": resp}, 201)
         return ({"id": resp}, 201)
 
 
@@ -268,6 +281,16 @@ class AcquireServiceMetricParamRequestSchema(Schema):
     account_id = fields.String(required=False, allow_none=True)
     metric_type_id = fields.Integer(required=False, allow_none=True)
     service_instance_id = fields.String(required=False, allow_none=True)
+    pool_size = fields.Integer(
+        required=False,
+        allow_none=True,
+        metadata={"description": "max number of containers acquired concurrently"},
+    )
+    container_timeout = fields.Integer(
+        required=False,
+        allow_none=True,
+        metadata={"description": "max seconds to wait for the metrics of a single container"},
+    )
 
 
 class AcquireServiceMetricRequestSchema(Schema):
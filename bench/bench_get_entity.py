@@ -0,0 +1,129 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# Usage: python bench/bench_get_entity.py [--number n] [--rows n]
+#
+# Time ServiceDbManager.get_entity by id, uuid and name on a seeded service_type table, with the debug2 log of the
+# DAO disabled and enabled:
+# - query: every call runs in a new operation, so the entity is read from database
+# - identity map: every call runs in the same operation, so the entity is taken from the get_entity identity map
+# When debug2 is enabled the log records are formatted and written to a null stream, so the cost of rendering the
+# sql statement is measured. The table is created from the service model on an in-memory SQLite database.
+
+import argparse
+import logging
+import os
+import sys
+from time import perf_counter
+from typing import Dict, List
+from uuid import uuid4
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from beecell.simple import id_gen
+from beehive.common.data import operation
+from beehive_service.dao.ServiceDao import ServiceDbManager
+from beehive_service.model import ServiceType
+from beehive_service.model.base import Base
+
+# level of the logger that enables debug2 whatever its numeric value
+ALL_LEVELS = 1
+
+
+def seed(session, rows: int):
+    """Fill the service_type table
+
+    :param session: database session
+    :param rows: number of service types
+    """
+    for i in range(1, rows + 1):
+        service_type = ServiceType(
+            id_gen(), "type-%s" % i, "", "bench.Type%s" % i, False, template_cfg="{}", active=True
+        )
+        service_type.id = i
+        session.add(service_type)
+    session.commit()
+
+
+def timeit(func, number: int) -> float:
+    """Run func number times
+
+    :return: mean time of a call in microseconds
+    """
+    start = perf_counter()
+    for _ in range(number):
+        func()
+    return (perf_counter() - start) * 1000000 / number
+
+
+def run_benchmark(number: int = 2000, rows: int = 1000) -> List[Dict]:
+    """Seed the service_type table and time get_entity with debug2 disabled and enabled
+
+    :param number: number of calls of every lookup
+    :param rows: number of rows of service_type
+    :return: list of dict with lookup, oid, debug2_off_us and debug2_on_us
+    """
+    res = []
+    engine = create_engine("sqlite://")
+    manager = ServiceDbManager()
+    logger = manager.logger
+    level = logger.level
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+    try:
+        Base.metadata.create_all(engine, tables=[ServiceType.__table__])
+        session = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+        operation.id = str(uuid4())
+        operation.transaction = None
+        operation.session = session
+        try:
+            seed(session, rows)
+            entity = manager.get_entity(ServiceType, rows // 2)
+            oids = [("id", str(entity.id)), ("uuid", entity.uuid), ("name", entity.name)]
+
+            def query(oid):
+                operation.id = str(uuid4())
+                return manager.get_entity(ServiceType, oid)
+
+            def identity_map(oid):
+                return manager.get_entity(ServiceType, oid)
+
+            for lookup, func in [("query", query), ("identity map", identity_map)]:
+                for oid_type, oid in oids:
+                    if func(oid).id != entity.id:
+                        raise Exception("get_entity by %s %s returned another entity" % (oid_type, oid))
+                    item = {"lookup": lookup, "oid": oid_type}
+                    for debug2, key in [(False, "debug2_off_us"), (True, "debug2_on_us")]:
+                        if debug2 is True:
+                            logger.setLevel(ALL_LEVELS)
+                            logger.addHandler(handler)
+                        else:
+                            logger.setLevel(logging.INFO)
+                            logger.removeHandler(handler)
+                        item[key] = timeit(lambda: func(oid), number)
+                    res.append(item)
+        finally:
+            operation.session = None
+            session.close()
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+        handler.close()
+        engine.dispose()
+    return res
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python bench/bench_get_entity.py")
+    parser.add_argument("--number", type=int, default=2000, help="calls of every lookup [default=2000]")
+    parser.add_argument("--rows", type=int, default=1000, help="rows of the service_type table [default=1000]")
+    args = parser.parse_args(argv)
+
+    print("%-14s %-6s %16s %16s" % ("lookup", "oid", "debug2 off us", "debug2 on us"))
+    for item in run_benchmark(number=args.number, rows=args.rows):
+        print("%-14s %-6s %16.2f %16.2f" % (item["lookup"], item["oid"], item["debug2_off_us"], item["debug2_on_us"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,174 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# Usage: python bench/bench_instance_tags.py [--repeat n] [size ...]
+#
+# Time ServiceDbManager.get_paginated_service_type_plugins on a seeded service schema of growing size. The method
+# is called as the api does, so the timings include the page and count queries built by the paginated query
+# generator and the query of the tags of the page. The schema is created from the service models on an in-memory
+# SQLite database. Perm tag filters are disabled, as for the administrator.
+
+import argparse
+import random
+import sys
+from time import perf_counter
+from typing import Dict, List
+from uuid import uuid4
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from beecell.simple import id_gen
+from beehive.common.data import operation
+from beehive_service.dao.ServiceDao import ServiceDbManager
+from beehive_service.model import (
+    ServiceDefinition,
+    ServiceInstance,
+    ServicePluginType,
+    ServiceStatus,
+    ServiceTag,
+    ServiceType,
+)
+from beehive_service.model.base import Base
+from beehive_service.model.service_instance import tag_instance
+
+TAGS_NUM = 50
+ACCOUNT_SIZE = 100
+PAGE_SIZE = 10
+PLUGIN_TYPES = ["ComputeInstance", "DatabaseInstance", "StorageEFS"]
+
+TABLES = [
+    ServiceStatus.__table__,
+    ServiceType.__table__,
+    ServicePluginType.__table__,
+    ServiceDefinition.__table__,
+    ServiceInstance.__table__,
+    ServiceTag.__table__,
+    tag_instance,
+]
+
+# kvargs of get_paginated_service_type_plugins for every scenario
+SCENARIOS = {
+    "account page": {"account_id": 1},
+    "account page with tags": {"account_id": 1, "servicetags_or": ["tag-001", "tag-002"]},
+    "account page of plugin type": {"account_id": 1, "plugintype": PLUGIN_TYPES[0]},
+    "all accounts page": {},
+}
+
+
+def seed(session, size: int):
+    """Fill the service schema
+
+    :param session: database session
+    :param size: number of service instances
+    """
+    rnd = random.Random(size)
+    session.add(ServiceStatus(1, "ACTIVE"))
+    for i, name in enumerate(PLUGIN_TYPES, start=1):
+        objclass = "beehive_service.plugins.bench.%s" % name
+        session.add(ServicePluginType(i, name, objclass))
+        service_type = ServiceType(id_gen(), name, name, objclass, False, template_cfg="{}", active=True)
+        service_type.id = i
+        session.add(service_type)
+        definition = ServiceDefinition(id_gen(), "def-%s" % name, "", i)
+        definition.id = i
+        session.add(definition)
+    accounts = max(1, size // ACCOUNT_SIZE)
+    for i in range(1, TAGS_NUM + 1):
+        tag = ServiceTag("tag-%03d" % i, id_gen(), 1)
+        tag.id = i
+        session.add(tag)
+    session.flush()
+
+    instances = []
+    tags = []
+    for i in range(1, size + 1):
+        instance = ServiceInstance(
+            id_gen(), "inst-%s" % i, i % accounts + 1, rnd.randint(1, len(PLUGIN_TYPES)), status="ACTIVE"
+        )
+        instance.id = i
+        instances.append(instance)
+        for tag_id in rnd.sample(range(1, TAGS_NUM + 1), rnd.randint(0, 2)):
+            tags.append({"fk_service_instance_id": i, "fk_service_tag_id": tag_id})
+    session.bulk_save_objects(instances)
+    if len(tags) > 0:
+        session.execute(tag_instance.insert(), tags)
+    session.commit()
+
+
+def timeit(func, repeat: int) -> float:
+    """Run func repeat times
+
+    :return: median time in milliseconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        times.append((perf_counter() - start) * 1000)
+    times.sort()
+    return times[len(times) // 2]
+
+
+def run_benchmark(sizes: List[int], repeat: int = 5) -> List[Dict]:
+    """Seed the schema with every size and time get_paginated_service_type_plugins in every scenario
+
+    :param sizes: list of schema sizes
+    :param repeat: number of calls of every scenario
+    :return: list of dict with size, scenario, rows, total and ms
+    """
+    res = []
+    engine = create_engine("sqlite://")
+    manager = ServiceDbManager()
+    try:
+        for size in sizes:
+            Base.metadata.drop_all(engine, tables=TABLES)
+            Base.metadata.create_all(engine, tables=TABLES)
+            session = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+            operation.id = str(uuid4())
+            operation.transaction = None
+            operation.session = session
+            try:
+                seed(session, size)
+
+                for scenario, params in SCENARIOS.items():
+
+                    def page():
+                        return manager.get_paginated_service_type_plugins(
+                            size=PAGE_SIZE, with_perm_tag=False, **params
+                        )
+
+                    rows, total = page()
+                    res.append(
+                        {
+                            "size": size,
+                            "scenario": scenario,
+                            "rows": len(rows),
+                            "total": total,
+                            "ms": timeit(page, repeat),
+                        }
+                    )
+            finally:
+                operation.session = None
+                session.close()
+        Base.metadata.drop_all(engine, tables=TABLES)
+    finally:
+        engine.dispose()
+    return res
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="python bench/bench_instance_tags.py")
+    parser.add_argument("--repeat", type=int, default=5, help="calls of every scenario [default=5]")
+    parser.add_argument("sizes", nargs="*", type=int, default=[1000, 10000, 100000], help="schema sizes")
+    args = parser.parse_args(argv)
+
+    print("%-10s %-30s %6s %8s %12s" % ("size", "scenario", "rows", "total", "ms"))
+    for item in run_benchmark(args.sizes, repeat=args.repeat):
+        print(
+            "%-10s %-30s %6s %8s %12.2f" % (item["size"], item["scenario"], item["rows"], item["total"], item["ms"])
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
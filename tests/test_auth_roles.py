@@ -0,0 +1,97 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# ServiceController.get_user_and_groups_roles against a fake auth api client whose requests take a fixed latency
+# on gevent.sleep, so the concurrency of the role requests is visible in the wall time.
+
+from time import time
+from uuid import uuid4
+import pytest
+
+gevent = pytest.importorskip("gevent")
+pytest.importorskip("beehive")
+
+from beehive.common.apimanager import ApiManagerError  # noqa: E402
+from beehive.common.data import operation  # noqa: E402
+from beehive_service.controller import ServiceController  # noqa: E402
+
+LATENCY = 0.1
+GROUPS = 10
+
+
+class FakeApiClient(object):
+    def __init__(self, groups, failing_group=None):
+        self.groups = groups
+        self.failing_group = failing_group
+        self.running = 0
+        self.max_running = 0
+        self.requests = 0
+
+    def admin_request(self, module, path, method, data=None):
+        self.requests += 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            gevent.sleep(LATENCY)
+        finally:
+            self.running -= 1
+
+        if path == "/v1.0/nas/groups":
+            return {"groups": [{"id": g} for g in self.groups]}
+        if self.failing_group is not None and "group=%s" % self.failing_group in data:
+            raise ApiManagerError("group %s not found" % self.failing_group, code=404)
+        return {"roles": [{"name": "role-of-%s" % data}]}
+
+
+class FakeController(ServiceController):
+    api_client = None
+
+    def __init__(self, api_client):
+        self.api_client = api_client
+
+
+@pytest.fixture(autouse=True)
+def set_operation():
+    operation.id = str(uuid4())
+    operation.user = ("test", "localhost", "")
+    operation.perms = []
+
+
+def test_roles_requests_run_concurrently():
+    api_client = FakeApiClient(["group-%s" % i for i in range(GROUPS)])
+    controller = FakeController(api_client)
+
+    start = time()
+    roles = controller.get_user_and_groups_roles("user", pool_size=GROUPS + 1, cache=False)
+    elapsed = time() - start
+
+    # one role list for every group and one for the user
+    assert len(roles) == GROUPS + 1
+    assert api_client.requests == GROUPS + 2
+    assert api_client.max_running == GROUPS + 1
+    # groups request, then all the role requests together. Sequential requests would take (GROUPS + 2) * LATENCY
+    assert elapsed < 4 * LATENCY
+
+
+def test_roles_requests_bounded_by_pool_size():
+    api_client = FakeApiClient(["group-%s" % i for i in range(GROUPS)])
+    controller = FakeController(api_client)
+
+    start = time()
+    roles = controller.get_user_and_groups_roles("user", pool_size=4, cache=False)
+    elapsed = time() - start
+
+    assert len(roles) == GROUPS + 1
+    assert api_client.max_running == 4
+    # groups request, then 11 role requests in 3 rounds of at most 4
+    assert elapsed < 6 * LATENCY
+
+
+def test_roles_request_error_keeps_code():
+    api_client = FakeApiClient(["group-%s" % i for i in range(GROUPS)], failing_group="group-3")
+    controller = FakeController(api_client)
+
+    with pytest.raises(ApiManagerError) as ex:
+        controller.get_user_and_groups_roles("user", cache=False)
+    assert ex.value.code == 404
@@ -0,0 +1,86 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# Write behind of the service instance config: inside a config batch json_cfg saves are only counted as deferred and
+# written once by flush. Database writes are recorded by a fake update of the config object.
+
+import logging
+import pytest
+
+pytest.importorskip("beehive")
+
+from beehive_service.controller import ServiceController  # noqa: E402
+from beehive_service.entity.service_instance import (  # noqa: E402
+    ApiServiceInstance,
+    ApiServiceInstanceConfig,
+)
+
+
+class FakeController(ServiceController):
+    def __init__(self):
+        pass
+
+
+@pytest.fixture
+def instance():
+    controller = FakeController()
+    config = ApiServiceInstanceConfig(controller, oid=10)
+    config.written = []
+    config.update = lambda **kvargs: config.written.append(dict(kvargs["json_cfg"]))
+    instance = ApiServiceInstance(controller, oid=1)
+    instance.config_object = config
+    return instance
+
+
+def test_saves_without_batch_are_written(instance):
+    config = instance.config_object
+    instance.set_config("k1", "v1")
+    instance.set_config("k2", "v2")
+
+    assert config.written == [{"k1": "v1"}, {"k1": "v1", "k2": "v2"}]
+    assert (config.deferred_saves, config.writes) == (0, 2)
+
+
+def test_batch_defers_saves_and_flush_writes_once(instance, caplog):
+    caplog.set_level(logging.DEBUG)
+    config = instance.config_object
+    instance.set_config("k0", "v0")
+
+    with instance.config_batch():
+        instance.set_config("k1", "v1")
+        instance.set_config("k2", "v2")
+        instance.set_config("k3", "v3")
+        assert config.written == [{"k0": "v0"}]
+
+    # counters are reset at the start of the batch
+    assert config.written[-1] == {"k0": "v0", "k1": "v1", "k2": "v2", "k3": "v3"}
+    assert (config.deferred_saves, config.writes) == (3, 1)
+    assert "Flush config 10: 3 deferred saves, 1 writes" in caplog.text
+
+
+def test_flush_inside_batch(instance):
+    config = instance.config_object
+    instance.begin_config_batch()
+    instance.set_config("k1", "v1")
+    # a remote task wait flushes the batch, write behind stays enabled
+    config.flush()
+    instance.set_config("k2", "v2")
+    config.flush()
+    config.flush()
+    instance.flush_config()
+
+    assert len(config.written) == 2
+    assert (config.deferred_saves, config.writes) == (2, 2)
+    assert config.write_behind is False
+
+
+def test_flush_on_error(instance):
+    config = instance.config_object
+    with pytest.raises(ValueError):
+        with instance.config_batch():
+            instance.set_config("k1", "v1")
+            raise ValueError("error")
+
+    assert config.written == [{"k1": "v1"}]
+    assert (config.deferred_saves, config.writes) == (1, 1)
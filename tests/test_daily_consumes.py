@@ -0,0 +1,86 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# compute_daily_consumes against time weighted averages computed by hand. A day is 86400 seconds: each metric
+# weighs the seconds up to the next metric and the newest metric of the day weighs the seconds up to the end of day.
+
+from datetime import datetime
+import pytest
+
+pytest.importorskip("beehive")
+
+from beehive_service.controller.daily_consumes import compute_daily_consumes  # noqa: E402
+
+PERIOD = "2026-10-17"
+METRIC_TYPE = 7
+INSTANCE = 100
+ACCOUNT = 1
+
+
+def metric(metric_id, creation_date, value, instance=INSTANCE, metric_type=METRIC_TYPE, account=ACCOUNT):
+    return metric_id, creation_date, value, metric_type, instance, account
+
+
+def consume(consumed, instance=INSTANCE, metric_type=METRIC_TYPE, account=ACCOUNT):
+    return {
+        "metric_type_id": metric_type,
+        "service_instance_id": instance,
+        "account_id": account,
+        "consumed": pytest.approx(consumed),
+    }
+
+
+def test_last_metric_only_is_discarded():
+    last = [metric(3, datetime(2026, 10, 16, 10, 0), 10.0)]
+
+    assert compute_daily_consumes(PERIOD, [], last) == []
+
+
+def test_today_metrics_only():
+    # 06:00 value 2 weighs 12h up to 18:00, 18:00 value 4 weighs 6h up to the end of day. 00:00-06:00 is not counted
+    # (2 * 43200 + 4 * 21600) / (43200 + 21600) = 172800 / 64800
+    today = [metric(10, datetime(2026, 10, 17, 6, 0), 2.0), metric(11, datetime(2026, 10, 17, 18, 0), 4.0)]
+
+    assert compute_daily_consumes(PERIOD, today, []) == [consume(8 / 3)]
+
+
+def test_last_and_today_metrics():
+    # last metric value 10 is moved at 00:00 and weighs 12h up to 12:00, 12:00 value 20 weighs 12h
+    # (10 * 43200 + 20 * 43200) / 86400 = 15
+    last = [metric(3, datetime(2026, 10, 16, 22, 0), 10.0)]
+    today = [metric(12, datetime(2026, 10, 17, 12, 0), 20.0)]
+
+    assert compute_daily_consumes(PERIOD, today, last) == [consume(15.0)]
+
+
+def test_mixed_instances_and_metric_types():
+    # instance 100: last value 1 at 00:00-08:00, value 4 at 08:00-24:00 -> (1 * 28800 + 4 * 57600) / 86400 = 3
+    # instance 101: only a last metric, discarded
+    # instance 102 of account 2: value 6 at 20:00-24:00 -> 6
+    # instance 100 metric type 8: value 5 at 00:00 (today), value 0 at 12:00 -> (5 * 43200 + 0 * 43200) / 86400 = 2.5
+    last = [
+        metric(1, datetime(2026, 10, 16, 23, 0), 1.0),
+        metric(2, datetime(2026, 10, 16, 23, 0), 9.0, instance=101),
+    ]
+    today = [
+        metric(20, datetime(2026, 10, 17, 8, 0), 4.0),
+        metric(21, datetime(2026, 10, 17, 20, 0), 6.0, instance=102, account=2),
+        metric(22, datetime(2026, 10, 17, 0, 0), 5.0, metric_type=8),
+        metric(23, datetime(2026, 10, 17, 12, 0), 0.0, metric_type=8),
+    ]
+
+    res = compute_daily_consumes(PERIOD, today, last)
+    res.sort(key=lambda r: (r["service_instance_id"], r["metric_type_id"]))
+    assert res == [
+        consume(3.0),
+        consume(2.5, metric_type=8),
+        consume(6.0, instance=102, account=2),
+    ]
+
+
+def test_zero_total_weight():
+    # a metric taken exactly at the end of the day weighs 0 seconds
+    today = [metric(30, datetime(2026, 10, 18, 0, 0), 12.0)]
+
+    assert compute_daily_consumes(PERIOD, today, []) == [consume(0)]
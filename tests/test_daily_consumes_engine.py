@@ -0,0 +1,160 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# DailyConsumesEngine.run end to end on a seeded SQLite service schema: accounts are read by
+# get_daily_consumes_accounts, metrics by get_daily_consumes_metrics and the aggregate costs are written by
+# replace_daily_aggregate_costs. Expected consumes are the time weighted averages of the dailyconsumes_by_account
+# procedure computed by hand. The finalization steps use mysql only objects and are skipped on SQLite.
+
+from datetime import datetime
+from uuid import uuid4
+import pytest
+
+pytest.importorskip("beehive")
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from beehive.common.data import operation  # noqa: E402
+from beehive_service.controller.daily_consumes import DailyConsumesEngine, get_daily_consumes_engine  # noqa: E402
+from beehive_service.dao.ServiceDao import ServiceDbManager  # noqa: E402
+from beehive_service.model import Account, AggregateCost, ServiceInstance, ServiceMetric  # noqa: E402
+from beehive_service.model.base import Base  # noqa: E402
+
+PERIOD = "2026-10-17"
+JOB_ID = 50
+
+# account id: (creation_date, expiry_date)
+ACCOUNTS = {
+    1: (datetime(2026, 1, 1), None),
+    2: (datetime(2026, 1, 1), None),
+    # no metric in the day, its aggregate costs are kept
+    3: (datetime(2026, 1, 1), None),
+    # created during the day, not processed
+    4: (datetime(2026, 10, 17, 12, 0), None),
+    # expired before the day, not processed
+    5: (datetime(2025, 1, 1), datetime(2026, 10, 16)),
+}
+
+# service instance id: account id
+INSTANCES = {100: 1, 101: 1, 102: 2, 103: 3, 104: 4, 105: 5}
+
+# (id, creation_date, value, metric type id, service instance id)
+METRICS = [
+    # instance 100 type 7: id 2 is the last metric before the day, it is moved at 00:00 and weighs 12h up to 12:00,
+    # 12:00 value 20 weighs 12h -> (10 * 43200 + 20 * 43200) / 86400 = 15
+    (1, datetime(2026, 10, 16, 8, 0), 99.0, 7, 100),
+    (2, datetime(2026, 10, 16, 22, 0), 10.0, 7, 100),
+    (20, datetime(2026, 10, 17, 12, 0), 20.0, 7, 100),
+    # instance 101 type 7: only a last metric, discarded
+    (3, datetime(2026, 10, 16, 23, 0), 9.0, 7, 101),
+    # instance 101 type 8: 06:00 value 2 weighs 12h, 18:00 value 4 weighs 6h -> 172800 / 64800 = 8 / 3
+    (21, datetime(2026, 10, 17, 6, 0), 2.0, 8, 101),
+    (22, datetime(2026, 10, 17, 18, 0), 4.0, 8, 101),
+    # instance 102 type 7: two metrics at 12:00, the older one weighs 0 seconds -> 4 * 43200 / 43200 = 4
+    (23, datetime(2026, 10, 17, 12, 0), 100.0, 7, 102),
+    (24, datetime(2026, 10, 17, 12, 0), 4.0, 7, 102),
+    # instance 102 type 8: taken at the end of the day, it belongs to the next day
+    (25, datetime(2026, 10, 18, 0, 0), 50.0, 8, 102),
+    # instance 103 type 7: only a last metric and the account has no metric in the day
+    (4, datetime(2026, 10, 16, 10, 0), 5.0, 7, 103),
+    # accounts not processed
+    (26, datetime(2026, 10, 17, 12, 0), 1.0, 7, 104),
+    (27, datetime(2026, 10, 17, 12, 0), 1.0, 7, 105),
+]
+
+# (metric type id, service instance id, account id, period, consumed) of the aggregate costs already computed
+AGGREGATE_COSTS = [
+    # replaced
+    (9, 100, 1, PERIOD, 123.0),
+    # another day
+    (7, 100, 1, "2026-10-16", 11.0),
+    # account without metrics in the day
+    (7, 103, 3, PERIOD, 7.0),
+]
+
+# (metric type id, service instance id, account id, consumed) written by the run
+EXPECTED = [
+    (7, 100, 1, 15.0),
+    (8, 101, 1, 8 / 3),
+    (7, 102, 2, 4.0),
+]
+
+
+@pytest.fixture
+def manager():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    for account_id, (creation_date, expiry_date) in ACCOUNTS.items():
+        account = Account("objid-%s" % account_id, "account-%s" % account_id, 1, 1, active=True)
+        account.id = account_id
+        account.creation_date = creation_date
+        account.expiry_date = expiry_date
+        session.add(account)
+    for instance_id, account_id in INSTANCES.items():
+        instance = ServiceInstance("objid-%s" % instance_id, "inst-%s" % instance_id, account_id, 1)
+        instance.id = instance_id
+        session.add(instance)
+    for metric_id, creation_date, value, metric_type_id, instance_id in METRICS:
+        metric = ServiceMetric(value, metric_type_id, 1, instance_id, 1, creation_date=creation_date)
+        metric.id = metric_id
+        session.add(metric)
+    for metric_type_id, instance_id, account_id, period, consumed in AGGREGATE_COSTS:
+        session.add(AggregateCost(metric_type_id, consumed, 0, instance_id, account_id, "daily", period, 1))
+    session.commit()
+
+    operation.id = str(uuid4())
+    operation.transaction = None
+    operation.session = session
+    yield ServiceDbManager()
+    operation.session = None
+    session.close()
+    engine.dispose()
+
+
+def get_aggregate_costs(period, account_ids):
+    query = (
+        operation.session.query(AggregateCost)
+        .filter(AggregateCost.period == period)
+        .filter(AggregateCost.account_id.in_(account_ids))
+    )
+    return sorted((a.metric_type_id, a.service_instance_id, a.account_id, a.consumed) for a in query.all())
+
+
+def test_daily_consumes_accounts(manager):
+    assert manager.get_daily_consumes_accounts(PERIOD) == [1, 2, 3]
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 100])
+def test_run(manager, block_size):
+    assert DailyConsumesEngine(manager, block_size=block_size).run(PERIOD, JOB_ID) == len(EXPECTED)
+
+    expected = [(t, i, a, pytest.approx(c)) for t, i, a, c in sorted(EXPECTED)]
+    assert get_aggregate_costs(PERIOD, [1, 2, 4, 5]) == expected
+    for cost in operation.session.query(AggregateCost).filter(AggregateCost.period == PERIOD).all():
+        if cost.account_id != 3:
+            assert (cost.job_id, cost.aggregation_type, cost.cost, cost.cost_type_id) == (JOB_ID, "daily", 0, 1)
+    # aggregate costs of other days and of accounts without metrics in the day are not replaced
+    assert get_aggregate_costs("2026-10-16", [1]) == [(7, 100, 1, 11.0)]
+    assert get_aggregate_costs(PERIOD, [3]) == [(7, 103, 3, 7.0)]
+
+
+def test_run_again_replaces_the_aggregate_costs(manager):
+    DailyConsumesEngine(manager).run(PERIOD, JOB_ID)
+    assert DailyConsumesEngine(manager).run(PERIOD, JOB_ID + 1) == len(EXPECTED)
+
+    costs = operation.session.query(AggregateCost).filter(AggregateCost.period == PERIOD).all()
+    assert len(costs) == len(EXPECTED) + 1
+    assert {c.job_id for c in costs if c.account_id != 3} == {JOB_ID + 1}
+
+
+def test_engine_selection(monkeypatch):
+    monkeypatch.delenv("BEEHIVE_SERVICE_DAILY_CONSUMES_ENGINE", raising=False)
+    assert get_daily_consumes_engine() == "procedure"
+    assert get_daily_consumes_engine("python") == "python"
+    monkeypatch.setenv("BEEHIVE_SERVICE_DAILY_CONSUMES_ENGINE", "python")
+    assert get_daily_consumes_engine() == "python"
+    assert get_daily_consumes_engine("procedure") == "procedure"
+    with pytest.raises(ValueError):
+        get_daily_consumes_engine("other")
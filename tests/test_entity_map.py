@@ -0,0 +1,149 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# Lifecycle of the get_entity identity map kept in the session info of ServiceDbManager.
+
+from uuid import uuid4
+import pytest
+
+pytest.importorskip("beehive")
+
+from sqlalchemy import create_engine, event, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from beehive.common.data import operation  # noqa: E402
+from beehive_service.dao.ServiceDao import ServiceDbManager, get_entity_map  # noqa: E402
+from beehive_service.model import ServiceType  # noqa: E402
+from beehive_service.model.base import Base  # noqa: E402
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    session = Session(engine)
+    operation.id = str(uuid4())
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def fill(session):
+    session.execute(text("select 1"))
+    get_entity_map(session)["key"] = "entity"
+
+
+def test_map_kept_in_operation(session):
+    fill(session)
+    assert get_entity_map(session) == {"key": "entity"}
+
+
+def test_map_replaced_on_new_operation(session):
+    fill(session)
+    operation.id = str(uuid4())
+    assert get_entity_map(session) == {}
+
+
+@pytest.mark.parametrize("end", ["commit", "rollback", "close"])
+def test_map_dropped_at_transaction_end(session, end):
+    fill(session)
+    getattr(session, end)()
+    assert "entity_map" not in session.info
+    assert get_entity_map(session) == {}
+
+
+@pytest.fixture
+def dao():
+    """ServiceDbManager on a seeded service_type table, with the select statements sent to the database counted"""
+    engine = create_engine("sqlite://")
+    # the delete of a service type loads its relationships, so the whole service schema is created
+    Base.metadata.create_all(engine)
+    selects = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: selects.append(statement)
+        if statement.lstrip()[:6].lower() == "select"
+        else None,
+    )
+    session = Session(engine, autoflush=False)
+    for i in (1, 2):
+        service_type = ServiceType("objid-%s" % i, "type-%s" % i, "", "bench.Type%s" % i, False, "{}", active=True)
+        service_type.id = i
+        session.add(service_type)
+    session.commit()
+
+    operation.id = str(uuid4())
+    operation.transaction = None
+    operation.session = session
+    manager = ServiceDbManager()
+    manager.selects = selects
+    yield manager
+    operation.session = None
+    session.close()
+    engine.dispose()
+
+
+def test_get_entity_from_map(dao):
+    entity = dao.get_entity(ServiceType, 1)
+    count = len(dao.selects)
+
+    assert dao.get_entity(ServiceType, 1) is entity
+    assert dao.get_entity(ServiceType, entity.uuid) is entity
+    assert dao.get_entity(ServiceType, "type-1") is not None
+    # id and uuid are mapped by the first lookup, the name only by its own lookup
+    assert len(dao.selects) == count + 1
+    assert dao.get_entity(ServiceType, "type-1") is entity
+    assert len(dao.selects) == count + 1
+
+
+def test_get_entity_map_by_filters(dao):
+    dao.get_entity(ServiceType, 1)
+    count = len(dao.selects)
+
+    # lookups with other filters are different map entries
+    dao.get_entity(ServiceType, 1, active=True)
+    dao.get_entity(ServiceType, 1, for_update=False, filter_expired=True)
+    assert len(dao.selects) == count + 2
+
+
+def test_map_invalidated_after_flush(dao):
+    session = operation.session
+    entity = dao.get_entity(ServiceType, 1)
+    entity.name = "type-1-new"
+    session.flush()
+
+    assert "entity_map" not in session.info
+    count = len(dao.selects)
+    assert dao.get_entity(ServiceType, "type-1") is None
+    assert dao.get_entity(ServiceType, "type-1-new") is entity
+    assert len(dao.selects) == count + 2
+
+
+def test_map_invalidated_after_bulk_update(dao):
+    session = operation.session
+    entity = dao.get_entity(ServiceType, 2)
+    session.query(ServiceType).filter(ServiceType.id == 2).update({"active": False}, synchronize_session=False)
+
+    assert "entity_map" not in session.info
+    count = len(dao.selects)
+    assert dao.get_entity(ServiceType, 2, active=True) is None
+    assert dao.get_entity(ServiceType, 2) is entity
+    assert len(dao.selects) == count + 2
+
+
+def test_map_invalidated_after_delete(dao):
+    session = operation.session
+    entity = dao.get_entity(ServiceType, 2)
+    session.delete(entity)
+    session.flush()
+
+    assert "entity_map" not in session.info
+    assert dao.get_entity(ServiceType, 2) is None
+
+
+def test_get_entity_after_update_entity(dao):
+    dao.get_entity(ServiceType, 1)
+    dao.update_entity(ServiceType, oid=1, name="type-1-updated")
+
+    assert dao.get_entity(ServiceType, 1).name == "type-1-updated"
+    assert dao.get_entity(ServiceType, "type-1") is None
@@ -0,0 +1,60 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# ServiceApiView.get_etag_response on a flask app: the entity tag is set on the response built by the view and a
+# matching If-None-Match turns it in a 304 without payload.
+
+import pytest
+
+flask = pytest.importorskip("flask")
+pytest.importorskip("beehive")
+
+from beehive_service.service_util import compute_etag  # noqa: E402
+from beehive_service.views import ServiceApiView  # noqa: E402
+
+DATA = {"instancesSet": [{"instanceId": "inst-1"}], "instancesTotal": 1}
+ETAG = compute_etag(DATA)
+
+
+@pytest.fixture
+def client():
+    app = flask.Flask(__name__)
+
+    @app.route("/instances", methods=["GET", "POST"])
+    def instances():
+        view = ServiceApiView.__new__(ServiceApiView)
+        return flask.jsonify(view.get_etag_response(DATA, ETAG))
+
+    return app.test_client()
+
+
+def test_response_has_etag(client):
+    resp = client.get("/instances")
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] == ETAG
+    assert resp.get_json() == DATA
+
+
+def test_matching_etag_returns_304(client):
+    resp = client.get("/instances", headers={"If-None-Match": ETAG})
+    assert resp.status_code == 304
+    assert resp.headers["ETag"] == ETAG
+    assert resp.data == b""
+
+
+def test_matching_etag_uses_weak_comparison(client):
+    strong = ETAG.replace("W/", "", 1)
+    resp = client.get("/instances", headers={"If-None-Match": '"other", %s' % strong})
+    assert resp.status_code == 304
+
+
+def test_other_etag_returns_200(client):
+    resp = client.get("/instances", headers={"If-None-Match": '"other"'})
+    assert resp.status_code == 200
+    assert resp.get_json() == DATA
+
+
+def test_post_is_not_conditional(client):
+    resp = client.post("/instances", headers={"If-None-Match": ETAG})
+    assert resp.status_code == 200
@@ -0,0 +1,217 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# ServiceConsumerRedis batch processing on a fakeredis backed kombu connection. Messages are published and read
+# through the kombu redis transport, so ack and reject are checked on the redis unacked index.
+
+import logging
+from time import time
+from uuid import uuid4
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+kombu = pytest.importorskip("kombu")
+pytest.importorskip("gevent")
+pytest.importorskip("beehive")
+
+from kombu import Connection, Exchange, Queue  # noqa: E402
+from kombu.transport import redis as kombu_redis  # noqa: E402
+from beehive_service.event.manager_event import ServiceConsumerRedis  # noqa: E402
+
+EXCHANGE = Exchange("service.test", type="direct", delivery_mode=1, durable=False)
+QUEUE = Queue("service.test.queue", EXCHANGE, routing_key="service.test.key", durable=False)
+
+
+class FakePlugin(object):
+    def __init__(self, inst_uuid, applied, failing):
+        self.inst_uuid = inst_uuid
+        self.applied = applied
+        self.failing = failing
+
+    def update_status(self, status, error=None):
+        if self.inst_uuid in self.failing:
+            raise Exception("update of %s failed" % self.inst_uuid)
+        self.applied.append((self.inst_uuid, status))
+
+
+class FakeInstance(object):
+    def __init__(self, plugin):
+        self.plugin = plugin
+
+    def get_service_type_plugin(self):
+        return self.plugin
+
+
+class FakeController(object):
+    def __init__(self):
+        self.applied = []
+        self.failing = set()
+
+    def get_service_instance(self, inst_uuid):
+        return FakeInstance(FakePlugin(inst_uuid, self.applied, self.failing))
+
+
+class FakeSession(object):
+    """db session that records, at every commit, the number of messages not yet acked"""
+
+    def __init__(self, client):
+        self.client = client
+        self.unacked_at_commit = []
+        self.rollbacks = 0
+
+    def commit(self):
+        self.unacked_at_commit.append(self.client.hlen("unacked"))
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeModule(object):
+    def __init__(self, session):
+        self.session = session
+
+    def get_session(self):
+        return self.session
+
+    def release_session(self):
+        pass
+
+
+class FakeApiManager(object):
+    auth_user = {"user": "test"}
+    server_name = "test"
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        kombu_redis.Channel,
+        "_create_client",
+        lambda self, asynchronous=False: fakeredis.FakeStrictRedis(server=server),
+    )
+    conn = Connection("redis://localhost:6379/0")
+    yield conn
+    conn.release()
+
+
+def make_consumer(session, batch_size=100, pool_size=2):
+    # the constructor also opens the redis producer of the api manager, so only the batch state is built here
+    consumer = ServiceConsumerRedis.__new__(ServiceConsumerRedis)
+    consumer.logger = logging.getLogger(__name__)
+    consumer.api_manager = FakeApiManager()
+    consumer.api_module = FakeModule(session)
+    consumer.controller = FakeController()
+    consumer.init_batch(batch_size, 1.0, pool_size)
+    return consumer
+
+
+def publish(conn, events):
+    producer = conn.Producer(serializer="json")
+    for data in events:
+        event = {
+            "id": str(uuid4()),
+            "type": "SERVICE",
+            "creation": time(),
+            "data": data,
+            "source": {},
+            "dest": {},
+        }
+        producer.publish(event, exchange=EXCHANGE, routing_key="service.test.key", declare=[QUEUE])
+
+
+def receive(conn, consumer):
+    """Read all the queued messages and pass them to the consumer callback as kombu does"""
+    queue = QUEUE(conn.default_channel)
+    while True:
+        message = queue.get(no_ack=False)
+        if message is None:
+            break
+        consumer.callback(message.decode(), message)
+
+
+def status(inst_uuid, value):
+    return {"action": "updateStatus", "entity": "ServiceInstance", "instance_uuid": inst_uuid, "status": value}
+
+
+def test_coalesce_status_updates(connection):
+    client = connection.default_channel.client
+    session = FakeSession(client)
+    consumer = make_consumer(session)
+
+    publish(
+        connection,
+        [
+            status("inst-a", "BUILDING"),
+            status("inst-b", "BUILDING"),
+            status("inst-a", "ERROR"),
+            {"action": "other", "entity": "ServiceInstance"},
+            status("inst-a", "ACTIVE"),
+        ],
+    )
+    receive(connection, consumer)
+    assert len(consumer.buffer) == 5
+
+    consumer.process_batch()
+
+    # only the last status of each instance is applied, one commit per instance
+    assert sorted(consumer.controller.applied) == [("inst-a", "ACTIVE"), ("inst-b", "BUILDING")]
+    assert consumer.stats["received"] == 5
+    assert consumer.stats["coalesced"] == 2
+    assert consumer.stats["applied"] == 2
+    assert len(session.unacked_at_commit) == 2
+
+    # every message, coalesced and skipped ones included, is acked
+    assert client.hlen("unacked") == 0
+    assert QUEUE(connection.default_channel).get(no_ack=False) is None
+
+
+def test_ack_after_commit(connection):
+    client = connection.default_channel.client
+    session = FakeSession(client)
+    consumer = make_consumer(session, pool_size=1)
+
+    publish(connection, [status("inst-a", "BUILDING"), status("inst-a", "ACTIVE")])
+    receive(connection, consumer)
+    assert client.hlen("unacked") == 2
+
+    consumer.process_batch()
+
+    # at commit time the messages of the instance are still unacked, they are acked after it
+    assert session.unacked_at_commit == [2]
+    assert client.hlen("unacked") == 0
+
+
+def test_failed_update_is_rejected_without_requeue(connection):
+    client = connection.default_channel.client
+    session = FakeSession(client)
+    consumer = make_consumer(session, pool_size=1)
+    consumer.controller.failing.add("inst-b")
+
+    publish(connection, [status("inst-a", "ACTIVE"), status("inst-b", "ACTIVE"), status("inst-b", "ERROR")])
+    receive(connection, consumer)
+    consumer.process_batch()
+
+    assert consumer.controller.applied == [("inst-a", "ACTIVE")]
+    assert consumer.stats["applied"] == 1
+    assert consumer.stats["failed"] == 2
+    assert session.rollbacks == 1
+    assert client.hlen("unacked") == 0
+    assert QUEUE(connection.default_channel).get(no_ack=False) is None
+
+
+def test_batch_processed_when_full(connection):
+    client = connection.default_channel.client
+    session = FakeSession(client)
+    consumer = make_consumer(session, batch_size=2)
+
+    publish(connection, [status("inst-a", "ACTIVE"), status("inst-b", "ACTIVE"), status("inst-c", "ACTIVE")])
+    receive(connection, consumer)
+
+    # the first two messages fill a batch, the third waits for batch_wait
+    assert consumer.stats["batches"] == 1
+    assert len(consumer.buffer) == 1
+    consumer.on_consume_end(connection, connection.default_channel)
+    assert consumer.stats["batches"] == 2
+    assert client.hlen("unacked") == 0
@@ -0,0 +1,127 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# Account instant consumes read from service_instant_metric_snapshot on a seeded SQLite service schema, and the retry
+# of the instant consume snapshot refresh done at the end of the metrics tasks.
+
+from datetime import datetime
+from uuid import uuid4
+import pytest
+
+pytest.importorskip("beehive")
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from beehive.common.data import operation  # noqa: E402
+from beehive_service.dao.ServiceDao import ServiceDbManager  # noqa: E402
+from beehive_service.model import ServicePluginType, ServiceInstantMetricSnapshot  # noqa: E402
+from beehive_service.model.base import Base, SrvPluginTypeCategory  # noqa: E402
+
+EXTRACTION_DATE = datetime(2026, 10, 18, 10, 0)
+
+# (account id, container id, service instance id, metric type id, metric type name, group name, plugin name,
+# category, value)
+SNAPSHOT = [
+    (1, 10, 10, 1, "vm_ram_bronze", "ComputeService", "ComputeService", "CONTAINER", 0.0),
+    (1, 10, 11, 1, "vm_ram_bronze", "ComputeService", "ComputeInstance", "INSTANCE", 4.0),
+    (1, 10, 11, 2, "vm_vcpu_bronze", "ComputeService", "ComputeInstance", "INSTANCE", 2.0),
+    (1, 10, 12, 1, "vm_ram_bronze", "ComputeService", "ComputeInstance", "INSTANCE", 8.0),
+    (1, 10, 13, 3, "volume_gb", "ComputeService", "ComputeVolume", "INSTANCE", 100.0),
+    (1, 20, 21, 4, "db_gb", "DatabaseService", "DatabaseInstance", "INSTANCE", 50.0),
+    # another account
+    (2, 30, 31, 1, "vm_ram_bronze", "ComputeService", "ComputeInstance", "INSTANCE", 16.0),
+]
+
+
+@pytest.fixture
+def manager():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    for i, (name, category) in enumerate(
+        [
+            ("ComputeService", SrvPluginTypeCategory.CONTAINER),
+            ("DatabaseService", SrvPluginTypeCategory.CONTAINER),
+            ("ComputeInstance", SrvPluginTypeCategory.INSTANCE),
+        ],
+        start=1,
+    ):
+        session.add(ServicePluginType(i, name, "beehive_service.plugins.test.%s" % name, category=category))
+    for row in SNAPSHOT:
+        session.add(ServiceInstantMetricSnapshot(*row, EXTRACTION_DATE, job_id=5))
+    session.commit()
+
+    operation.id = str(uuid4())
+    operation.transaction = None
+    operation.session = session
+    yield ServiceDbManager()
+    operation.session = None
+    session.close()
+    engine.dispose()
+
+
+def test_get_instant_consumes(manager):
+    res = sorted(tuple(r) for r in manager.get_instant_consumes(1))
+
+    assert res == sorted(
+        [
+            # metrics summed by container and metric type
+            (10, "vm_ram_bronze", "ComputeService", 12.0, EXTRACTION_DATE),
+            (10, "vm_vcpu_bronze", "ComputeService", 2.0, EXTRACTION_DATE),
+            (10, "volume_gb", "ComputeService", 100.0, EXTRACTION_DATE),
+            (20, "db_gb", "DatabaseService", 50.0, EXTRACTION_DATE),
+            # a row for each service instance of a container
+            (10, "ComputeInstance", "ComputeService", 1, EXTRACTION_DATE),
+            (10, "ComputeInstance", "ComputeService", 1, EXTRACTION_DATE),
+            (10, "ComputeVolume", "ComputeService", 1, EXTRACTION_DATE),
+            (20, "DatabaseInstance", "DatabaseService", 1, EXTRACTION_DATE),
+        ]
+    )
+
+
+def test_get_instant_consumes_of_account_without_metrics(manager):
+    assert manager.get_instant_consumes(3) == []
+
+
+class FakeManager(object):
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = []
+
+    def refresh_instant_consume_snapshot(self, account_ids=None, job_id=None):
+        self.calls.append((account_ids, job_id))
+        if len(self.calls) <= self.failures:
+            raise Exception("deadlock")
+        return 7
+
+
+class FakeTask(object):
+    def __init__(self, failures):
+        self.controller = type("FakeController", (), {})()
+        self.controller.manager = FakeManager(failures)
+        self.logger = type("FakeLogger", (), {"__getattr__": lambda self, name: lambda *args, **kvargs: None})()
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    pytest.importorskip("gevent")
+    from beehive_service.task_v2 import metrics
+
+    monkeypatch.setattr(metrics, "__SRV_INSTANT_CONSUME_SNAPSHOT_RETRY_DELAY__", 0)
+    return metrics
+
+
+def test_refresh_snapshot_is_retried(metrics):
+    task = FakeTask(failures=2)
+
+    assert metrics.refresh_instant_consume_snapshot(task, account_ids=[1], job_id=5) == 7
+    assert task.controller.manager.calls == [([1], 5)] * 3
+
+
+def test_refresh_snapshot_failure_is_raised(metrics):
+    task = FakeTask(failures=3)
+
+    with pytest.raises(metrics.TaskError):
+        metrics.refresh_instant_consume_snapshot(task, job_id=5)
+    assert len(task.controller.manager.calls) == 3
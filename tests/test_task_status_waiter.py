@@ -0,0 +1,119 @@
+# SPDX-License-Identifier: EUPL-1.2
+#
+# (C) Copyright 2018-2026 CSI-Piemonte
+
+# TaskStatusWaiter against a fake status source that returns a scripted sequence of states and records the time of
+# every status query, so the first immediate poll, the backoff between polls and the timeouts are visible.
+
+from time import time
+from uuid import uuid4
+import pytest
+
+gevent = pytest.importorskip("gevent")
+pytest.importorskip("beehive")
+
+from beehive.common.data import operation  # noqa: E402
+from beehive_service.entity.task_status_waiter import TaskStatusWaiter  # noqa: E402
+
+DELTA = 0.05
+
+
+class FakeStatusSource(object):
+    def __init__(self, states, latency=0):
+        self.states = list(states)
+        self.latency = latency
+        self.calls = []
+
+    def get_status(self):
+        self.calls.append(time())
+        if self.latency > 0:
+            gevent.sleep(self.latency)
+        state = self.states.pop(0) if len(self.states) > 1 else self.states[0]
+        return state, "error" if state == "FAILURE" else ""
+
+
+@pytest.fixture(autouse=True)
+def set_operation():
+    operation.id = str(uuid4())
+    operation.user = ("test", "localhost", "")
+    operation.perms = []
+
+
+def gaps(calls):
+    return [b - a for a, b in zip(calls, calls[1:])]
+
+
+def test_first_poll_is_immediate():
+    source = FakeStatusSource(["SUCCESS"])
+    waiter = TaskStatusWaiter(max_delta=1, backoff=2)
+
+    start = time()
+    assert waiter.wait("task-1", "resource", source.get_status, delta=1) == ("SUCCESS", "")
+    assert source.calls[0] - start < 0.1
+    assert time() - start < 0.5
+
+
+def test_polls_backoff_up_to_max_delta():
+    source = FakeStatusSource(["PENDING", "PROGRESS", "PROGRESS", "PROGRESS", "PROGRESS", "FAILURE"])
+    waiter = TaskStatusWaiter(max_delta=4 * DELTA, backoff=2)
+    progress = []
+
+    assert waiter.wait("task-1", "resource", source.get_status, delta=DELTA, progress=progress.append) == (
+        "FAILURE",
+        "error",
+    )
+    # DELTA, 2 * DELTA, then capped at max_delta
+    expected = [DELTA, 2 * DELTA, 4 * DELTA, 4 * DELTA, 4 * DELTA]
+    assert len(source.calls) == 6
+    for gap, delta in zip(gaps(source.calls), expected):
+        assert delta * 0.8 <= gap < delta + 0.1
+    # progress is checked every max_delta, it sees the state of the task at that time
+    assert "PROGRESS" in progress
+
+
+def test_wait_timeout():
+    source = FakeStatusSource(["PENDING"])
+    waiter = TaskStatusWaiter(max_delta=DELTA, backoff=2)
+
+    start = time()
+    assert waiter.wait("task-1", "resource", source.get_status, delta=DELTA, maxtime=0.3) == ("TIMEOUT", "")
+    assert 0.3 <= time() - start < 0.5
+    assert len(source.calls) >= 3
+    # the task is no more waited and the poller stops
+    gevent.sleep(2 * DELTA)
+    assert waiter._waits == {}
+    assert waiter._poller.dead
+
+
+def test_hung_poll_is_abandoned():
+    # the first status query hangs longer than poll_timeout, the next one is done after the backoff
+    source = FakeStatusSource(["PENDING", "SUCCESS"], latency=0.5)
+    waiter = TaskStatusWaiter(max_delta=DELTA, backoff=2, poll_timeout=0.1)
+
+    start = time()
+    assert waiter.wait("task-1", "resource", source.get_status, delta=DELTA, maxtime=0.4) == ("TIMEOUT", "")
+    assert len(source.calls) >= 2
+    assert source.calls[1] - start < 0.3
+
+
+def test_waiters_share_the_polls():
+    source = FakeStatusSource(["PENDING", "PENDING", "SUCCESS"])
+    waiter = TaskStatusWaiter(max_delta=DELTA, backoff=1)
+
+    jobs = [gevent.spawn(waiter.wait, "task-1", "resource", source.get_status, DELTA) for _ in range(5)]
+    gevent.joinall(jobs, timeout=1)
+    assert [job.value for job in jobs] == [("SUCCESS", "")] * 5
+    assert len(source.calls) == 3
+
+
+def test_notify_completes_the_wait():
+    source = FakeStatusSource(["PENDING"])
+    waiter = TaskStatusWaiter(max_delta=1, backoff=2)
+
+    job = gevent.spawn(waiter.wait, "task-1", "resource", source.get_status, 1)
+    gevent.sleep(0.05)
+    assert waiter.notify("task-1", "SUCCESS") is True
+    job.join(timeout=0.5)
+    assert job.value == ("SUCCESS", "")
+    assert len(source.calls) == 1
+    assert waiter.notify("task-2", "SUCCESS") is False